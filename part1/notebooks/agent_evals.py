@@ -0,0 +1,360 @@
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+from autogen_core.models import CreateResult
+from pydantic import BaseModel
+
+from model_client_wrapper import DelegatingChatCompletionClient
+from structured_stream import StructuredOutputError, parse_structured
+from voice_tracing import HdrHistogram
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_evals.jsonl")
+# Seed responses checked in next to the dataset; refresh them with --mode record.
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_evals_recordings.json")
+
+# Replay clients must advertise tool calling or AssistantAgent refuses the tools.
+REPLAY_MODEL_INFO = {"vision": False, "function_calling": True, "json_output": True,
+                     "family": "unknown", "structured_output": True}
+
+##############################
+# 1) TARGETS: the notebook agents, built per case
+##############################
+def get_weather(city: str) -> str:
+    """Returns a mock weather report."""
+    return f"The current weather in {city} is 25°C and sunny."
+
+
+def convert_currency(amount: float, from_currency: str, to_currency: str) -> str:
+    """Performs a mock currency conversion."""
+    rate = 1.1
+    result = amount * rate
+    return f"{amount} {from_currency.upper()} is ~{result:.2f} {to_currency.upper()}."
+
+
+def get_time_in(tz: str) -> str:
+    """Returns a mock local time."""
+    return f"The current local time in {tz} is 09:00 AM."
+
+
+TOOL_AGENT_SYSTEM_MESSAGE = (
+    "You are a helpful Azure AI assistant with access to the following tools:\n"
+    "1) get_weather(city: str) - Fetches current weather details.\n"
+    "2) convert_currency(amount: float, from_currency: str, to_currency: str) - Converts currency values.\n"
+    "3) get_time_in(tz: str) - Retrieves the local time for a given timezone.\n\n"
+    "Your responses must be formatted as **valid JSON** with the following fields:\n"
+    "{\n"
+    '  "weather_report": string or null,\n'
+    '  "currency_info": string or null,\n'
+    '  "local_time": string or null,\n'
+    '  "notes": string or null\n'
+    "}\n"
+    "You must **ONLY** return JSON, without any additional explanations."
+)
+
+SELECTOR_PROMPT = """You are the Orchestrator using GPT-4.
+Analyze the task and select the most relevant agent based on these rules:
+- If the task involves MATH (e.g., calculations, solving, numbers, arithmetic), select "MathAgent".
+- If the task involves TRANSLATION (e.g., converting words between languages), select "TranslatorAgent".
+- If the task involves PHILOSOPHY (e.g., deep questions, meaning of life, abstract thinking), select "PhilosopherAgent".
+**Return ONLY the agent's name, without any explanation or extra text.**
+"""
+
+
+def custom_selector(messages):
+    """Keyword routing from the multi-agent collaboration notebook; None falls back to the model."""
+    last_message = messages[-1].content.lower()
+    if any(keyword in last_message for keyword in ["solve", "calculate", "math", "plus", "minus", "times", "divide"]):
+        return "MathAgent"
+    if any(keyword in last_message for keyword in ["translate", "convert", "language", "spanish", "french"]):
+        return "TranslatorAgent"
+    if any(keyword in last_message for keyword in ["meaning", "philosophy", "why", "existence"]):
+        return "PhilosopherAgent"
+    return None
+
+
+def tool_agent(clients):
+    from autogen_agentchat.agents import AssistantAgent
+    # The notebook asks for JSON, so the final message must be the model's, not a tool summary.
+    return AssistantAgent("multi_tool_agent", model_client=clients["agent"],
+                          tools=[get_weather, convert_currency, get_time_in],
+                          system_message=TOOL_AGENT_SYSTEM_MESSAGE, reflect_on_tool_use=True)
+
+
+def selector_team(clients):
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.teams import SelectorGroupChat
+    agents = [
+        AssistantAgent("MathAgent", model_client=clients["agent"],
+                       system_message="You ONLY solve mathematical problems. Answer only math-related questions."),
+        AssistantAgent("TranslatorAgent", model_client=clients["agent"],
+                       system_message="You ONLY translate phrases between languages. "
+                                      "Answer only translation-related queries."),
+        AssistantAgent("PhilosopherAgent", model_client=clients["agent"],
+                       system_message="You ONLY answer philosophical questions. "
+                                      "Answer only deep-thinking-related queries."),
+    ]
+    return SelectorGroupChat(agents, model_client=clients["selector"], selector_prompt=SELECTOR_PROMPT,
+                             selector_func=custom_selector, termination_condition=MaxMessageTermination(3),
+                             allow_repeated_speaker=False)
+
+
+class Outcome:
+    __slots__ = ("text", "speakers", "tool_calls", "route")
+
+    def __init__(self, text="", speakers=(), tool_calls=(), route=None):
+        self.text = text
+        self.speakers = list(speakers)
+        self.tool_calls = list(tool_calls)
+        self.route = route
+
+
+async def _run_chat(runner, prompt):
+    result = await runner.run(task=prompt)
+    speakers, tool_calls, text = [], [], ""
+    for message in result.messages:
+        kind = type(message).__name__
+        if kind == "ToolCallRequestEvent":
+            tool_calls += [call.name for call in message.content]
+        elif message.source != "user" and kind.endswith("Message"):
+            speakers.append(message.source)
+            text = message.content if isinstance(message.content, str) else str(message.content)
+    return Outcome(text, speakers, tool_calls)
+
+
+async def run_tool_agent(clients, prompt):
+    return await _run_chat(tool_agent(clients), prompt)
+
+
+async def run_selector_team(clients, prompt):
+    return await _run_chat(selector_team(clients), prompt)
+
+
+async def run_orchestrator(clients, prompt):
+    from part1_realtime_api_autogen_integration import AutoGenOrchestrator
+    orchestrator = AutoGenOrchestrator(clients["agent"])
+    route = orchestrator.route(prompt)
+    text = await orchestrator.handle_user_text(prompt)
+    return Outcome(text, [route] if route else [], route=route)
+
+
+TARGETS = {
+    "tool_agent": run_tool_agent,
+    "selector_team": run_selector_team,
+    "orchestrator": run_orchestrator,
+}
+
+##############################
+# 2) SCORING: expected properties per case
+##############################
+class QueryResponse(BaseModel):
+    """The tools agent's answer, as in the basics notebook."""
+    weather_report: Optional[str] = None
+    currency_info: Optional[str] = None
+    local_time: Optional[str] = None
+    notes: Optional[str] = None
+
+
+def _query_response(text):
+    try:
+        return parse_structured(text, QueryResponse)[0]
+    except StructuredOutputError:
+        return None
+
+
+def score(expect, outcome):
+    """[(check, passed)] for each expected property of a case."""
+    checks = []
+    text = outcome.text.lower()
+    for needle in expect.get("contains", ()):
+        checks.append((f"contains {needle!r}", needle.lower() in text))
+    for needle in expect.get("not_contains", ()):
+        checks.append((f"not contains {needle!r}", needle.lower() not in text))
+    if "tool_calls" in expect:
+        checks.append((f"tool_calls {expect['tool_calls']}", sorted(outcome.tool_calls) == sorted(expect["tool_calls"])))
+    if "speaker" in expect:
+        first = outcome.speakers[0] if outcome.speakers else None
+        checks.append((f"speaker {expect['speaker']}", first == expect["speaker"]))
+    if "route" in expect:
+        checks.append((f"route {expect['route']}", outcome.route == expect["route"]))
+    if "json_fields" in expect:
+        response = _query_response(outcome.text)
+        checks.append(("valid QueryResponse", response is not None))
+        for field in expect["json_fields"]:
+            checks.append((f"{field} set", response is not None and getattr(response, field) is not None))
+    return checks
+
+##############################
+# 3) RUNNER
+##############################
+class _CaseClient(DelegatingChatCompletionClient):
+    """Counts tokens for one case and keeps its responses for recording."""
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.results = []
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def create(self, messages, **kwargs):
+        result = await self.inner.create(messages, **kwargs)
+        self.calls += 1
+        self.prompt_tokens += result.usage.prompt_tokens
+        self.completion_tokens += result.usage.completion_tokens
+        self.results.append(result.model_dump(mode="json"))
+        return result
+
+
+def load_dataset(path=DATASET):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+
+
+class EvalRunner:
+    """
+    Runs eval cases against the notebook agents with bounded concurrency:
+
+        runner = EvalRunner(mode="replay")            # or "live" / "record"
+        report = await runner.run(load_dataset())
+        print(runner.format(report))
+
+    A case is {"id", "target", "prompt", "expect"}, where target is
+    tool_agent, selector_team or orchestrator. expect can hold contains,
+    not_contains, tool_calls, speaker, route and json_fields.
+
+    Modes:
+    - "live" uses Azure OpenAI clients for the agents and the selector.
+    - "record" also saves every model response, per case and per client, to
+      `recordings`.
+    - "replay" serves those responses back in order through
+      ReplayChatCompletionClient. No network is needed and a full run takes
+      about a second, so quality checks can run as a regression test.
+    Latency is wall time per case. In replay mode it measures only our own
+    agent and team overhead.
+    """
+    def __init__(self, mode="replay", recordings=RECORDINGS, concurrency=8, live_clients=None):
+        self.mode = mode
+        self.recordings_path = recordings
+        self.concurrency = concurrency
+        self.live_clients = live_clients
+        self.recordings = {}
+        if mode == "replay":
+            with open(recordings, encoding="utf-8") as f:
+                self.recordings = json.load(f)
+
+    def _clients(self, case):
+        if self.mode == "replay":
+            from autogen_ext.models.replay import ReplayChatCompletionClient
+            recorded = self.recordings.get(case["id"], {})
+            inner = {role: ReplayChatCompletionClient([CreateResult.model_validate(r) for r in recorded.get(role, [])],
+                                                      model_info=REPLAY_MODEL_INFO)
+                     for role in ("agent", "selector")}
+        else:
+            if self.live_clients is None:
+                self.live_clients = azure_clients()
+            inner = self.live_clients
+        return {role: _CaseClient(client) for role, client in inner.items()}
+
+    async def _case(self, case, limit):
+        async with limit:
+            clients = self._clients(case)
+            start = time.perf_counter()
+            try:
+                outcome = await TARGETS[case["target"]](clients, case["prompt"])
+                checks = score(case.get("expect", {}), outcome)
+                error = None
+            except Exception as e:
+                outcome, checks, error = Outcome(), [], f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+        return {
+            "id": case["id"], "target": case["target"],
+            "passed": error is None and all(ok for _, ok in checks),
+            "checks": checks, "error": error, "latency_ms": 1000 * elapsed,
+            "calls": sum(c.calls for c in clients.values()),
+            "prompt_tokens": sum(c.prompt_tokens for c in clients.values()),
+            "completion_tokens": sum(c.completion_tokens for c in clients.values()),
+            "text": outcome.text,
+            "recorded": {role: c.results for role, c in clients.items() if c.results},
+        }
+
+    async def run(self, cases):
+        limit = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._case(case, limit) for case in cases))
+        elapsed = time.perf_counter() - start
+        if self.mode == "record":
+            with open(self.recordings_path, "w", encoding="utf-8") as f:
+                json.dump({r["id"]: r.pop("recorded") for r in results}, f, indent=1, ensure_ascii=False)
+        latency = HdrHistogram()
+        for r in results:
+            r.pop("recorded", None)
+            latency.record(r["latency_ms"] * 1000)
+        targets = {}
+        for r in results:
+            passed, total = targets.get(r["target"], (0, 0))
+            targets[r["target"]] = (passed + r["passed"], total + 1)
+        summary = latency.summary_ms()
+        return {
+            "mode": self.mode, "cases": len(results), "seconds": elapsed,
+            "accuracy": sum(r["passed"] for r in results) / max(1, len(results)),
+            "by_target": {t: p / n for t, (p, n) in targets.items()},
+            "latency_p50_ms": summary["p50_ms"], "latency_p95_ms": summary["p95_ms"],
+            "latency_p99_ms": summary["p99_ms"],
+            "tokens_per_case": sum(r["prompt_tokens"] + r["completion_tokens"] for r in results) / max(1, len(results)),
+            "results": results,
+        }
+
+    @staticmethod
+    def format(report):
+        lines = [f"{'case':22s} {'target':14s} {'pass':4s} {'ms':>8s} {'calls':>5s} {'tokens':>6s}  failed checks"]
+        for r in report["results"]:
+            failed = [name for name, ok in r["checks"] if not ok]
+            detail = r["error"] or ", ".join(failed)
+            lines.append(f"{r['id']:22s} {r['target']:14s} {'yes' if r['passed'] else 'NO':4s} "
+                         f"{r['latency_ms']:8.1f} {r['calls']:5d} {r['prompt_tokens'] + r['completion_tokens']:6d}  {detail}")
+        by_target = ", ".join(f"{t} {a:.0%}" for t, a in report["by_target"].items())
+        lines.append(f"{report['mode']}: {report['cases']} cases in {report['seconds']:.2f}s, "
+                     f"accuracy {report['accuracy']:.0%} ({by_target}), latency p50 {report['latency_p50_ms']:.1f} ms "
+                     f"p95 {report['latency_p95_ms']:.1f} ms p99 {report['latency_p99_ms']:.1f} ms, "
+                     f"{report['tokens_per_case']:.0f} tokens/case")
+        return "\n".join(lines)
+
+
+def azure_clients():
+    """Same deployments as the notebooks: gpt-4o-mini for agents, gpt-4o for selection."""
+    from dotenv import load_dotenv
+    from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+    load_dotenv()
+
+    def client(model):
+        return AzureOpenAIChatCompletionClient(
+            model=model, api_version="2024-06-01",
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT", ""),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY", ""),
+        )
+
+    return {"agent": client("gpt-4o-mini"), "selector": client("gpt-4o")}
+
+
+async def main(mode, dataset, recordings, concurrency, min_accuracy, max_p95_ms):
+    runner = EvalRunner(mode, recordings, concurrency)
+    report = await runner.run(load_dataset(dataset))
+    print(runner.format(report))
+    if report["accuracy"] < min_accuracy or (max_p95_ms and report["latency_p95_ms"] > max_p95_ms):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Score the notebook agents on a prompt dataset")
+    parser.add_argument("--mode", choices=("replay", "live", "record"), default="replay",
+                        help="replay recorded responses (offline), call Azure, or call Azure and save responses")
+    parser.add_argument("--dataset", default=DATASET)
+    parser.add_argument("--recordings", default=RECORDINGS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--min-accuracy", type=float, default=1.0, help="exit 1 below this pass rate")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="exit 1 above this case latency p95")
+    args = parser.parse_args()
+    asyncio.run(main(args.mode, args.dataset, args.recordings, args.concurrency, args.min_accuracy, args.max_p95_ms))
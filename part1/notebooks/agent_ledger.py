@@ -0,0 +1,382 @@
+import asyncio
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+
+import numpy as np
+from autogen_agentchat.base import TerminatedException, TerminationCondition
+from autogen_agentchat.messages import StopMessage
+
+from model_client_wrapper import DelegatingChatCompletionClient, estimate_tokens
+
+##############################
+# 1) COMPACT RING OF CALL RECORDS
+##############################
+MODEL, TOOL = 0, 1
+
+RECORD = np.dtype([("t", "f8"), ("kind", "u1"), ("prompt", "i4"), ("completion", "i4"),
+                   ("ttft_ms", "f4"), ("latency_ms", "f4")])
+
+
+class UsageRing:
+    """Last `capacity` calls for one agent as a preallocated structured array (25 bytes a call)."""
+    def __init__(self, capacity=1024):
+        self.records = np.zeros(capacity, dtype=RECORD)
+        self.capacity = capacity
+        self.count = 0
+
+    def append(self, t, kind, prompt, completion, ttft_ms, latency_ms):
+        self.records[self.count % self.capacity] = (t, kind, prompt, completion, ttft_ms, latency_ms)
+        self.count += 1
+
+    def window(self):
+        """Retained records, oldest first."""
+        if self.count <= self.capacity:
+            return self.records[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate((self.records[start:], self.records[:start]))
+
+##############################
+# 2) LEDGER
+##############################
+class AgentBudgetExceeded(Exception):
+    def __init__(self, agent, reason):
+        super().__init__(f"{agent} exceeded its budget: {reason}")
+        self.agent = agent
+        self.reason = reason
+
+
+class AgentUsage:
+    """Running totals (never wrap) plus the recent-call ring for one (team, agent)."""
+    def __init__(self, team, agent, ring_capacity):
+        self.team = team
+        self.agent = agent
+        self.calls = 0
+        self.tool_calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.model_seconds = 0.0
+        self.tool_seconds = 0.0
+        self.last_call_tokens = 0
+        self.ring = UsageRing(ring_capacity)
+
+    @property
+    def tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def summary(self):
+        window = self.ring.window()
+        model = window[window["kind"] == MODEL]
+        pct = (lambda column, q: float(np.percentile(model[column], q)) if len(model) else 0.0)
+        return {
+            "team": self.team, "agent": self.agent, "calls": self.calls, "tool_calls": self.tool_calls,
+            "errors": self.errors, "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens, "tokens": self.tokens,
+            "model_seconds": round(self.model_seconds, 4), "tool_seconds": round(self.tool_seconds, 4),
+            "ttft_p50_ms": pct("ttft_ms", 50), "ttft_p95_ms": pct("ttft_ms", 95),
+            "latency_p50_ms": pct("latency_ms", 50), "latency_p95_ms": pct("latency_ms", 95),
+        }
+
+
+class UsageLedger:
+    """
+    Token, latency and tool-time accounting per agent, team and session.
+    Give every agent its own wrapped client (they can share the inner one):
+
+        ledger = UsageLedger()
+        ledger.set_budget("SkepticalStudent", max_tokens=2000)
+        teacher = AssistantAgent("QuantumTeacher",
+                                 model_client=ledger.client(azure_client, "QuantumTeacher", team="tutoring"),
+                                 tools=[ledger.tool(lookup, "QuantumTeacher", team="tutoring")])
+
+    Budgets are hard: once an agent is over budget its calls raise
+    AgentBudgetExceeded, and a streamed completion is cut off as soon as
+    it crosses the limit (a non-streamed call that started under budget
+    is allowed to finish). Add LedgerTermination(ledger) to the team's
+    termination condition to stop the run cleanly instead of erroring.
+    """
+    def __init__(self, session=None, ring_capacity=1024):
+        self.session = session or uuid.uuid4().hex[:12]
+        self.ring_capacity = ring_capacity
+        self.started = time.time()
+        self.usage = {}
+        self.budgets = {}
+        self.exceeded = {}
+        self.lock = threading.Lock()
+
+    def usage_for(self, agent, team=None):
+        key = (team, agent)
+        usage = self.usage.get(key)
+        if usage is None:
+            with self.lock:
+                usage = self.usage.setdefault(key, AgentUsage(team, agent, self.ring_capacity))
+        return usage
+
+    def set_budget(self, agent, max_tokens=None, max_calls=None, max_seconds=None):
+        """Per-agent limits, summed over every team the agent takes part in."""
+        self.budgets[agent] = {"max_tokens": max_tokens, "max_calls": max_calls, "max_seconds": max_seconds}
+
+    # --- wrappers -------------------------------------------------------
+    def client(self, inner, agent, team=None):
+        return LedgerClient(inner, self, agent, team)
+
+    def tool(self, func, agent, team=None):
+        """Wrap a tool function (sync or async) so its run time is charged to `agent`."""
+        usage = self.usage_for(agent, team)
+
+        def record(start, failed):
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                usage.tool_calls += 1
+                usage.tool_seconds += elapsed
+                usage.errors += failed
+                usage.ring.append(time.time(), TOOL, 0, 0, 0.0, 1000 * elapsed)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                self.check(agent)
+                start, failed = time.perf_counter(), True
+                try:
+                    result = await func(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    record(start, failed)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.check(agent)
+            start, failed = time.perf_counter(), True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(start, failed)
+        return wrapper
+
+    # --- accounting -----------------------------------------------------
+    def spent(self, agent):
+        rows = [u for (_, name), u in list(self.usage.items()) if name == agent]
+        return (sum(u.tokens for u in rows), sum(u.calls for u in rows),
+                sum(u.model_seconds + u.tool_seconds for u in rows))
+
+    def over_budget(self, agent, pending_tokens=0, pending_calls=0):
+        """Why `agent` is (or after `pending_*` more would be) over budget, or None."""
+        budget = self.budgets.get(agent)
+        if budget is None:
+            return None
+        if agent in self.exceeded:
+            return self.exceeded[agent]
+        tokens, calls, seconds = self.spent(agent)
+        if budget["max_tokens"] is not None and tokens + pending_tokens > budget["max_tokens"]:
+            return f"{tokens + pending_tokens} tokens > {budget['max_tokens']}"
+        if budget["max_calls"] is not None and calls + pending_calls > budget["max_calls"]:
+            return f"{calls + pending_calls} model calls > {budget['max_calls']}"
+        if budget["max_seconds"] is not None and seconds > budget["max_seconds"]:
+            return f"{seconds:.1f}s > {budget['max_seconds']}s"
+        return None
+
+    def check(self, agent, pending_tokens=0, pending_calls=0):
+        """Raise AgentBudgetExceeded (and keep refusing) once `agent` is over budget."""
+        reason = self.over_budget(agent, pending_tokens, pending_calls)
+        if reason:
+            self.exceeded[agent] = reason
+            raise AgentBudgetExceeded(agent, reason)
+
+    def next_call_estimate(self, agent):
+        """Tokens the agent's next call will at least cost: prompts only grow within a run."""
+        return max((u.last_call_tokens for (_, name), u in list(self.usage.items()) if name == agent), default=0)
+
+    def record_model(self, usage, prompt, completion, ttft, latency, failed=False):
+        with self.lock:
+            usage.calls += 1
+            usage.errors += failed
+            usage.prompt_tokens += prompt
+            usage.completion_tokens += completion
+            usage.model_seconds += latency
+            usage.last_call_tokens = prompt + completion
+            usage.ring.append(time.time(), MODEL, prompt, completion, 1000 * ttft, 1000 * latency)
+
+    # --- snapshot / export ----------------------------------------------
+    def snapshot(self):
+        """Per-agent summaries plus per-team and session roll-ups, as plain JSON-able dicts."""
+        agents = [u.summary() for u in list(self.usage.values())]
+        teams = {}
+        for row in agents:
+            team = teams.setdefault(row["team"], {"calls": 0, "tool_calls": 0, "tokens": 0,
+                                                  "model_seconds": 0.0, "tool_seconds": 0.0})
+            for key in team:
+                team[key] += row[key]
+        session = {key: sum(t[key] for t in teams.values())
+                   for key in ("calls", "tool_calls", "tokens", "model_seconds", "tool_seconds")}
+        return {"session": self.session, "started": self.started, "agents": agents,
+                "teams": teams, "totals": session, "exceeded": dict(self.exceeded)}
+
+    def export(self, path):
+        """Append every retained call record as JSONL (one line per call)."""
+        with open(path, "a", encoding="utf-8") as f:
+            for usage in list(self.usage.values()):
+                for r in usage.ring.window().tolist():
+                    f.write(json.dumps({
+                        "session": self.session, "team": usage.team, "agent": usage.agent, "t": r[0],
+                        "kind": ("model", "tool")[r[1]], "prompt_tokens": r[2], "completion_tokens": r[3],
+                        "ttft_ms": round(r[4], 2), "latency_ms": round(r[5], 2),
+                    }) + "\n")
+
+    def report(self):
+        snap = self.snapshot()
+        lines = [f"{'team/agent':32s} {'calls':>5s} {'tools':>5s} {'prompt':>7s} {'compl':>6s} "
+                 f"{'ttft p50':>8s} {'lat p95':>8s} {'tool s':>7s}"]
+        for row in sorted(snap["agents"], key=lambda r: -r["tokens"]):
+            name = f"{row['team']}/{row['agent']}" if row["team"] else row["agent"]
+            lines.append(f"{name:32s} {row['calls']:5d} {row['tool_calls']:5d} {row['prompt_tokens']:7d} "
+                         f"{row['completion_tokens']:6d} {row['ttft_p50_ms']:8.0f} {row['latency_p95_ms']:8.0f} "
+                         f"{row['tool_seconds']:7.2f}")
+        totals = snap["totals"]
+        lines.append(f"session {snap['session']}: {totals['calls']} calls, {totals['tokens']} tokens, "
+                     f"{totals['model_seconds']:.2f}s model, {totals['tool_seconds']:.2f}s tools")
+        for agent, reason in snap["exceeded"].items():
+            lines.append(f"over budget: {agent} ({reason})")
+        return "\n".join(lines)
+
+##############################
+# 3) MODEL CLIENT WRAPPER + TERMINATION
+##############################
+class LedgerClient(DelegatingChatCompletionClient):
+    """Charges every create / create_stream on the wrapped client to one agent."""
+    def __init__(self, inner, ledger, agent, team=None):
+        super().__init__(inner)
+        self.ledger = ledger
+        self.agent = agent
+        self.usage = ledger.usage_for(agent, team)
+
+    async def create(self, messages, **kwargs):
+        self.ledger.check(self.agent, pending_calls=1)
+        start = time.perf_counter()
+        try:
+            result = await self.inner.create(messages, **kwargs)
+        except Exception:
+            elapsed = time.perf_counter() - start
+            self.ledger.record_model(self.usage, 0, 0, elapsed, elapsed, failed=True)
+            raise
+        elapsed = time.perf_counter() - start
+        # A non-streamed completion's first token is the whole response.
+        self.ledger.record_model(self.usage, result.usage.prompt_tokens, result.usage.completion_tokens,
+                                 elapsed, elapsed)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        self.ledger.check(self.agent, pending_calls=1)
+        prompt_estimate = estimate_tokens(messages, 0)
+        start = time.perf_counter()
+        ttft = None
+        chars = 0
+        recorded = False
+        stream = self.inner.create_stream(messages, **kwargs)
+        try:
+            async for chunk in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                if isinstance(chunk, str):
+                    chars += len(chunk)
+                    # Cut a runaway completion off mid-stream (~4 characters per token).
+                    self.ledger.check(self.agent, prompt_estimate + chars // 4, pending_calls=1)
+                else:
+                    elapsed = time.perf_counter() - start
+                    self.ledger.record_model(self.usage, chunk.usage.prompt_tokens,
+                                             chunk.usage.completion_tokens, ttft, elapsed)
+                    recorded = True
+                yield chunk
+        finally:
+            if not recorded:
+                elapsed = time.perf_counter() - start
+                self.ledger.record_model(self.usage, prompt_estimate, chars // 4,
+                                         elapsed if ttft is None else ttft, elapsed, failed=True)
+            await stream.aclose()
+
+
+class LedgerTermination(TerminationCondition):
+    """
+    Stop the team cleanly before any of `agents` (default: every budgeted
+    agent) would be refused: after each message, the agent's next call is
+    projected to cost at least as much as its last one.
+    """
+    def __init__(self, ledger, agents=None):
+        self.ledger = ledger
+        self.agents = agents
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    async def __call__(self, messages):
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        for agent in self.agents or list(self.ledger.budgets):
+            reason = self.ledger.over_budget(agent, self.ledger.next_call_estimate(agent), pending_calls=1)
+            if reason:
+                self._terminated = True
+                return StopMessage(content=f"{agent} would exceed its budget: {reason}",
+                                   source="LedgerTermination")
+        return None
+
+    async def reset(self):
+        self._terminated = False
+
+##############################
+# 4) DEMO on the teacher/student and selector scenarios
+##############################
+async def demo():
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.teams import RoundRobinGroupChat
+    from autogen_core.models import UserMessage
+    from autogen_ext.models.replay import ReplayChatCompletionClient
+    from group_chat_termination import TEACHER_STUDENT_SCRIPT, SimulatedLatencyClient
+
+    ledger = UsageLedger()
+    # The student keeps asking; give it a budget the conversation will blow through.
+    ledger.set_budget("SkepticalStudent", max_tokens=600)
+
+    def lookup_definition(term: str) -> str:
+        """Look up a physics term."""
+        time.sleep(0.02)
+        return f"{term}: a system existing in several states until measured."
+
+    shared = SimulatedLatencyClient(ReplayChatCompletionClient(TEACHER_STUDENT_SCRIPT * 3), base_latency=0.05)
+    teacher = AssistantAgent(
+        "QuantumTeacher", model_client=ledger.client(shared, "QuantumTeacher", team="tutoring"),
+        system_message="You are a physics teacher explaining quantum superposition in simple terms.")
+    student = AssistantAgent(
+        "SkepticalStudent", model_client=ledger.client(shared, "SkepticalStudent", team="tutoring"),
+        system_message="You are a curious student with follow-up questions on quantum superposition.")
+    team = RoundRobinGroupChat([teacher, student],
+                               termination_condition=LedgerTermination(ledger) | MaxMessageTermination(30))
+    result = await team.run(task="Explain quantum superposition in simple terms.")
+    # The replay client can't emit tool calls; charge a tool call directly,
+    # as passing the wrapped function in tools=[...] would.
+    await asyncio.to_thread(ledger.tool(lookup_definition, "QuantumTeacher", team="tutoring"), "superposition")
+    print(f"team stopped after {len(result.messages)} messages: {result.stop_reason}")
+
+    # Hard stop: a runaway streamed answer is cut off as soon as it crosses the budget.
+    ledger.set_budget("MathAgent", max_tokens=80)
+    rambling = " ".join(f"Step {i}: multiply the digits again to be sure." for i in range(200))
+    math = ledger.client(ReplayChatCompletionClient([rambling]), "MathAgent", team="selector")
+    received = 0
+    try:
+        async for chunk in math.create_stream([UserMessage(content="Please solve 45*32.", source="user")]):
+            received += len(chunk) if isinstance(chunk, str) else 0
+    except AgentBudgetExceeded as e:
+        print(f"stream cut after {received} of {len(rambling)} characters: {e}")
+    print(ledger.report())
+
+if __name__ == "__main__":
+    asyncio.run(demo())
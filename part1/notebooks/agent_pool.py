@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import time
+
+from autogen_core import CancellationToken
+
+from voice_tracing import HdrHistogram
+
+##############################
+# 1) POOL
+##############################
+class _Role:
+    def __init__(self, factory, max_size, warm):
+        self.factory = factory
+        self.max_size = max_size
+        self.warm = warm
+        self.idle = asyncio.Queue()
+        self.created = 0
+        self.acquired = 0
+        self.build_seconds = 0.0
+        self.reset_seconds = 0.0
+        self.discarded = 0
+        self.wait = HdrHistogram()
+
+
+class AgentPool:
+    """
+    Bounded pool of pre-built agents per role, shared by every session:
+
+        pool = AgentPool()
+        pool.register("WeatherAgent", lambda: WeatherAgent(name="WeatherAgent", model_client=client, tools=...),
+                      max_size=8, warm=2)
+        pool.warm_up()
+        async with pool.acquire("WeatherAgent") as agent:
+            ...
+
+    Construction (tool schema generation, model-context and client wiring)
+    happens once per instance. Between sessions an instance only has its
+    per-session state cleared with on_reset(). When all max_size instances
+    of a role are out, acquire() waits for one to come back. An instance
+    whose reset fails is dropped and replaced with a fresh one.
+    """
+    def __init__(self):
+        self.roles = {}
+
+    def register(self, role, factory, max_size=8, warm=1):
+        self.roles[role] = _Role(factory, max_size, min(warm, max_size))
+
+    def _build(self, role):
+        start = time.perf_counter()
+        agent = role.factory()
+        role.build_seconds += time.perf_counter() - start
+        role.created += 1
+        return agent
+
+    def warm_up(self):
+        """Pre-build each role's `warm` instances (plain method: construction is synchronous)."""
+        for role in self.roles.values():
+            while role.created < role.warm:
+                role.idle.put_nowait(self._build(role))
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, name):
+        role = self.roles[name]
+        start = time.perf_counter()
+        try:
+            agent = role.idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if role.created < role.max_size:
+                agent = self._build(role)
+            else:
+                agent = await role.idle.get()
+        role.wait.record((time.perf_counter() - start) * 1e6)
+        role.acquired += 1
+        try:
+            yield agent
+        finally:
+            await self._release(role, agent)
+
+    async def _release(self, role, agent):
+        start = time.perf_counter()
+        try:
+            await agent.on_reset(CancellationToken())
+        except Exception:
+            agent = None
+        role.reset_seconds += time.perf_counter() - start
+        if agent is None:
+            role.created -= 1
+            role.discarded += 1
+            # A task may already be blocked in idle.get() waiting for this slot;
+            # hand it a fresh instance instead of leaving it waiting forever.
+            agent = self._build(role)
+        role.idle.put_nowait(agent)
+
+    def stats(self):
+        result = {}
+        for name, role in self.roles.items():
+            build = role.build_seconds / max(1, role.created + role.discarded)
+            reused = role.acquired - (role.created + role.discarded - role.warm)
+            wait = role.wait.summary_ms()
+            result[name] = {
+                "created": role.created, "acquired": role.acquired, "reused": max(0, reused),
+                "discarded": role.discarded, "build_ms": 1000 * build,
+                "reset_ms": 1000 * role.reset_seconds / max(1, role.acquired),
+                "saved_s": max(0, reused) * build - role.reset_seconds,
+                "wait_p50_ms": wait["p50_ms"], "wait_p99_ms": wait["p99_ms"], "wait_max_ms": wait["max_ms"],
+            }
+        return result
+
+    def report(self):
+        lines = [f"{'role':16s} {'built':>5s} {'acquired':>8s} {'build ms':>8s} {'reset ms':>8s} "
+                 f"{'saved s':>7s} {'wait p50':>8s} {'wait p99':>8s}"]
+        for name, s in self.stats().items():
+            lines.append(f"{name:16s} {s['created']:5d} {s['acquired']:8d} {s['build_ms']:8.2f} "
+                         f"{s['reset_ms']:8.3f} {s['saved_s']:7.2f} {s['wait_p50_ms']:8.2f} {s['wait_p99_ms']:8.2f}")
+        return "\n".join(lines)
+
+##############################
+# 2) BENCHMARK: fresh agents per session vs the pool
+##############################
+def get_weather(city: str) -> str:
+    """Current weather for a city."""
+    return f"It's 22°C and sunny in {city}."
+
+
+def get_forecast(city: str, days: int = 3) -> str:
+    """Forecast for the next few days."""
+    return f"{city}: sunny for {days} days."
+
+
+def convert_temperature(value: float, to_unit: str = "F") -> float:
+    """Convert Celsius to Fahrenheit or Kelvin."""
+    return value * 9 / 5 + 32 if to_unit == "F" else value + 273.15
+
+
+def write_snippet(language: str, task: str) -> str:
+    """Return a code snippet for a task."""
+    return f"# {language}: {task}"
+
+
+def benchmark_roles(client):
+    from autogen_agentchat.agents import AssistantAgent
+    return {
+        "WeatherAgent": lambda: AssistantAgent(
+            "WeatherAgent", model_client=client, system_message="You are a weather assistant.",
+            tools=[get_weather, get_forecast, convert_temperature]),
+        "CodeAgent": lambda: AssistantAgent(
+            "CodeAgent", model_client=client, system_message="You are a code-generating assistant.",
+            tools=[write_snippet]),
+    }
+
+
+async def benchmark(sessions=400, concurrency=32):
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.teams import RoundRobinGroupChat
+    from team_pool import BENCHMARK_LATENCY, benchmark_client
+
+    client = benchmark_client()
+    roles = benchmark_roles(client)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def session(get_agents):
+        async with limit:
+            async with get_agents() as (weather, code):
+                team = RoundRobinGroupChat([weather, code], termination_condition=MaxMessageTermination(3))
+                await team.run(task="What's the weather in Istanbul, and show me a greeting function.")
+
+    @contextlib.asynccontextmanager
+    async def fresh():
+        start = time.perf_counter()
+        agents = (roles["WeatherAgent"](), roles["CodeAgent"]())
+        fresh.build += time.perf_counter() - start
+        yield agents
+
+    fresh.build = 0.0
+    start = time.perf_counter()
+    await asyncio.gather(*(session(fresh) for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    print(f"{sessions} sessions, {concurrency} concurrent, 2 agents each, "
+          f"{1000 * BENCHMARK_LATENCY:.0f} ms model latency:")
+    print(f"  fresh agents: {sessions / elapsed:6.1f} sessions/s, {fresh.build:.2f}s building "
+          f"({1000 * fresh.build / sessions:.2f} ms/session)")
+
+    for max_size in (concurrency, concurrency // 4):
+        pool = AgentPool()
+        for name, factory in roles.items():
+            pool.register(name, factory, max_size=max_size, warm=max_size)
+        pool.warm_up()
+
+        @contextlib.asynccontextmanager
+        async def pooled():
+            async with pool.acquire("WeatherAgent") as weather, pool.acquire("CodeAgent") as code:
+                yield weather, code
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session(pooled) for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+        print(f"  pooled, max {max_size}/role: {sessions / elapsed:6.1f} sessions/s")
+        print("    " + pool.report().replace("\n", "\n    "))
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import os
 import base64
@@ -5,7 +6,9 @@ import json
 from dotenv import load_dotenv
 import websockets
 import numpy as np
-import sounddevice as sd
+
+from audio_resampler import PolyphaseResampler
+from batch_render import render_prompt_file
 
 # Load environment variables
 load_dotenv()
@@ -22,9 +25,13 @@ async def main():
         f"{api_key}"
     )
 
-    # Set up audio output stream
+    # Set up audio output stream at the device's native rate; the API sends 24 kHz.
+    # sounddevice is imported here so --batch runs on machines without PortAudio.
     try:
-        stream = sd.OutputStream(samplerate=24000, channels=1, dtype=np.int16)
+        import sounddevice as sd
+        device_rate = int(sd.query_devices(kind='output')['default_samplerate'])
+        resampler = PolyphaseResampler(24000, device_rate)
+        stream = sd.OutputStream(samplerate=device_rate, channels=1, dtype=np.int16)
         stream.start()
         print("Audio stream started")
     except Exception as e:
@@ -118,7 +125,7 @@ async def main():
                                 # Decode and play audio
                                 audio_bytes = base64.b64decode(audio_data)
                                 audio = np.frombuffer(audio_bytes, dtype=np.int16)
-                                stream.write(audio)
+                                stream.write(resampler.process_int16(audio))
                                 print(".", end="", flush=True)
                             except Exception as decode_error:
                                 print(f"\nError decoding audio: {decode_error}")
@@ -145,6 +152,29 @@ async def main():
         stream.close()
         print("Audio stream closed")
 
+async def batch_main(args):
+    """Offline rendering: no playback, one WAV per prompt, safe to re-run after failures."""
+    api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    if not api_key:
+        print("Error: AZURE_OPENAI_API_KEY is not set.")
+        return
+    url = (
+        f"wss://aoai-ep-swedencentral02.openai.azure.com/openai/realtime?"
+        "api-version=2024-10-01-preview&deployment=gpt-4o-realtime-preview&api-key="
+        f"{api_key}"
+    )
+    await render_prompt_file(url, args.batch, args.out, args.concurrency,
+                             instructions="Your response should be an enthusiastic introduction of yourself as an AI assistant, mentioning your capabilities for real-time audio conversation. Keep it under 20 seconds.")
+
 if __name__ == "__main__":
     print("Starting real-time API test...")
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", metavar="PROMPTS",
+                        help="JSONL/CSV of prompts to render to WAV files instead of playing one live")
+    parser.add_argument("--out", default="renders", help="output directory for --batch")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent realtime sessions for --batch")
+    args = parser.parse_args()
+    if args.batch:
+        asyncio.run(batch_main(args))
+    else:
+        asyncio.run(main())
\ No newline at end of file
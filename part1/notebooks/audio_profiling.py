@@ -0,0 +1,250 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from voice_tracing import HdrHistogram
+
+##############################
+# 1) EVENT-LOOP LAG MONITOR
+##############################
+class LoopLagMonitor:
+    """
+    Sleeps `interval` seconds in a loop and records how late it wakes up.
+    Anything blocking the loop (output_stream.write, json.loads on a large
+    event, base64 of a long buffer) shows up directly as lag.
+    """
+    def __init__(self, interval=0.01, stall_threshold=0.05, on_stall=None):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.on_stall = on_stall
+        self.lag = HdrHistogram()
+        self.stalls = 0
+        self.task = None
+        self.thread_id = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self.lag.record(lag * 1e6)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                if self.on_stall:
+                    self.on_stall("event_loop", self.thread_id, expected - self.interval, now)
+
+##############################
+# 2) CALLBACK TIMING AGAINST THE BLOCK DEADLINE
+##############################
+class CallbackTimer:
+    """
+    Times a callback against its real-time deadline (blocksize / samplerate;
+    200 ms for the scripts' 4800-frame blocks at 24 kHz) and counts PortAudio
+    status flags reported to audio callbacks.
+    """
+    STATUS_FLAGS = ("input_overflow", "input_underflow", "output_overflow",
+                    "output_underflow", "priming_output")
+
+    def __init__(self, name, deadline, on_miss=None):
+        self.name = name
+        self.deadline = deadline
+        self.on_miss = on_miss
+        self.duration = HdrHistogram()
+        self.calls = 0
+        self.misses = 0
+        self.worst_fraction = 0.0
+        self.status_counts = Counter()
+        self.thread_id = None
+
+    def observe(self, start, end):
+        elapsed = end - start
+        self.calls += 1
+        self.duration.record(elapsed * 1e6)
+        fraction = elapsed / self.deadline
+        self.worst_fraction = max(self.worst_fraction, fraction)
+        if fraction >= 1.0:
+            self.misses += 1
+            if self.on_miss:
+                self.on_miss(self.name, self.thread_id, start, end)
+
+    def count_status(self, status):
+        if not status:
+            return
+        for flag in self.STATUS_FLAGS:
+            if getattr(status, flag, False):
+                self.status_counts[flag] += 1
+
+    def wrap(self, func, audio_callback=False):
+        """Return `func` instrumented; with audio_callback=True the PortAudio `status` argument is counted too."""
+        def timed(*args):
+            self.thread_id = threading.get_ident()
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.observe(start, time.perf_counter())
+                if audio_callback:
+                    self.count_status(args[-1])
+        return timed
+
+##############################
+# 3) SAMPLING PROFILER (dumped on missed deadlines)
+##############################
+class StackSampler:
+    """
+    Background thread sampling the stacks of watched threads every `interval`
+    seconds into a bounded ring. When a deadline is missed, the samples that
+    fall inside the late call are dumped in collapsed-stack ("folded") form,
+    ready for flamegraph.pl or speedscope.
+    """
+    def __init__(self, interval=0.001, history=20000, out_dir="profiles"):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        # Objects exposing .thread_id (the timers and the lag monitor); the id is
+        # read on every tick because the PortAudio thread is only known once
+        # the first callback has run.
+        self.sources = []
+        self.out_dir = out_dir
+        self.running = False
+        self.dumps = 0
+        self.thread = None
+
+    def watch(self, source):
+        self.sources.append(source)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for thread_id in {source.thread_id for source in self.sources}:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = tuple(f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+                                  for entry in traceback.extract_stack(frame))
+                    self.samples.append((now, thread_id, stack))
+            time.sleep(self.interval)
+
+    def dump(self, label, thread_id, start, end):
+        # The call that just finished may still be within the last sampling tick.
+        window = [stack for t, tid, stack in list(self.samples)
+                  if tid == thread_id and start <= t <= end + self.interval]
+        if not window:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.dumps += 1
+        path = os.path.join(self.out_dir, f"{label}_{self.dumps:04d}.folded")
+        with open(path, "w") as f:
+            for stack, count in Counter(window).most_common():
+                f.write(";".join(stack) + f" {count}\n")
+        return path
+
+##############################
+# 4) PROFILER FACADE
+##############################
+class AudioProfiler:
+    """
+    One object to hang off ConversationSystem:
+        profiler = AudioProfiler(blocksize=4800, samplerate=24000)
+        callback = profiler.wrap_audio_callback(self.audio_callback)
+        profiler.start()   # inside the running event loop
+    """
+    def __init__(self, blocksize=4800, samplerate=24000, sample_on_miss=False):
+        deadline = blocksize / samplerate
+        self.sampler = StackSampler() if sample_on_miss else None
+        on_miss = self._on_miss if self.sampler else None
+        self.callback = CallbackTimer("audio_callback", deadline, on_miss)
+        self.process_audio = CallbackTimer("process_audio", deadline, on_miss)
+        self.loop = LoopLagMonitor(on_stall=on_miss)
+
+    @classmethod
+    def from_env(cls, blocksize=4800, samplerate=24000):
+        if os.getenv("AUDIO_PROFILING") != "1":
+            return None
+        return cls(blocksize, samplerate, sample_on_miss=os.getenv("AUDIO_PROFILING_SAMPLER") == "1")
+
+    def wrap_audio_callback(self, func):
+        return self.callback.wrap(func, audio_callback=True)
+
+    def wrap_process_audio(self, func):
+        return self.process_audio.wrap(func)
+
+    def start(self):
+        self.loop.start()
+        if self.sampler:
+            for source in (self.loop, self.callback, self.process_audio):
+                self.sampler.watch(source)
+            self.sampler.start()
+
+    def stop(self):
+        self.loop.stop()
+        if self.sampler:
+            self.sampler.stop()
+
+    def _on_miss(self, label, thread_id, start, end):
+        # Dump from a separate thread: never do file I/O on the audio thread.
+        threading.Thread(target=self._dump, args=(label, thread_id, start, end), daemon=True).start()
+
+    def _dump(self, label, thread_id, start, end):
+        path = self.sampler.dump(label, thread_id, start, end)
+        if path:
+            print(f"\n[profile] {label} overran its deadline ({1000 * (end - start):.1f} ms) -> {path}")
+
+    def report(self):
+        lines = []
+        for timer in (self.callback, self.process_audio):
+            s = timer.duration.summary_ms()
+            lines.append(
+                f"{timer.name:15s} calls={timer.calls:6d} p50={s['p50_ms']:7.3f}ms p99={s['p99_ms']:7.3f}ms "
+                f"max={s['max_ms']:7.3f}ms deadline={1000 * timer.deadline:.0f}ms "
+                f"misses={timer.misses} worst={timer.worst_fraction:.1%}"
+            )
+        if self.callback.status_counts:
+            lines.append(f"portaudio status: {dict(self.callback.status_counts)}")
+        lag = self.loop.lag.summary_ms()
+        lines.append(f"event loop lag  p50={lag['p50_ms']:7.3f}ms p99={lag['p99_ms']:7.3f}ms "
+                     f"max={lag['max_ms']:7.3f}ms stalls={self.loop.stalls}")
+        return "\n".join(lines)
+
+
+async def main():
+    # Self-check: a deliberately blocking loop and a slow callback.
+    profiler = AudioProfiler(blocksize=480, samplerate=24000, sample_on_miss=True)
+    profiler.start()
+
+    def slow_callback(indata, frames, time_info, status):
+        time.sleep(0.03 if frames % 7 == 0 else 0.001)
+
+    callback = profiler.wrap_audio_callback(slow_callback)
+    for i in range(50):
+        callback(None, i, None, None)
+        await asyncio.sleep(0.005)
+    time.sleep(0.1)   # blocks the event loop, like a synchronous stream write
+    await asyncio.sleep(0.05)
+    profiler.stop()
+    print(profiler.report())
+
+if __name__ == "__main__":
+    asyncio.run(main())
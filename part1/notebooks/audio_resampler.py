@@ -0,0 +1,119 @@
+import math
+import time
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+##############################
+# 1) STREAMING POLYPHASE RESAMPLER
+##############################
+class PolyphaseResampler:
+    """
+    Stateful rational resampler (up by L, down by M) built on a Kaiser-windowed
+    sinc low-pass split into L polyphase branches. Blocks of any size can be
+    pushed through and the output is identical to resampling the whole signal
+    at once; only the last taps-1 input samples are kept between calls.
+
+    Added latency is the filter's group delay, about taps_per_phase / 2 input
+    samples (0.27 ms at 44.1 kHz with the default 24 taps).
+    """
+    def __init__(self, in_rate, out_rate, taps_per_phase=24, cutoff=0.92, beta=8.0):
+        g = math.gcd(int(in_rate), int(out_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = self.out_rate // g
+        self.down = self.in_rate // g
+        self.taps = taps_per_phase
+        n_total = self.up * taps_per_phase
+        fc = cutoff * 0.5 / max(self.up, self.down)
+        n = np.arange(n_total) - (n_total - 1) / 2.0
+        prototype = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(n_total, beta) * self.up
+        # Row p holds the branch for output phase p, reversed so each output
+        # sample is a plain dot product with an ascending input window.
+        self.branches = prototype.reshape(taps_per_phase, self.up).T[:, ::-1].astype(np.float32).copy()
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self.consumed = 0      # input samples seen so far
+        self.next_output = 0   # index of the next output sample
+
+    @property
+    def latency_seconds(self):
+        return (self.taps - 1) / 2.0 / self.in_rate
+
+    def process(self, block):
+        """Resample a float32 (or any numeric) mono block; returns float32."""
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        if self.up == self.down:
+            return block
+        buffer = np.concatenate((self.history, block))
+        last_input = self.consumed + len(block) - 1
+        last_output = ((last_input + 1) * self.up - 1) // self.down
+        k = np.arange(self.next_output, last_output + 1, dtype=np.int64)
+        position = k * self.down
+        input_index = position // self.up
+        phase = position % self.up
+        # Window t covers buffer[t : t + taps]; its last sample is input_index.
+        window_start = input_index - (self.consumed - (self.taps - 1)) - (self.taps - 1)
+        windows = sliding_window_view(buffer, self.taps)[window_start]
+        out = np.einsum("kt,kt->k", windows, self.branches[phase])
+        self.history = buffer[-(self.taps - 1):].copy()
+        self.consumed += len(block)
+        self.next_output = last_output + 1
+        return out
+
+    def process_int16(self, block):
+        """int16 in, int16 out (clipped) - the format the realtime pipeline uses."""
+        block = np.asarray(block, dtype=np.int16).reshape(-1)
+        if self.up == self.down:
+            return block
+        out = self.process(block)
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+    def reset(self):
+        self.history[:] = 0
+        self.consumed = 0
+        self.next_output = 0
+
+##############################
+# 2) FILE HELPER
+##############################
+def read_wav_resampled(path, target_rate=24000, chunk_frames=8192):
+    """Read a mono/stereo 16-bit WAV at any rate and return int16 mono at `target_rate`."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        channels = wav.getnchannels()
+        resampler = PolyphaseResampler(wav.getframerate(), target_rate)
+        pieces = []
+        while True:
+            frames = wav.readframes(chunk_frames)
+            if not frames:
+                break
+            samples = np.frombuffer(frames, dtype=np.int16)
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1)
+            pieces.append(resampler.process_int16(samples))
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+
+##############################
+# 3) THROUGHPUT BENCHMARK
+##############################
+def benchmark(seconds=10.0, block=4800):
+    """Samples/sec per core for the conversions we meet in practice."""
+    for in_rate, out_rate in ((44100, 24000), (48000, 24000), (24000, 48000), (24000, 44100)):
+        resampler = PolyphaseResampler(in_rate, out_rate)
+        signal = (np.random.randn(int(seconds * in_rate)) * 3000).astype(np.int16)
+        start = time.perf_counter()
+        produced = 0
+        for i in range(0, len(signal), block):
+            produced += len(resampler.process_int16(signal[i:i + block]))
+        elapsed = time.perf_counter() - start
+        print(f"{in_rate:5d} -> {out_rate:5d} Hz: {len(signal) / elapsed / 1e6:6.2f} M input samples/s "
+              f"({seconds / elapsed:6.0f}x realtime, {produced} out, "
+              f"latency {1000 * resampler.latency_seconds:.2f} ms)")
+
+if __name__ == "__main__":
+    import os
+    tone = read_wav_resampled(os.path.join(os.path.dirname(os.path.abspath(__file__)), "simple_tone.wav"))
+    print(f"simple_tone.wav -> {len(tone)} samples at 24 kHz ({len(tone) / 24000:.2f}s)")
+    benchmark()
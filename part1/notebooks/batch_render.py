@@ -0,0 +1,243 @@
+import asyncio
+import base64
+import csv
+import json
+import os
+import re
+import time
+import wave
+
+import websockets
+
+##############################
+# 1) PROMPT FILES
+##############################
+def load_prompts(path):
+    """
+    Read prompts from JSONL ({"id": ..., "prompt": ..., "instructions": ..., "voice": ...})
+    or CSV with the same column names. Only "prompt" is required; ids default to the row number.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    prompts = []
+    for index, row in enumerate(rows):
+        if not row.get("prompt"):
+            raise ValueError(f"{path}: row {index + 1} has no prompt")
+        row = {k: v for k, v in row.items() if v not in (None, "")}
+        row["id"] = re.sub(r"[^\w.-]", "_", str(row.get("id", f"{index:06d}")))
+        prompts.append(row)
+    return prompts
+
+##############################
+# 2) BATCH RENDERER
+##############################
+# Server VAD is off: each prompt is one explicit response.create.
+DEFAULT_SESSION = {
+    "modalities": ["audio", "text"],
+    "voice": "alloy",
+    "output_audio_format": "pcm16",
+    "turn_detection": None,
+}
+
+
+class RenderError(Exception):
+    pass
+
+
+class BatchRenderer:
+    """
+    Renders prompts to 24 kHz pcm16 WAV files over `concurrency` realtime sessions.
+
+    - Each worker keeps one WebSocket open and reuses it across prompts, deleting
+      the prompt and reply items after every response so sessions don't carry
+      context from one asset into the next (and the handshake is paid once per worker).
+    - Audio deltas are written straight to <id>.wav.part and renamed to <id>.wav
+      only after response.done, so a finished file always means a complete asset.
+    - Resuming is just re-running: prompts whose WAV already exists are skipped.
+      Every attempt is appended to manifest.jsonl.
+    """
+    def __init__(self, url, out_dir, concurrency=8, max_attempts=3, timeout=120.0,
+                 session=None, connect_kwargs=None):
+        self.url = url
+        self.out_dir = out_dir
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.session = session or DEFAULT_SESSION
+        self.connect_kwargs = connect_kwargs or {}
+        self.stats = {"rendered": 0, "skipped": 0, "failed": 0, "retries": 0,
+                      "connections": 0, "audio_seconds": 0.0}
+        self.manifest_path = os.path.join(out_dir, "manifest.jsonl")
+
+    def wav_path(self, prompt):
+        return os.path.join(self.out_dir, f"{prompt['id']}.wav")
+
+    async def run(self, prompts):
+        os.makedirs(self.out_dir, exist_ok=True)
+        queue = asyncio.Queue()
+        for prompt in prompts:
+            if os.path.exists(self.wav_path(prompt)):
+                self.stats["skipped"] += 1
+            else:
+                queue.put_nowait(prompt)
+        pending = queue.qsize()
+        start = time.monotonic()
+        with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+            workers = [asyncio.create_task(self._worker(queue, manifest))
+                       for _ in range(min(self.concurrency, pending))]
+            await asyncio.gather(*workers)
+        self.stats["seconds"] = time.monotonic() - start
+        self.stats["prompts_per_minute"] = 60 * self.stats["rendered"] / max(self.stats["seconds"], 1e-9)
+        return self.stats
+
+    async def _connect(self):
+        ws = await websockets.connect(self.url, max_size=None, **self.connect_kwargs)
+        self.stats["connections"] += 1
+        await ws.send(json.dumps({"type": "session.update", "session": self.session}))
+        return ws
+
+    async def _worker(self, queue, manifest):
+        ws = None
+        try:
+            while not queue.empty():
+                prompt = queue.get_nowait()
+                for attempt in range(1, self.max_attempts + 1):
+                    started = time.monotonic()
+                    try:
+                        if ws is None:
+                            ws = await self._connect()
+                        audio_seconds = await asyncio.wait_for(self._render(ws, prompt), self.timeout)
+                    except (RenderError, OSError, asyncio.TimeoutError,
+                            websockets.exceptions.WebSocketException) as e:
+                        self._log(manifest, prompt, "error", started, attempt, error=repr(e))
+                        # The session may be in an unknown state; start a fresh one.
+                        if ws is not None:
+                            await ws.close()
+                            ws = None
+                        if attempt < self.max_attempts:
+                            self.stats["retries"] += 1
+                            await asyncio.sleep(min(8.0, 0.5 * 2 ** (attempt - 1)))
+                        else:
+                            self.stats["failed"] += 1
+                        continue
+                    except Exception as e:
+                        # Anything else (a malformed event, a full disk) is not worth
+                        # retrying, but it fails this prompt, not the whole batch.
+                        self._log(manifest, prompt, "error", started, attempt, error=repr(e))
+                        if ws is not None:
+                            await ws.close()
+                            ws = None
+                        self.stats["failed"] += 1
+                        break
+                    self.stats["rendered"] += 1
+                    self.stats["audio_seconds"] += audio_seconds
+                    self._log(manifest, prompt, "ok", started, attempt, audio_seconds=round(audio_seconds, 3))
+                    break
+        finally:
+            if ws is not None:
+                await ws.close()
+
+    async def _render(self, ws, prompt):
+        part_path = self.wav_path(prompt) + ".part"
+        user_item = f"prompt_{prompt['id']}"[:32]
+        await ws.send(json.dumps({
+            "type": "conversation.item.create",
+            "item": {"id": user_item, "type": "message", "role": "user",
+                     "content": [{"type": "input_text", "text": prompt["prompt"]}]},
+        }))
+        response = {"modalities": ["audio", "text"]}
+        for key in ("instructions", "voice"):
+            if key in prompt:
+                response[key] = prompt[key]
+        await ws.send(json.dumps({"type": "response.create", "response": response}))
+
+        frames = 0
+        wav = wave.open(part_path, "wb")
+        try:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(24000)
+            async for raw in ws:
+                event = json.loads(raw)
+                kind = event.get("type")
+                if kind == "response.audio.delta":
+                    audio = base64.b64decode(event["delta"])
+                    wav.writeframesraw(audio)
+                    frames += len(audio) // 2
+                elif kind == "error":
+                    raise RenderError(event.get("error", {}).get("message", "realtime error"))
+                elif kind == "response.done":
+                    done = event["response"]
+                    if done.get("status") != "completed":
+                        raise RenderError(f"response {done.get('status')}: {done.get('status_details')}")
+                    break
+            else:
+                raise RenderError("connection closed before response.done")
+        except BaseException:
+            wav.close()
+            os.remove(part_path)
+            raise
+        wav.close()
+        os.replace(part_path, self.wav_path(prompt))
+
+        # Drop this prompt's items so the next one starts from an empty conversation.
+        item_ids = [user_item] + [item["id"] for item in done.get("output", [])]
+        for item_id in item_ids:
+            await ws.send(json.dumps({"type": "conversation.item.delete", "item_id": item_id}))
+        return frames / 24000
+
+    def _log(self, manifest, prompt, status, started, attempt, **extra):
+        record = {"id": prompt["id"], "status": status, "attempt": attempt,
+                  "seconds": round(time.monotonic() - started, 3), **extra}
+        manifest.write(json.dumps(record) + "\n")
+        manifest.flush()
+
+
+def print_stats(stats):
+    print(f"rendered {stats['rendered']}, skipped {stats['skipped']} (already done), "
+          f"failed {stats['failed']}, retries {stats['retries']}, connections {stats['connections']}")
+    print(f"{stats['seconds']:.1f}s wall, {stats['prompts_per_minute']:.0f} prompts/minute, "
+          f"{stats['audio_seconds'] / 60:.1f} min of audio")
+
+async def render_prompt_file(url, prompt_file, out_dir, concurrency=8, instructions=None):
+    """Entry point for the audio_generation scripts' --batch mode."""
+    session = dict(DEFAULT_SESSION)
+    if instructions:
+        session["instructions"] = instructions
+    prompts = load_prompts(prompt_file)
+    print(f"Rendering {len(prompts)} prompts from {prompt_file} into {out_dir}/ ({concurrency} sessions)")
+    stats = await BatchRenderer(url, out_dir, concurrency, session=session).run(prompts)
+    print_stats(stats)
+    return stats
+
+##############################
+# 3) OFFLINE DEMO against RealtimeStub
+##############################
+async def demo(prompts=200, concurrency=16):
+    import random
+    import tempfile
+    from realtime_stub import RealtimeStub
+
+    work = tempfile.mkdtemp(prefix="batch_render_")
+    prompt_file = os.path.join(work, "prompts.jsonl")
+    with open(prompt_file, "w") as f:
+        for i in range(prompts):
+            f.write(json.dumps({"id": f"robot_{i:04d}", "prompt": f"Tell story number {i}."}) + "\n")
+    out_dir = os.path.join(work, "wav")
+
+    # Slow first audio (0.2-0.6s), and one response in ten drops the connection.
+    async with RealtimeStub(response_delay=lambda: random.uniform(0.2, 0.6), drop_rate=0.1) as stub:
+        url = stub.url
+        print(f"First pass ({prompts} prompts, concurrency {concurrency}, one attempt each):")
+        print_stats(await BatchRenderer(url, out_dir, concurrency, max_attempts=1).run(load_prompts(prompt_file)))
+        print("\nResumed pass (same command, retries on):")
+        print_stats(await BatchRenderer(url, out_dir, concurrency).run(load_prompts(prompt_file)))
+        print("\nSequential baseline on 20 fresh prompts:")
+        print_stats(await BatchRenderer(url, os.path.join(work, "seq"), 1).run(load_prompts(prompt_file)[:20]))
+    print(f"\nWAV files in {out_dir}: {len([n for n in os.listdir(out_dir) if n.endswith('.wav')])}")
+
+if __name__ == "__main__":
+    asyncio.run(demo())
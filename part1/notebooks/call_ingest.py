@@ -0,0 +1,356 @@
+import asyncio
+import base64
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+import websockets
+
+from audio_resampler import PolyphaseResampler
+
+##############################
+# 1) MEMORY-MAPPED WAV
+##############################
+class MappedWav:
+    """
+    A 16-bit PCM WAV file mapped read-only into memory. The RIFF chunks are
+    walked once to find "fmt " and "data"; after that `chunks()` hands out
+    memoryview slices of the mapping, so a 24 kHz mono file goes from the page
+    cache to base64 without an intermediate copy. Other rates or channel
+    counts are converted per chunk, so only one chunk is ever materialized.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:4] != b"RIFF" or self.map[8:12] != b"WAVE":
+            self.close()
+            raise ValueError(f"{path}: not a RIFF/WAVE file")
+        self.data_offset = self.data_size = None
+        offset = 12
+        while offset + 8 <= len(self.map):
+            chunk_id, size = struct.unpack_from("<4sI", self.map, offset)
+            if chunk_id == b"fmt ":
+                fmt, self.channels, self.rate, _, _, bits = struct.unpack_from("<HHIIHH", self.map, offset + 8)
+                if fmt != 1 or bits != 16:
+                    self.close()
+                    raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+            elif chunk_id == b"data":
+                self.data_offset = offset + 8
+                # Streaming writers leave 0 or 0xFFFFFFFF here; trust the file size instead.
+                self.data_size = min(size, len(self.map) - self.data_offset)
+                break
+            offset += 8 + size + (size & 1)
+        if self.data_offset is None:
+            self.close()
+            raise ValueError(f"{path}: no data chunk")
+        self.frames = self.data_size // (2 * self.channels)
+
+    @property
+    def seconds(self):
+        return self.frames / self.rate
+
+    def chunks(self, target_rate=24000, chunk_ms=500):
+        """
+        Yield pcm16 mono `target_rate` chunks. When no conversion is needed these
+        are memoryviews into the mapping, valid only until the next chunk is requested.
+        """
+        frame_bytes = 2 * self.channels
+        frames_per_chunk = max(1, int(self.rate * chunk_ms / 1000))
+        end = self.data_offset + self.frames * frame_bytes
+        view = memoryview(self.map)
+        if self.rate == target_rate and self.channels == 1:
+            try:
+                for start in range(self.data_offset, end, frames_per_chunk * frame_bytes):
+                    # Released on resume so the mapping can be closed afterwards.
+                    with view[start:min(start + frames_per_chunk * frame_bytes, end)] as piece:
+                        yield piece
+            finally:
+                view.release()
+            return
+        resampler = PolyphaseResampler(self.rate, target_rate)
+        try:
+            for start in range(self.data_offset, end, frames_per_chunk * frame_bytes):
+                with view[start:min(start + frames_per_chunk * frame_bytes, end)] as piece:
+                    block = np.frombuffer(piece, dtype=np.int16)
+                    if self.channels > 1:
+                        block = block.reshape(-1, self.channels).mean(axis=1)
+                    converted = resampler.process_int16(block).tobytes()
+                    del block
+                yield converted
+        finally:
+            view.release()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+##############################
+# 2) INGESTION PIPELINE
+##############################
+# Same event flow as ConversationSystem.send_audio_to_azure -> handle_response,
+# but with server VAD off (one committed turn per call) and a text-only reply.
+DEFAULT_SESSION = {
+    "modalities": ["text"],
+    "instructions": "You are reviewing a recorded customer call. Summarize the caller's request "
+                    "and give the answer an agent should have given.",
+    "input_audio_format": "pcm16",
+    "input_audio_transcription": {"model": "whisper-1"},
+    "turn_detection": None,
+}
+
+
+APPEND_PREFIX = b'{"type": "input_audio_buffer.append", "audio": "'
+APPEND_SUFFIX = b'"}'
+
+
+class IngestError(Exception):
+    pass
+
+
+class CallIngestor:
+    """
+    Runs recorded calls through the realtime API over `concurrency` sockets
+    and appends one JSONL record per file (transcript, response, usage,
+    timings). Files already recorded as "ok" in the output are skipped, so an
+    interrupted run resumes where it stopped.
+    """
+    def __init__(self, url, output_path, concurrency=8, chunk_ms=500, max_attempts=3,
+                 transcript_grace=10.0, response_timeout=120.0, session=None, connect_kwargs=None):
+        self.url = url
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.chunk_ms = chunk_ms
+        self.max_attempts = max_attempts
+        self.transcript_grace = transcript_grace
+        self.response_timeout = response_timeout
+        self.session = session or DEFAULT_SESSION
+        self.connect_kwargs = connect_kwargs or {}
+        self.stats = {"files": 0, "skipped": 0, "failed": 0, "retries": 0, "timeouts": 0,
+                      "audio_seconds": 0.0, "bytes_sent": 0}
+        # Set by completed(): the output ends in a partial line from a killed run.
+        self.torn_tail = False
+
+    def completed(self):
+        done = set()
+        if os.path.exists(self.output_path):
+            with open(self.output_path, encoding="utf-8") as f:
+                for line in f:
+                    self.torn_tail = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves a truncated last line.
+                        continue
+                    if record.get("status") == "ok":
+                        done.add(record["file"])
+        return done
+
+    async def run(self, paths):
+        done = self.completed()
+        queue = asyncio.Queue()
+        for path in paths:
+            if path in done:
+                self.stats["skipped"] += 1
+            else:
+                queue.put_nowait(path)
+        start = time.monotonic()
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            if self.torn_tail:
+                # Don't glue the first new record onto the truncated line.
+                out.write("\n")
+            workers = [asyncio.create_task(self._worker(queue, out))
+                       for _ in range(min(self.concurrency, queue.qsize()))]
+            await asyncio.gather(*workers)
+        wall = time.monotonic() - start
+        self.stats["seconds"] = wall
+        self.stats["audio_hours_per_hour"] = self.stats["audio_seconds"] / max(wall, 1e-9)
+        return self.stats
+
+    async def _connect(self):
+        # permessage-deflate spends more CPU than anything else here and barely
+        # shrinks base64 audio, so ingestion sockets go uncompressed.
+        kwargs = {"max_size": None, "compression": None, **self.connect_kwargs}
+        ws = await websockets.connect(self.url, **kwargs)
+        await ws.send(json.dumps({"type": "session.update", "session": self.session}))
+        return ws
+
+    async def _worker(self, queue, out):
+        ws = None
+        try:
+            while not queue.empty():
+                path = queue.get_nowait()
+                for attempt in range(1, self.max_attempts + 1):
+                    started = time.monotonic()
+                    try:
+                        if ws is None:
+                            ws = await self._connect()
+                        record = await self._ingest(ws, path)
+                    except (IngestError, OSError, ValueError,
+                            websockets.exceptions.WebSocketException) as e:
+                        if ws is not None:
+                            await ws.close()
+                            ws = None
+                        if attempt < self.max_attempts and not isinstance(e, ValueError):
+                            self.stats["retries"] += 1
+                            await asyncio.sleep(min(8.0, 0.5 * 2 ** (attempt - 1)))
+                            continue
+                        self.stats["failed"] += 1
+                        record = {"file": path, "status": "error", "error": repr(e)}
+                    else:
+                        self.stats["files"] += 1
+                        self.stats["audio_seconds"] += record["audio_seconds"]
+                    record["attempts"] = attempt
+                    record["seconds"] = round(time.monotonic() - started, 3)
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    break
+        finally:
+            if ws is not None:
+                await ws.close()
+
+    async def _ingest(self, ws, path):
+        with MappedWav(path) as wav:
+            upload_start = time.monotonic()
+            for chunk in wav.chunks(chunk_ms=self.chunk_ms):
+                self.stats["bytes_sent"] += len(chunk)
+                # base64 never needs JSON escaping, so skip the encoder's scan of the payload.
+                await ws.send(APPEND_PREFIX + base64.b64encode(chunk) + APPEND_SUFFIX)
+            audio_seconds = wav.seconds
+        await ws.send(json.dumps({"type": "input_audio_buffer.commit"}))
+        await ws.send(json.dumps({"type": "response.create",
+                                  "response": {"modalities": self.session.get("modalities", ["text"])}}))
+        upload_seconds = time.monotonic() - upload_start
+
+        user_item = transcript = usage = None
+        response_text = []
+        response_done = None
+        output_items = []
+        # A server that never sends response.done must not hold the worker forever.
+        deadline = time.monotonic() + self.response_timeout
+        while True:
+            if response_done is not None:
+                # The transcript arrives asynchronously and may trail response.done.
+                timeout = max(0.0, response_done + self.transcript_grace - time.monotonic())
+            else:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout)
+            except asyncio.TimeoutError:
+                if response_done is None:
+                    self.stats["timeouts"] += 1
+                    raise IngestError(f"no response.done within {self.response_timeout:g}s")
+                break
+            event = json.loads(raw)
+            kind = event.get("type")
+            if kind == "input_audio_buffer.committed":
+                user_item = event["item_id"]
+            elif kind == "conversation.item.input_audio_transcription.completed":
+                if event.get("item_id") == user_item:
+                    transcript = event.get("transcript", "")
+            elif kind == "conversation.item.input_audio_transcription.failed":
+                if event.get("item_id") == user_item:
+                    transcript = ""
+            elif kind in ("response.text.delta", "response.audio_transcript.delta"):
+                response_text.append(event.get("delta", ""))
+            elif kind == "error":
+                raise IngestError(event.get("error", {}).get("message", "realtime error"))
+            elif kind == "response.done":
+                done = event["response"]
+                if done.get("status") != "completed":
+                    raise IngestError(f"response {done.get('status')}: {done.get('status_details')}")
+                usage = done.get("usage")
+                output_items = [item["id"] for item in done.get("output", [])]
+                response_done = time.monotonic()
+                if "input_audio_transcription" not in self.session:
+                    break
+            if response_done is not None and transcript is not None:
+                break
+
+        # Clear the conversation so the next call on this socket starts fresh.
+        for item_id in ([user_item] if user_item else []) + output_items:
+            await ws.send(json.dumps({"type": "conversation.item.delete", "item_id": item_id}))
+        return {"file": path, "status": "ok", "audio_seconds": round(audio_seconds, 3),
+                "transcript": transcript, "response": "".join(response_text).strip(),
+                "usage": usage, "upload_seconds": round(upload_seconds, 3)}
+
+
+def print_stats(stats):
+    print(f"files {stats['files']}, skipped {stats['skipped']}, failed {stats['failed']}, "
+          f"retries {stats['retries']}, timeouts {stats['timeouts']}, "
+          f"{stats['bytes_sent'] / 1e6:.0f} MB of pcm16 sent")
+    print(f"{stats['audio_seconds'] / 3600:.2f} h of audio in {stats['seconds']:.1f}s wall = "
+          f"{stats['audio_hours_per_hour']:.0f} audio-hours per wall-clock hour")
+
+##############################
+# 3) OFFLINE DEMO against RealtimeStub
+##############################
+def write_synthetic_calls(directory, count=24, seed=0):
+    """Noise-and-tone 'calls' of 1-4 minutes; every fourth one is 8 kHz telephony audio."""
+    import wave
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        rate = 8000 if i % 4 == 3 else 24000
+        seconds = int(rng.integers(60, 240))
+        t = np.arange(seconds * rate) / rate
+        audio = (4000 * np.sin(2 * np.pi * 300 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0)
+                 + 500 * rng.standard_normal(len(t))).astype(np.int16)
+        path = os.path.join(directory, f"call_{i:03d}.wav")
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(audio.tobytes())
+        paths.append(path)
+    return paths
+
+
+async def demo():
+    import tempfile
+    from realtime_stub import RealtimeStub
+
+    work = tempfile.mkdtemp(prefix="call_ingest_")
+    paths = write_synthetic_calls(work)
+    async with RealtimeStub(response_delay=0.5, reply_text="The caller asked about their balance.") as stub:
+        for concurrency in (1, 8):
+            out = os.path.join(work, f"results_c{concurrency}.jsonl")
+            print(f"concurrency {concurrency}:")
+            print_stats(await CallIngestor(stub.url, out, concurrency=concurrency).run(paths))
+        print("re-run (resume):")
+        print_stats(await CallIngestor(stub.url, out, concurrency=8).run(paths))
+    with open(out) as f:
+        print("sample record:", f.readline().strip())
+
+
+async def main(args):
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    if not api_key:
+        print("Error: AZURE_OPENAI_API_KEY is not set.")
+        return
+    url = (
+        f"wss://aoai-ep-swedencentral02.openai.azure.com/openai/realtime?"
+        "api-version=2024-10-01-preview&deployment=gpt-4o-realtime-preview&api-key="
+        f"{api_key}"
+    )
+    print_stats(await CallIngestor(url, args.out, concurrency=args.concurrency).run(args.files))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Transcribe and answer recorded calls (no files: offline demo)")
+    parser.add_argument("files", nargs="*", help="16-bit PCM WAV files")
+    parser.add_argument("--out", default="call_results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args) if args.files else demo())
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import time
+
+##############################
+# LOCAL CHAT COMPLETIONS STUB
+##############################
+# A tiny HTTP/1.1 server that speaks just enough of the Azure OpenAI
+# chat completions protocol for offline tests and benchmarks.
+# Point AzureOpenAIChatCompletionClient (or openai.AsyncAzureOpenAI) at
+# stub.endpoint with any api_key and it will answer every POST.
+class ChatCompletionsStub:
+    def __init__(self, host="127.0.0.1", port=0, reply="Stub reply.",
+                 max_requests=None, window=60.0, delay=0.0):
+        self.host = host
+        self.port = port
+        self.reply = reply
+        # Simulated service-side rate limit: more than max_requests requests in
+        # a rolling `window` seconds get a 429 with a retry-after header.
+        self.max_requests = max_requests
+        self.window = window
+        # Seconds to wait before the first byte (or a callable returning it).
+        self.delay = delay
+        self.server = None
+        self.request_times = []
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0}
+
+    @property
+    def endpoint(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _current_delay(self):
+        return self.delay() if callable(self.delay) else self.delay
+
+    def _retry_after(self):
+        """Seconds until the rolling window admits another request, or None if it does now."""
+        if self.max_requests is None:
+            return None
+        now = time.monotonic()
+        self.request_times = [t for t in self.request_times if now - t < self.window]
+        if len(self.request_times) >= self.max_requests:
+            return self.request_times[0] + self.window - now
+        self.request_times.append(now)
+        return None
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+        return json.loads(body) if body else {}
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            self.stats["requests"] += 1
+            retry_after = self._retry_after()
+            if retry_after is not None:
+                self.stats["rate_limited"] += 1
+                self._write_json(writer, 429, {
+                    "error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}
+                }, extra_headers={"retry-after": str(max(1, round(retry_after))),
+                                  "retry-after-ms": str(int(retry_after * 1000))})
+                await writer.drain()
+                return
+            await asyncio.sleep(self._current_delay())
+            model = request.get("model", "gpt-4o-mini")
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+            completion_tokens = max(1, len(self.reply) // 4)
+            if request.get("stream"):
+                await self._write_stream(writer, model, prompt_tokens, completion_tokens)
+            else:
+                self._write_json(writer, 200, {
+                    "id": f"chatcmpl-stub-{self.stats['requests']}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": self.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+            self.stats["ok"] += 1
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _write_json(self, writer, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        reason = {200: "OK", 429: "Too Many Requests"}.get(status, "Error")
+        headers = [
+            f"HTTP/1.1 {status} {reason}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        for key, value in (extra_headers or {}).items():
+            headers.append(f"{key}: {value}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def _write_stream(self, writer, model, prompt_tokens, completion_tokens):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        chunk_id = f"chatcmpl-stub-{self.stats['requests']}"
+        for word in self.reply.split(" "):
+            self._write_event(writer, {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            })
+            await writer.drain()
+        self._write_event(writer, {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+        writer.write(b"data: [DONE]\n\n")
+
+    def _write_event(self, writer, payload):
+        writer.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+
+async def main():
+    async with ChatCompletionsStub(port=8765, max_requests=30) as stub:
+        print(f"Chat completions stub listening on {stub.endpoint}")
+        await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
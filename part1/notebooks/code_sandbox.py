@@ -0,0 +1,340 @@
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from voice_tracing import HdrHistogram
+
+# Imported once per worker (and once in the fork server), so snippets can use
+# them without paying the import. "module as alias" binds the alias too.
+DEFAULT_PRELOAD = (
+    "math", "json", "re", "random", "statistics", "itertools", "functools",
+    "collections", "datetime", "decimal", "fractions", "textwrap", "numpy as np",
+)
+
+##############################
+# 1) WORKER PROCESS
+##############################
+def _preload(preload):
+    import importlib
+    namespace = {}
+    for spec in preload:
+        module, _, alias = spec.partition(" as ")
+        try:
+            namespace[alias or module.split(".")[0]] = importlib.import_module(module)
+        except ImportError:
+            pass
+    return namespace
+
+
+def _limit(memory_mb):
+    import resource
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # No core dumps and no large files from snippets.
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (16 * 1024 * 1024, 16 * 1024 * 1024))
+
+
+def _cpu_budget(seconds):
+    """Let the next snippet use `seconds` more CPU; past that the kernel sends SIGXCPU."""
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+
+
+def _worker_main(conn, preload, memory_mb, cpu_seconds, max_output, workdir):
+    import builtins
+    import traceback
+    namespace = _preload(preload)
+    os.chdir(workdir)
+    _limit(memory_mb)
+    conn.send(("ready", os.getpid()))
+    while True:
+        code = conn.recv()
+        if code is None:
+            return
+        started = time.monotonic()
+        output = io.StringIO()
+        scope = {"__name__": "__snippet__", "__builtins__": builtins, **namespace}
+        error = None
+        _cpu_budget(cpu_seconds)
+        try:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                exec(compile(code, "<snippet>", "exec"), scope)
+        except MemoryError:
+            error = f"MemoryError: snippet exceeded the {memory_mb} MB memory cap"
+        except BaseException as e:
+            error = traceback.format_exception_only(type(e), e)[-1].strip()
+        del scope
+        text = output.getvalue()
+        conn.send({"started": started, "seconds": time.monotonic() - started,
+                   "output": text[:max_output], "truncated": len(text) > max_output, "error": error})
+
+##############################
+# 2) POOL
+##############################
+class SnippetResult:
+    __slots__ = ("output", "error", "truncated", "timed_out", "seconds", "start_ms", "worker")
+
+    def __init__(self, output="", error=None, truncated=False, timed_out=False, seconds=0.0,
+                 start_ms=0.0, worker=None):
+        self.output = output
+        self.error = error
+        self.truncated = truncated
+        self.timed_out = timed_out
+        self.seconds = seconds
+        self.start_ms = start_ms
+        self.worker = worker
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        state = "ok" if self.ok else repr(self.error)
+        return f"SnippetResult({state}, {self.seconds * 1000:.1f} ms, output={self.output[:60]!r})"
+
+
+class _Worker:
+    def __init__(self, process, conn, workdir):
+        self.process = process
+        self.conn = conn
+        self.workdir = workdir
+        self.runs = 0
+
+
+class CodeSandboxPool:
+    """
+    Warm worker processes for running generated Python snippets:
+
+        pool = CodeSandboxPool(size=4, timeout=5.0, memory_mb=256)
+        pool.start()                                  # blocking; fine in a bring-up thread
+        result = await pool.run("print(sum(range(10)))")
+        result.output, result.error, result.timed_out
+
+    Workers are forked from a fork server that has DEFAULT_PRELOAD already
+    imported. Each one runs snippets in a fresh globals dict with stdout and
+    stderr captured, inside its own temporary working directory. Limits:
+    - address space is capped at memory_mb;
+    - CPU per snippet is capped by RLIMIT_CPU;
+    - wall time is capped by `timeout`, after which the worker is killed.
+    A worker is retired after max_runs snippets, or after any timeout or crash,
+    and a replacement is forked in the background.
+
+    This is process isolation with resource limits, not a security boundary:
+    snippets can still read files and open sockets as the current user.
+    """
+    def __init__(self, size=4, max_runs=50, timeout=5.0, memory_mb=256, preload=DEFAULT_PRELOAD,
+                 max_output=64_000, start_method="forkserver"):
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.preload = preload
+        self.max_output = max_output
+        self.context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            self.context.set_forkserver_preload([spec.partition(" as ")[0] for spec in preload] + [__name__])
+        self.idle = None
+        self.workers = set()
+        self.replacing = set()
+        self.closed = False
+        self.start_latency = HdrHistogram()
+        self.stats = {"runs": 0, "errors": 0, "timeouts": 0, "crashes": 0, "recycled": 0, "spawned": 0}
+
+    def _spawn(self):
+        parent, child = self.context.Pipe()
+        workdir = tempfile.mkdtemp(prefix="code-sandbox-")
+        process = self.context.Process(
+            target=_worker_main, name="code-sandbox", daemon=True,
+            args=(child, self.preload, self.memory_mb, self.timeout, self.max_output, workdir))
+        process.start()
+        child.close()
+        parent.recv()  # ("ready", pid)
+        self.stats["spawned"] += 1
+        return _Worker(process, parent, workdir)
+
+    def start(self):
+        """Fork `size` workers and wait until each has its imports loaded."""
+        self.idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = self._spawn()
+            self.workers.add(worker)
+            self.idle.put_nowait(worker)
+        return self
+
+    async def astart(self):
+        await asyncio.to_thread(self.start)
+        return self
+
+    async def run(self, code, timeout=None):
+        if self.idle is None:
+            await self.astart()
+        timeout = timeout or self.timeout
+        submitted = time.monotonic()
+        worker = await self.idle.get()
+        loop = asyncio.get_running_loop()
+        reply = loop.create_future()
+
+        def readable():
+            loop.remove_reader(worker.conn.fileno())
+            try:
+                reply.set_result(worker.conn.recv())
+            except (EOFError, OSError) as e:
+                reply.set_exception(e)
+
+        worker.conn.send(code)
+        worker.runs += 1
+        self.stats["runs"] += 1
+        loop.add_reader(worker.conn.fileno(), readable)
+        try:
+            message = await asyncio.wait_for(reply, timeout)
+        except asyncio.TimeoutError:
+            loop.remove_reader(worker.conn.fileno())
+            self.stats["timeouts"] += 1
+            self._retire(worker)
+            return SnippetResult(error=f"TimeoutError: snippet ran longer than {timeout:g}s",
+                                 timed_out=True, seconds=time.monotonic() - submitted,
+                                 worker=worker.process.pid)
+        except asyncio.CancelledError:
+            # The worker may still be running the snippet; it can't go back to
+            # idle with a reply pending, so replace it to keep the pool's capacity.
+            loop.remove_reader(worker.conn.fileno())
+            self._retire(worker)
+            raise
+        except (EOFError, OSError):
+            self.stats["crashes"] += 1
+            self._retire(worker)
+            code = worker.process.exitcode
+            reason = "CPU limit" if code == -24 else f"exit code {code}"  # -24: SIGXCPU
+            return SnippetResult(error=f"WorkerCrashed: sandbox process died ({reason})",
+                                 seconds=time.monotonic() - submitted, worker=worker.process.pid)
+        start_ms = 1000 * (message["started"] - submitted)
+        self.start_latency.record(start_ms * 1000)
+        if message["error"]:
+            self.stats["errors"] += 1
+        if worker.runs >= self.max_runs:
+            self.stats["recycled"] += 1
+            self._retire(worker)
+        else:
+            self.idle.put_nowait(worker)
+        return SnippetResult(message["output"], message["error"], message["truncated"], False,
+                             message["seconds"], start_ms, worker.process.pid)
+
+    def _retire(self, worker):
+        self.workers.discard(worker)
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(asyncio.to_thread(self._replace, worker, loop))
+        self.replacing.add(task)
+        task.add_done_callback(self.replacing.discard)
+
+    def _replace(self, worker, loop):
+        self._stop(worker)
+        if self.closed:
+            return
+        fresh = self._spawn()
+        self.workers.add(fresh)
+        # The queue is only touched from the loop thread.
+        loop.call_soon_threadsafe(self.idle.put_nowait, fresh)
+
+    def _stop(self, worker):
+        if worker.process.is_alive():
+            with contextlib.suppress(OSError):
+                worker.conn.send(None)
+            worker.process.join(0.5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        worker.conn.close()
+        shutil.rmtree(worker.workdir, ignore_errors=True)
+
+    async def close(self):
+        self.closed = True
+        if self.replacing:
+            await asyncio.gather(*self.replacing, return_exceptions=True)
+        workers = list(self.workers)
+        self.workers.clear()
+        await asyncio.to_thread(lambda: [self._stop(w) for w in workers])
+
+    async def __aenter__(self):
+        return await self.astart()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def report(self):
+        latency = self.start_latency.summary_ms()
+        s = self.stats
+        return (f"runs {s['runs']}  errors {s['errors']}  timeouts {s['timeouts']}  crashes {s['crashes']}  "
+                f"recycled {s['recycled']}  workers spawned {s['spawned']}  start latency "
+                f"p50 {latency['p50_ms']:.2f} ms p99 {latency['p99_ms']:.2f} ms max {latency['max_ms']:.2f} ms")
+
+##############################
+# 3) BENCHMARK vs a fresh interpreter per snippet
+##############################
+SNIPPETS = [
+    "import json, statistics\nprint(json.dumps({'mean': statistics.mean(range(1000))}))",
+    "import numpy as np\nprint(float(np.linalg.norm(np.arange(1000.0))))",
+    "import re, collections\nprint(collections.Counter(re.findall(r'\\w+', 'a b a c b a')).most_common(1))",
+    "def greet(name):\n    return f'Hello, {name}!'\nprint(greet('Istanbul'))",
+]
+
+
+async def _fresh_interpreter(code, timeout):
+    """Baseline: `python -c` per snippet; start latency is until the snippet's first line runs."""
+    submitted = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", f"import time; print(time.monotonic())\n{code}",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    first, _, output = stdout.decode().partition("\n")
+    return SnippetResult(output, None if process.returncode == 0 else output.strip().splitlines()[-1],
+                         start_ms=1000 * (float(first) - submitted))
+
+
+async def benchmark(executions=400, concurrency=8, sizes=(1, 2, 4)):
+    limit = asyncio.Semaphore(concurrency)
+    codes = [SNIPPETS[i % len(SNIPPETS)] for i in range(executions)]
+    print(f"{executions} snippets, {concurrency} submitted concurrently, {os.cpu_count()} CPUs")
+
+    async def measure(label, run, count):
+        latency = HdrHistogram()
+
+        async def one(code):
+            async with limit:
+                result = await run(code)
+                latency.record(result.start_ms * 1000)
+                return result
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(code) for code in codes[:count]))
+        elapsed = time.perf_counter() - start
+        summary = latency.summary_ms()
+        failed = sum(not r.ok for r in results)
+        print(f"  {label:26s} {count / elapsed:8.1f} exec/s  start p50 {summary['p50_ms']:7.2f} ms "
+              f"p99 {summary['p99_ms']:7.2f} ms  ({failed} failed)")
+
+    await measure("fresh interpreter", lambda code: _fresh_interpreter(code, 30), executions // 4)
+    for size in sizes:
+        async with CodeSandboxPool(size=size, max_runs=50) as pool:
+            await measure(f"pool of {size}, recycle/50", pool.run, executions)
+    async with CodeSandboxPool(size=2, timeout=0.5, memory_mb=256) as pool:
+        print("  limits:")
+        for label, code in (("timeout", "while True: pass"),
+                            ("memory cap", "x = bytearray(512 * 1024 * 1024)"),
+                            ("exception", "1 / 0"),
+                            ("after failures", "print(math.factorial(20))")):
+            result = await pool.run(code)
+            print(f"    {label:15s} {result!r}")
+        print("  " + pool.report())
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
@@ -0,0 +1,359 @@
+import asyncio
+import base64
+import glob
+import json
+import os
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+##############################
+# 1) PREALLOCATED AUDIO RING
+##############################
+class AudioRing:
+    """
+    Single-producer / single-consumer ring of int16 samples plus a ring of
+    (time, position, length) marks, all allocated up front. The producer (the
+    PortAudio callback or the receive loop) does one copy and a few integer
+    stores; the consumer thread drains whatever has been published. If the
+    consumer falls `capacity` samples behind, blocks are dropped and counted
+    rather than blocking the producer.
+    """
+    def __init__(self, capacity, max_marks=4096):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.mark_time = np.zeros(max_marks, dtype=np.float64)
+        self.mark_pos = np.zeros(max_marks, dtype=np.int64)
+        self.mark_len = np.zeros(max_marks, dtype=np.int64)
+        self.max_marks = max_marks
+        # Monotonic counters; each side only writes its own.
+        self.written = 0
+        self.read = 0
+        self.marks_written = 0
+        self.marks_read = 0
+        self.dropped = 0
+
+    def write(self, samples, t):
+        """Returns the stream position of the block, or -1 if it was dropped."""
+        n = len(samples)
+        if (self.written + n - self.read > self.capacity
+                or self.marks_written - self.marks_read >= self.max_marks):
+            self.dropped += n
+            return -1
+        position = self.written
+        start = position % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        if first < n:
+            self.buffer[:n - first] = samples[first:]
+        self.written = position + n
+        m = self.marks_written % self.max_marks
+        self.mark_time[m] = t
+        self.mark_pos[m] = position
+        self.mark_len[m] = n
+        # Publish the mark last: a visible mark always has its samples published.
+        self.marks_written += 1
+        return position
+
+    def drain(self):
+        marks_end = self.marks_written
+        end = self.written
+        start = self.read
+        if end == start:
+            samples = self.buffer[:0].copy()
+        else:
+            a, b = start % self.capacity, end % self.capacity
+            samples = (self.buffer[a:b].copy() if a < b
+                       else np.concatenate((self.buffer[a:], self.buffer[:b])))
+        index = np.arange(self.marks_read, marks_end) % self.max_marks
+        marks = list(zip(self.mark_time[index].tolist(), self.mark_pos[index].tolist(),
+                         self.mark_len[index].tolist()))
+        self.read = end
+        self.marks_read = marks_end
+        return samples, marks
+
+##############################
+# 2) RECORDER
+##############################
+STREAMS = ("mic", "model")
+
+
+class ConversationRecorder:
+    """
+    Records a realtime conversation to <out_dir>/<session>/:
+        mic_000.wav ...    caller audio at the pipeline rate, rotated every chunk_seconds
+        model_000.wav ...  model audio as played (before device resampling)
+        index.jsonl        one line per audio block: stream, time, position, length
+        events.jsonl       every realtime event in both directions; audio payloads are
+                           replaced by their position in the matching WAV stream
+                           (or marked dropped, replayed as silence)
+        meta.json          sample rate, start time, drop counters
+    Hot-path calls (record_mic in the audio callback, record_event /
+    record_model_audio in the receive loop) only copy into preallocated rings
+    or append a reference to a deque; encoding and file I/O happen on a
+    background thread.
+    """
+    def __init__(self, out_dir="recordings", sample_rate=24000, chunk_seconds=60,
+                 buffer_seconds=30, flush_interval=0.25):
+        self.sample_rate = sample_rate
+        self.chunk_samples = int(chunk_seconds * sample_rate)
+        self.flush_interval = flush_interval
+        self.rings = {name: AudioRing(int(buffer_seconds * sample_rate)) for name in STREAMS}
+        self.events = deque()
+        self.session_dir = os.path.join(out_dir, time.strftime("session_%Y%m%d_%H%M%S"))
+        self.t0 = time.perf_counter()
+        self.started_at = time.time()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.writers = {}
+        self.chunk_counts = {}
+        self.files = {}
+
+    @classmethod
+    def from_env(cls, sample_rate=24000):
+        out_dir = os.getenv("CONVERSATION_RECORD_DIR")
+        return cls(out_dir, sample_rate) if out_dir else None
+
+    # --- hot path -------------------------------------------------------
+    def record_mic(self, samples):
+        self.rings["mic"].write(samples, time.perf_counter())
+
+    def record_model_audio(self, samples, event=None):
+        position = self.rings["model"].write(samples, time.perf_counter())
+        if event is not None:
+            self.events.append((time.perf_counter(), "in", event, position, len(samples)))
+
+    def record_event(self, event, direction="in"):
+        self.events.append((time.perf_counter(), direction, event, None, None))
+
+    # --- background writer ---------------------------------------------
+    def start(self):
+        os.makedirs(self.session_dir, exist_ok=True)
+        self.files["events"] = open(os.path.join(self.session_dir, "events.jsonl"), "w", encoding="utf-8")
+        self.files["index"] = open(os.path.join(self.session_dir, "index.jsonl"), "w", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, name="conversation-recorder", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        for writer, _ in self.writers.values():
+            writer.close()
+        for f in self.files.values():
+            f.close()
+        with open(os.path.join(self.session_dir, "meta.json"), "w") as f:
+            json.dump({"sample_rate": self.sample_rate, "started_at": self.started_at,
+                       "chunk_samples": self.chunk_samples,
+                       "dropped_samples": {name: ring.dropped for name, ring in self.rings.items()}}, f)
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        index = self.files["index"]
+        for name, ring in self.rings.items():
+            samples, marks = ring.drain()
+            if len(samples):
+                self._write_audio(name, samples)
+            for t, position, length in marks:
+                index.write(f'{{"s":"{name}","t":{t - self.t0:.6f},"pos":{position},"n":{length}}}\n')
+        out = self.files["events"]
+        while self.events:
+            t, direction, event, position, length = self.events.popleft()
+            out.write(json.dumps({"t": round(t - self.t0, 6), "dir": direction,
+                                  "event": self._compact(event, position, length)},
+                                 separators=(",", ":")) + "\n")
+        out.flush()
+        index.flush()
+
+    @staticmethod
+    def _compact(event, position, length):
+        kind = event.get("type")
+        if kind == "response.audio.delta":
+            if position < 0:
+                # The ring dropped this block; there is nothing in the WAV to point at.
+                event = dict(event, delta=None, audio={"stream": "model", "dropped": True, "n": length})
+            else:
+                event = dict(event, delta=None, audio={"stream": "model", "pos": position, "n": length})
+        elif kind == "input_audio_buffer.append":
+            event = dict(event, audio=None, audio_bytes=len(event.get("audio") or "") * 3 // 4)
+        return event
+
+    def _write_audio(self, name, samples):
+        while len(samples):
+            writer, remaining = self.writers.get(name, (None, 0))
+            if writer is None or remaining == 0:
+                if writer is not None:
+                    writer.close()
+                count = self.chunk_counts[name] = self.chunk_counts.get(name, -1) + 1
+                writer = wave.open(os.path.join(self.session_dir, f"{name}_{count:03d}.wav"), "wb")
+                writer.setnchannels(1)
+                writer.setsampwidth(2)
+                writer.setframerate(self.sample_rate)
+                remaining = self.chunk_samples
+            take = min(remaining, len(samples))
+            writer.writeframes(samples[:take].tobytes())
+            self.writers[name] = (writer, remaining - take)
+            samples = samples[take:]
+
+##############################
+# 3) DETERMINISTIC REPLAY
+##############################
+class RecordedSession:
+    """Loads a recording and replays it in the original order (and, optionally, timing)."""
+    def __init__(self, session_dir):
+        self.session_dir = session_dir
+        with open(os.path.join(session_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.audio = {}
+        for name in STREAMS:
+            pieces = []
+            for path in sorted(glob.glob(os.path.join(session_dir, f"{name}_*.wav"))):
+                with wave.open(path, "rb") as w:
+                    pieces.append(np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16))
+            self.audio[name] = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+        with open(os.path.join(session_dir, "index.jsonl")) as f:
+            self.index = [json.loads(line) for line in f]
+        with open(os.path.join(session_dir, "events.jsonl")) as f:
+            self.events = [json.loads(line) for line in f]
+
+    def timeline(self):
+        """Mic blocks and server events merged by time: (t, "mic", samples) / (t, "event", event)."""
+        items = [(entry["t"], 0, "mic", self.audio["mic"][entry["pos"]:entry["pos"] + entry["n"]])
+                 for entry in self.index if entry["s"] == "mic"]
+        for record in self.events:
+            if record["dir"] != "in":
+                continue
+            event = record["event"]
+            audio = event.get("audio") if event.get("type") == "response.audio.delta" else None
+            if audio:
+                if audio.get("dropped"):
+                    samples = np.zeros(audio["n"], dtype=np.int16)  # keep the timing, play silence
+                else:
+                    samples = self.audio["model"][audio["pos"]:audio["pos"] + audio["n"]]
+                event = {k: v for k, v in event.items() if k != "audio"}
+                event["delta"] = base64.b64encode(samples.tobytes()).decode("ascii")
+            items.append((record["t"], 1, "event", event))
+        items.sort(key=lambda item: (item[0], item[1]))
+        return [(t, kind, payload) for t, _, kind, payload in items]
+
+    async def replay(self, speed=1.0):
+        """Async iterator over timeline(); speed=None replays as fast as possible."""
+        start = time.perf_counter()
+        for t, kind, payload in self.timeline():
+            if speed:
+                delay = t / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield kind, payload
+
+
+class ReplayWebSocket:
+    """
+    Stands in for the realtime WebSocket: recv() returns the recorded server
+    events (with audio reconstructed from the model WAV) and send() just
+    collects what the client sent, so receive-side code can be benchmarked
+    against a real conversation with no network.
+    """
+    def __init__(self, session, speed=None):
+        self.session = session
+        self.speed = speed
+        self.sent = []
+        self._events = [(t, payload) for t, kind, payload in session.timeline() if kind == "event"]
+        self._next = 0
+        self._start = None
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def recv(self):
+        if self._next >= len(self._events):
+            raise ConnectionError("recording exhausted")
+        if self._start is None:
+            self._start = time.perf_counter() - self._events[0][0] / (self.speed or 1)
+        t, event = self._events[self._next]
+        self._next += 1
+        if self.speed:
+            delay = t / self.speed - (time.perf_counter() - self._start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return json.dumps(event)
+
+    async def close(self):
+        pass
+
+##############################
+# 4) SELF-CHECK: record a stub conversation, replay it, measure hot-path cost
+##############################
+async def demo(turns=3):
+    import hashlib
+    import tempfile
+    import websockets
+    from realtime_stub import RealtimeStub
+
+    work = tempfile.mkdtemp(prefix="recorder_")
+    recorder = ConversationRecorder(work, chunk_seconds=2).start()
+    block = 4800
+    async with RealtimeStub(response_delay=0.05, reply_seconds=1.5) as stub:
+        async with websockets.connect(stub.url, max_size=None) as ws:
+            for turn in range(turns):
+                speech = (3000 * np.random.randn(block * 5)).astype(np.int16)
+                for i in range(0, len(speech), block):
+                    recorder.record_mic(speech[i:i + block])    # as audio_callback would
+                    await asyncio.sleep(0.02)
+                for payload in ({"type": "input_audio_buffer.append",
+                                 "audio": base64.b64encode(speech.tobytes()).decode("ascii")},
+                                {"type": "input_audio_buffer.commit"},
+                                {"type": "response.create"}):
+                    recorder.record_event(payload, "out")
+                    await ws.send(json.dumps(payload))
+                while True:
+                    data = json.loads(await ws.recv())
+                    if data["type"] == "response.audio.delta":
+                        recorder.record_model_audio(np.frombuffer(base64.b64decode(data["delta"]), np.int16), data)
+                    else:
+                        recorder.record_event(data)
+                    if data["type"] == "response.done":
+                        break
+    recorder.stop()
+    sizes = sum(os.path.getsize(p) for p in glob.glob(os.path.join(recorder.session_dir, "*")))
+    print(f"recorded {turns} turns to {recorder.session_dir} ({sizes / 1e3:.0f} kB, "
+          f"{len(glob.glob(os.path.join(recorder.session_dir, '*.wav')))} WAV chunks)")
+
+    session = RecordedSession(recorder.session_dir)
+    digests = []
+    for speed in (None, None, 4.0):
+        digest = hashlib.sha256()
+        start = time.perf_counter()
+        async for kind, payload in session.replay(speed):
+            digest.update(payload.tobytes() if kind == "mic" else json.dumps(payload, sort_keys=True).encode())
+        digests.append(digest.hexdigest()[:16])
+        print(f"replay speed={speed}: {time.perf_counter() - start:.3f}s digest {digests[-1]}")
+    print("replays identical:", len(set(digests)) == 1)
+
+    # Hot-path cost, compared with the 200 ms callback budget.
+    bench = ConversationRecorder(work, buffer_seconds=600)
+    samples = np.zeros(block, dtype=np.int16)
+    event = {"type": "response.audio_transcript.delta", "delta": "hi"}
+    n = 2000
+    start = time.perf_counter()
+    for _ in range(n):
+        bench.record_mic(samples)
+    mic_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(n):
+        bench.record_event(event)
+    event_us = (time.perf_counter() - start) / n * 1e6
+    print(f"record_mic: {mic_us:.2f} us per {block}-sample block; record_event: {event_us:.2f} us")
+
+if __name__ == "__main__":
+    asyncio.run(demo())
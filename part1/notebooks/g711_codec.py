@@ -0,0 +1,181 @@
+import base64
+import json
+import time
+
+import numpy as np
+
+from audio_resampler import PolyphaseResampler
+
+##############################
+# 1) TABLE-DRIVEN G.711 (mu-law / A-law)
+##############################
+# Tables follow the reference g711.c. Encoding is one lookup per sample in a
+# 64K table indexed by the int16 bit pattern; decoding is a 256-entry lookup.
+_SEG_UEND = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_SEG_AEND = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+def _build_ulaw_encode():
+    pcm = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    pcm = np.minimum(np.abs(pcm), 8159) + 0x21
+    seg = np.searchsorted(_SEG_UEND, pcm)
+    uval = (seg << 4) | ((pcm >> (seg + 1)) & 0x0F)
+    uval = np.where(seg >= 8, 0x7F, uval)
+    return (uval ^ mask).astype(np.uint8)
+
+
+def _build_ulaw_decode():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+
+def _build_alaw_encode():
+    pcm = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    pcm = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(_SEG_AEND, pcm)
+    aval = (seg << 4) | np.where(seg < 2, (pcm >> 1) & 0x0F, (pcm >> np.maximum(seg, 1)) & 0x0F)
+    aval = np.where(seg >= 8, 0x7F, aval)
+    return (aval ^ mask).astype(np.uint8)
+
+
+def _build_alaw_decode():
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    t = (a & 0x0F) << 4
+    seg = (a & 0x70) >> 4
+    t = np.where(seg == 0, t + 8, t + 0x108)
+    t = np.where(seg > 1, t << np.maximum(seg - 1, 0), t)
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+
+TABLES = {
+    "g711_ulaw": (_build_ulaw_encode(), _build_ulaw_decode()),
+    "g711_alaw": (_build_alaw_encode(), _build_alaw_decode()),
+}
+
+
+def g711_encode(pcm16, law="g711_ulaw"):
+    """int16 samples -> G.711 bytes (one byte per sample)."""
+    encode, _ = TABLES[law]
+    return encode[np.asarray(pcm16, dtype=np.int16).view(np.uint16)].tobytes()
+
+
+def g711_decode(data, law="g711_ulaw"):
+    """G.711 bytes -> int16 samples."""
+    _, decode = TABLES[law]
+    return decode[np.frombuffer(data, dtype=np.uint8)]
+
+##############################
+# 2) TRANSPORT BOUNDARY
+##############################
+# The realtime API's g711 formats are 8 kHz. Capture/playback stay at 24 kHz
+# pcm16 internally; conversion happens only where audio crosses the socket.
+AUDIO_FORMATS = ("pcm16", "g711_ulaw", "g711_alaw")
+WIRE_RATES = {"pcm16": 24000, "g711_ulaw": 8000, "g711_alaw": 8000}
+
+
+class AudioTransport:
+    """
+    Converts between the 24 kHz int16 pipeline and the session's wire format.
+    pcm16 is a pass-through; g711 adds a streaming 24k<->8k resample and a
+    table lookup, cutting audio on the wire from 48 KB/s to 8 KB/s per direction.
+    """
+    def __init__(self, audio_format="pcm16", pipeline_rate=24000):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+        self.format = audio_format
+        self.pipeline_rate = pipeline_rate
+        wire_rate = WIRE_RATES[audio_format]
+        self.to_wire = PolyphaseResampler(pipeline_rate, wire_rate)
+        self.from_wire = PolyphaseResampler(wire_rate, pipeline_rate)
+
+    def session_formats(self):
+        return {"input_audio_format": self.format, "output_audio_format": self.format}
+
+    def encode(self, pcm16_bytes):
+        """Pipeline pcm16 bytes -> bytes to base64 into input_audio_buffer.append."""
+        if self.format == "pcm16":
+            return pcm16_bytes
+        samples = self.to_wire.process_int16(np.frombuffer(pcm16_bytes, dtype=np.int16))
+        return g711_encode(samples, self.format)
+
+    def decode(self, wire_bytes):
+        """Bytes from response.audio.delta -> int16 samples at the pipeline rate."""
+        if self.format == "pcm16":
+            return np.frombuffer(wire_bytes, dtype=np.int16)
+        return self.from_wire.process_int16(g711_decode(wire_bytes, self.format))
+
+##############################
+# 3) BENCHMARK: bytes on the wire and codec CPU per stream
+##############################
+def benchmark(seconds=60, chunk_ms=100):
+    rate = 24000
+    t = np.arange(seconds * rate) / rate
+    speech_like = (6000 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+                   + 300 * np.random.randn(len(t))).astype(np.int16)
+    chunk = int(rate * chunk_ms / 1000)
+    print(f"{seconds}s of 24 kHz audio in {chunk_ms} ms chunks, per direction:")
+    for audio_format in AUDIO_FORMATS:
+        tx, rx = AudioTransport(audio_format), AudioTransport(audio_format)
+        raw = wire = 0
+        encode_time = decode_time = 0.0
+        for i in range(0, len(speech_like), chunk):
+            block = speech_like[i:i + chunk]
+            start = time.perf_counter()
+            payload = tx.encode(block.tobytes())
+            encode_time += time.perf_counter() - start
+            raw += len(payload)
+            wire += len(json.dumps({"type": "input_audio_buffer.append",
+                                    "audio": base64.b64encode(payload).decode("ascii")}))
+            start = time.perf_counter()
+            rx.decode(payload)
+            decode_time += time.perf_counter() - start
+        cpu = (encode_time + decode_time) / seconds
+        quality = ""
+        if audio_format != "pcm16":
+            # Quantization SNR of the codec itself, measured at the 8 kHz wire rate.
+            narrow = PolyphaseResampler(rate, WIRE_RATES[audio_format]).process_int16(speech_like)
+            restored = g711_decode(g711_encode(narrow, audio_format), audio_format)
+            error = restored.astype(np.float64) - narrow
+            quality = f"  codec SNR {10 * np.log10(np.sum(narrow.astype(np.float64) ** 2) / np.sum(error ** 2)):4.1f} dB"
+        print(f"  {audio_format:10s} payload {raw / seconds / 1000:5.1f} KB/s  "
+              f"on wire (base64+JSON) {wire / seconds / 1000:5.1f} KB/s  "
+              f"codec CPU {100 * cpu:.3f}% of a core/stream{quality}")
+
+
+async def wire_benchmark(seconds=3, chunk_ms=100):
+    """One turn per format through the local realtime stub: audio bytes each way on the socket."""
+    import websockets
+    from realtime_stub import RealtimeStub
+
+    rate = 24000
+    audio = (3000 * np.random.randn(seconds * rate)).astype(np.int16)
+    chunk = int(rate * chunk_ms / 1000)
+    print(f"\n{seconds}s turn through RealtimeStub (1s reply):")
+    for audio_format in AUDIO_FORMATS:
+        transport = AudioTransport(audio_format)
+        async with RealtimeStub() as stub:
+            async with websockets.connect(stub.url, max_size=None) as ws:
+                await ws.send(json.dumps({"type": "session.update", "session": transport.session_formats()}))
+                for i in range(0, len(audio), chunk):
+                    payload = transport.encode(audio[i:i + chunk].tobytes())
+                    await ws.send(json.dumps({"type": "input_audio_buffer.append",
+                                              "audio": base64.b64encode(payload).decode("ascii")}))
+                await ws.send(json.dumps({"type": "input_audio_buffer.commit"}))
+                await ws.send(json.dumps({"type": "response.create"}))
+                played = 0
+                async for raw in ws:
+                    event = json.loads(raw)
+                    if event["type"] == "response.audio.delta":
+                        played += len(transport.decode(base64.b64decode(event["delta"])))
+                    elif event["type"] == "response.done":
+                        break
+        print(f"  {audio_format:10s} up {stub.stats['audio_bytes_in']:7d} B  "
+              f"down {stub.stats['audio_bytes_out']:6d} B  played {played / rate:.2f}s at 24 kHz")
+
+if __name__ == "__main__":
+    import asyncio
+    benchmark()
+    asyncio.run(wire_benchmark())
@@ -0,0 +1,287 @@
+import asyncio
+import re
+import time
+
+from autogen_agentchat.base import TerminatedException, TerminationCondition
+from autogen_agentchat.messages import StopMessage
+
+from model_client_wrapper import DelegatingChatCompletionClient, message_text
+
+##############################
+# 1) HELPERS
+##############################
+def message_tokens(message):
+    usage = getattr(message, "models_usage", None)
+    if usage is None:
+        return 0
+    return usage.prompt_tokens + usage.completion_tokens
+
+
+def ngrams(text, n):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(0, len(words) - n + 1))}
+
+##############################
+# 2) TERMINATION CONDITIONS
+##############################
+# All three follow the autogen TerminationCondition contract, so they combine
+# with the built-ins: BudgetTermination(...) | RepetitionTermination() | MaxMessageTermination(10)
+class BudgetTermination(TerminationCondition):
+    """
+    Stop once the team has spent `max_tokens` (prompt + completion) or
+    `max_seconds` of wall clock. The clock starts at the first check: a
+    team's run(task=...) checks the task message before any agent speaks, so
+    that is run start. A run without a task is only checked after the first
+    reply; call start() just before it to count that turn too. The budget is
+    checked between messages, so a single slow turn can overshoot it.
+    """
+    def __init__(self, max_tokens=None, max_seconds=None):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.tokens = 0
+        self.started = None
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    def start(self):
+        """Start the latency budget now instead of at the first check."""
+        self.started = time.monotonic()
+
+    async def __call__(self, messages):
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        if self.started is None:
+            self.started = time.monotonic()
+        self.tokens += sum(message_tokens(m) for m in messages)
+        elapsed = time.monotonic() - self.started
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            self._terminated = True
+            return StopMessage(content=f"Token budget {self.max_tokens} reached ({self.tokens} used)",
+                               source="BudgetTermination")
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            self._terminated = True
+            return StopMessage(content=f"Latency budget {self.max_seconds}s reached ({elapsed:.1f}s)",
+                               source="BudgetTermination")
+        return None
+
+    async def reset(self):
+        self.tokens = 0
+        self.started = None
+        self._terminated = False
+
+
+class RepetitionTermination(TerminationCondition):
+    """
+    Stop when the conversation has converged: a new message's word n-grams
+    overlap (Jaccard) at least `threshold` with one of the previous `lookback`
+    messages. lookback=2 also catches an agent restating its own last turn
+    in a two-agent round robin.
+    """
+    def __init__(self, n=3, threshold=0.5, lookback=2, min_words=8):
+        self.n = n
+        self.threshold = threshold
+        self.lookback = lookback
+        self.min_words = min_words
+        self.history = []
+        self.max_overlap = 0.0
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    async def __call__(self, messages):
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        for message in messages:
+            text = message_text(message)
+            if len(text.split()) < self.min_words:
+                continue
+            grams = ngrams(text, self.n)
+            for previous in self.history[-self.lookback:]:
+                union = len(grams | previous)
+                overlap = len(grams & previous) / union if union else 0.0
+                self.max_overlap = max(self.max_overlap, overlap)
+                if overlap >= self.threshold:
+                    self._terminated = True
+                    return StopMessage(
+                        content=f"Conversation converged ({overlap:.0%} {self.n}-gram overlap)",
+                        source="RepetitionTermination",
+                    )
+            self.history.append(grams)
+        return None
+
+    async def reset(self):
+        self.history = []
+        self.max_overlap = 0.0
+        self._terminated = False
+
+
+class AnswerCompleteTermination(TerminationCondition):
+    """
+    Stop when an agent explicitly signals it is done, e.g. by ending with
+    "FINAL ANSWER: ..." or "TERMINATE". Unlike TextMentionTermination it only
+    matches a signal at the start of a line, so quoting the word doesn't stop the team.
+    """
+    def __init__(self, signals=("FINAL ANSWER", "TERMINATE", "ANSWER COMPLETE"), sources=None):
+        self.pattern = re.compile(r"^\s*(?:%s)\b" % "|".join(re.escape(s) for s in signals), re.MULTILINE)
+        self.sources = sources
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    async def __call__(self, messages):
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        for message in messages:
+            if self.sources and getattr(message, "source", None) not in self.sources:
+                continue
+            if self.pattern.search(message_text(message)):
+                self._terminated = True
+                return StopMessage(content=f"{message.source} signalled answer complete",
+                                   source="AnswerCompleteTermination")
+        return None
+
+    async def reset(self):
+        self._terminated = False
+
+
+def early_termination(max_messages, max_tokens=None, max_seconds=None):
+    """The combination we recommend for production teams; max_messages stays as a backstop."""
+    from autogen_agentchat.conditions import MaxMessageTermination
+    return (AnswerCompleteTermination()
+            | RepetitionTermination()
+            | BudgetTermination(max_tokens=max_tokens, max_seconds=max_seconds)
+            | MaxMessageTermination(max_messages=max_messages))
+
+##############################
+# 3) BENCHMARK on the notebook's scenarios
+##############################
+class SimulatedLatencyClient(DelegatingChatCompletionClient):
+    """Adds a realistic delay (fixed + per output token) to an offline replay client."""
+    def __init__(self, inner, base_latency=0.3, per_token=0.01):
+        super().__init__(inner)
+        self.base_latency = base_latency
+        self.per_token = per_token
+
+    async def create(self, messages, **kwargs):
+        result = await self.inner.create(messages, **kwargs)
+        await asyncio.sleep(self.base_latency + self.per_token * result.usage.completion_tokens)
+        return result
+
+
+TEACHER_STUDENT_SCRIPT = [
+    "Quantum superposition means a particle can exist in several states at once until it is measured, "
+    "like a coin spinning in the air that is neither heads nor tails yet.",
+    "So is the coin really both heads and tails, or do we just not know which one it is?",
+    "It is genuinely both: the particle is described by a combination of states, and measurement forces "
+    "it into one of them. That is different from simply not knowing the answer.",
+    "I think I get it. Superposition means the particle is genuinely in a combination of states and "
+    "measurement forces it into one of them.",
+    "Exactly. Superposition means the particle is genuinely in a combination of states and measurement "
+    "forces it into one of them.",
+    "Right, superposition means the particle is genuinely in a combination of states and measurement "
+    "forces it into one of them. Thanks!",
+    "You're welcome! Superposition means the particle is in a combination of states until measured.",
+    "Thanks again, superposition means the particle is in a combination of states until measured.",
+    "Glad it helped. Remember: a combination of states until measured.",
+    "Got it: a combination of states until measured.",
+]
+
+
+def _brainstorm_script(turns=20, words=28, seed=0):
+    """Two agents trading fresh ideas: no signal and no repetition, so nothing but a budget stops them."""
+    import random
+    rng = random.Random(seed)
+    vocabulary = ("solar wind tidal battery grid storage hydrogen rooftop subsidy tariff market carbon "
+                  "credit village microgrid turbine panel lithium recycling heat pump insulation transit "
+                  "rail bike freight canal forest soil farm water desalination nuclear fusion fission "
+                  "geothermal biomass algae cement steel factory policy auction bond city").split()
+    return [f"Idea {i}: " + " ".join(rng.choice(vocabulary) for _ in range(words)) + "." for i in range(turns)]
+
+
+async def _run_team(build_team, task):
+    from autogen_agentchat.messages import BaseChatMessage
+    team = build_team()
+    start = time.monotonic()
+    result = await team.run(task=task)
+    elapsed = time.monotonic() - start
+    chat = [m for m in result.messages if isinstance(m, BaseChatMessage)]
+    tokens = sum(message_tokens(m) for m in result.messages)
+    return {"messages": len(chat), "tokens": tokens, "seconds": elapsed, "stop_reason": result.stop_reason}
+
+
+async def benchmark():
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.teams import RoundRobinGroupChat, SelectorGroupChat
+    from autogen_ext.models.replay import ReplayChatCompletionClient
+
+    def teacher_student(termination):
+        def build():
+            client = SimulatedLatencyClient(ReplayChatCompletionClient(TEACHER_STUDENT_SCRIPT))
+            teacher = AssistantAgent("QuantumTeacher", model_client=client,
+                                     system_message="You are a physics teacher explaining quantum superposition in simple terms.")
+            student = AssistantAgent("SkepticalStudent", model_client=client,
+                                     system_message="You are a curious student with follow-up questions on quantum superposition.")
+            return RoundRobinGroupChat([teacher, student], termination_condition=termination())
+        return build
+
+    def selector(termination):
+        def custom_selector(messages):
+            last = message_text(messages[-1]).lower()
+            if any(k in last for k in ["solve", "calculate", "math", "plus", "minus", "times", "divide"]):
+                return "MathAgent"
+            return None
+
+        def build():
+            agent_client = SimulatedLatencyClient(ReplayChatCompletionClient([
+                "45 * 32 = 1440.\nFINAL ANSWER: 1440",
+                "I only answer philosophical questions; nothing to add here.",
+            ]))
+            aggregator_client = SimulatedLatencyClient(ReplayChatCompletionClient(["PhilosopherAgent"]))
+            agents = [
+                AssistantAgent("MathAgent", model_client=agent_client,
+                               system_message="You ONLY solve mathematical problems."),
+                AssistantAgent("TranslatorAgent", model_client=agent_client,
+                               system_message="You ONLY translate phrases between languages."),
+                AssistantAgent("PhilosopherAgent", model_client=agent_client,
+                               system_message="You ONLY answer philosophical questions."),
+            ]
+            return SelectorGroupChat(agents, model_client=aggregator_client, selector_func=custom_selector,
+                                     termination_condition=termination(), allow_repeated_speaker=False)
+        return build
+
+    def brainstorm(termination):
+        def build():
+            client = SimulatedLatencyClient(ReplayChatCompletionClient(_brainstorm_script()))
+            agents = [AssistantAgent(name, model_client=client, system_message=f"You are the {role}. Propose new ideas.")
+                      for name, role in (("Optimist", "optimist"), ("Engineer", "engineer"))]
+            return RoundRobinGroupChat(agents, termination_condition=termination())
+        return build
+
+    scenarios = [
+        ("RoundRobin teacher/student", teacher_student, "Explain quantum superposition in simple terms.", 10, {}),
+        ("Selector math task", selector, "Please solve 45*32 for me.", 3, {}),
+        # Never converges: only the budget can end it before max_messages.
+        ("RoundRobin brainstorm", brainstorm, "Brainstorm ways to decarbonize a small town.", 20,
+         {"max_seconds": 3.0}),
+    ]
+    for name, scenario, task, max_messages, budget in scenarios:
+        baseline = await _run_team(scenario(lambda: MaxMessageTermination(max_messages)), task)
+        early = await _run_team(scenario(lambda: early_termination(max_messages, **budget)), task)
+        print(f"{name}:")
+        for label, stats in (("max-messages", baseline), ("early", early)):
+            print(f"  {label:13s} messages={stats['messages']:2d} tokens={stats['tokens']:5d} "
+                  f"time={stats['seconds']:.2f}s  ({stats['stop_reason']})")
+        saved_tokens = 1 - early["tokens"] / max(1, baseline["tokens"])
+        saved_time = 1 - early["seconds"] / max(1e-9, baseline["seconds"])
+        print(f"  saved: {saved_tokens:.0%} tokens, {saved_time:.0%} wall clock")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
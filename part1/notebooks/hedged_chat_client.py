@@ -0,0 +1,89 @@
+import asyncio
+
+from autogen_core.models import RequestUsage
+
+from hedged_client import Hedger
+from model_client_wrapper import DelegatingChatCompletionClient
+
+##############################
+# HEDGED CHAT COMPLETIONS
+##############################
+# Kept apart from hedged_client so the realtime handshake path doesn't pay
+# for importing autogen_core.
+class HedgedChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Model client over several AzureOpenAIChatCompletionClients (one per
+    deployment). create_stream hedges on time-to-first-chunk; create hedges on
+    the full response, since that is its first token.
+    """
+    def __init__(self, endpoints, **hedger_kwargs):
+        super().__init__(endpoints[0].client)
+        self.hedger = Hedger(endpoints, **hedger_kwargs)
+
+    async def create(self, messages, **kwargs):
+        async def start(endpoint):
+            return await endpoint.client.create(messages, **kwargs)
+
+        _, result = await self.hedger.race(start)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        # Each candidate's stream is iterated by its own pump task, so a loser is
+        # stopped by cancelling (and awaiting) that task; the generator is then
+        # closed by the task that was driving it, never while it is mid-__anext__.
+        async def start(endpoint):
+            chunks = asyncio.Queue()
+            pump = asyncio.ensure_future(_pump(endpoint.client.create_stream(messages, **kwargs), chunks))
+            try:
+                first = await chunks.get()
+            except BaseException:
+                await _stop(pump)
+                raise
+            if isinstance(first, BaseException):
+                await _stop(pump)
+                raise first
+            return pump, chunks, first
+
+        async def discard(result):
+            await _stop(result[0])
+
+        _, (pump, chunks, item) = await self.hedger.race(start, discard)
+        try:
+            while item is not _END:
+                yield item
+                item = await chunks.get()
+                if isinstance(item, BaseException):
+                    raise item
+        finally:
+            await _stop(pump)
+
+    def actual_usage(self):
+        return _sum_usage(endpoint.client.actual_usage() for endpoint in self.hedger.endpoints)
+
+    def total_usage(self):
+        return _sum_usage(endpoint.client.total_usage() for endpoint in self.hedger.endpoints)
+
+
+_END = object()
+
+
+async def _pump(stream, chunks):
+    try:
+        async for chunk in stream:
+            chunks.put_nowait(chunk)
+        chunks.put_nowait(_END)
+    except Exception as e:
+        chunks.put_nowait(e)
+    finally:
+        await stream.aclose()
+
+
+async def _stop(pump):
+    pump.cancel()
+    await asyncio.gather(pump, return_exceptions=True)
+
+
+def _sum_usage(usages):
+    usages = list(usages)
+    return RequestUsage(prompt_tokens=sum(u.prompt_tokens for u in usages),
+                        completion_tokens=sum(u.completion_tokens for u in usages))
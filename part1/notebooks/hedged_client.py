@@ -0,0 +1,282 @@
+import asyncio
+import math
+import statistics
+import time
+from collections import deque
+
+import websockets
+
+##############################
+# 1) PER-ENDPOINT LATENCY TRACKING
+##############################
+class LatencyTracker:
+    """
+    Exponentially weighted mean and variance of a latency. The running p95 is
+    estimated as mean + 1.645 * stddev, which is cheap and reacts quickly when
+    a region slows down. The median of the last `window` samples (`baseline`)
+    is the prior that relax() pulls the mean back to while the endpoint gets
+    no samples; unlike the mean it shrugs off a cold first connection or an
+    occasional stall.
+    """
+    def __init__(self, alpha=0.2, initial=1.0, window=31):
+        self.alpha = alpha
+        self.mean = initial
+        self.var = (initial / 2) ** 2
+        self.samples = 0
+        self.recent = deque(maxlen=window)
+
+    def record(self, seconds):
+        if self.samples == 0:
+            self.mean = seconds
+            self.var = (seconds / 2) ** 2
+        else:
+            diff = seconds - self.mean
+            self.mean += self.alpha * diff
+            self.var = (1 - self.alpha) * (self.var + self.alpha * diff * diff)
+        self.samples += 1
+        self.recent.append(seconds)
+
+    @property
+    def baseline(self):
+        return statistics.median(self.recent) if self.recent else self.mean
+
+    def relax(self, factor):
+        """No sample this round: decay the fast mean toward the baseline by `factor`."""
+        self.mean = self.baseline + (self.mean - self.baseline) * factor
+
+    @property
+    def p95(self):
+        return self.mean + 1.645 * math.sqrt(self.var)
+
+
+class Endpoint:
+    """One deployment: a chat client and/or a realtime URL."""
+    def __init__(self, name, client=None, url=None):
+        self.name = name
+        self.client = client
+        self.url = url
+
+
+class EndpointStats:
+    """One hedger's latency history and counters for one endpoint."""
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.requests = 0
+        self.wins = 0
+        self.errors = 0
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "wins": self.wins,
+            "errors": self.errors,
+            "ewma_ms": 1000.0 * self.latency.mean,
+            "p95_ms": 1000.0 * self.latency.p95,
+        }
+
+##############################
+# 2) HEDGED RACE
+##############################
+class Hedger:
+    """
+    Sends a request to the fastest-looking endpoint and, if it hasn't produced
+    a first result by that endpoint's running p95, sends a duplicate to the
+    next-best one. The first success wins; the loser is cancelled.
+
+    Latency history lives in the hedger, not the Endpoint: use one Hedger per
+    kind of request (chat first token, realtime handshake) so the two never
+    mix, even when they share Endpoint objects.
+
+    Only the primary gets complete samples, so one stall would otherwise park
+    a normally faster endpoint behind the others for good. Two things undo
+    that: an endpoint left out of a race has its estimate relaxed toward its
+    long-run baseline (`idle_decay` per race), and every `explore_every`-th
+    race sends the runner-up first, still hedged at the best endpoint's p95,
+    so even a stale baseline gets refreshed.
+    """
+    def __init__(self, endpoints, min_hedge_delay=0.05, max_hedge_delay=5.0, idle_decay=0.8,
+                 explore_every=10):
+        self.endpoints = endpoints
+        self.stats = {endpoint.name: EndpointStats() for endpoint in endpoints}
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.races = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.idle_decay = idle_decay
+        self.explore_every = explore_every
+        self.explorations = 0
+
+    def ranked(self):
+        return sorted(self.endpoints, key=lambda e: self.stats[e.name].latency.mean)
+
+    def hedge_delay(self, endpoint):
+        delay = self.stats[endpoint.name].latency.p95
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    async def race(self, start, discard=None):
+        """
+        `start(endpoint)` is a coroutine function producing the first result;
+        `discard(result)` releases a result that finished but lost the race.
+        Returns (endpoint, result).
+        """
+        self.races += 1
+        candidates = self.ranked()
+        hedge_delay = self.hedge_delay(candidates[0])
+        if self.explore_every and len(candidates) > 1 and self.races % self.explore_every == 0:
+            candidates[0], candidates[1] = candidates[1], candidates[0]
+            hedge_delay = min(hedge_delay, self.hedge_delay(candidates[0]))
+            self.explorations += 1
+        tasks = {}
+        errors = []
+
+        def launch(endpoint):
+            self.stats[endpoint.name].requests += 1
+            task = asyncio.ensure_future(start(endpoint))
+            tasks[task] = (endpoint, time.monotonic())
+            return task
+
+        pending = {launch(candidates[0])}
+        backups = candidates[1:]
+        hedge_at = time.monotonic() + hedge_delay
+        try:
+            while pending or backups:
+                if not pending:
+                    # Everything in flight failed; go straight to the next endpoint.
+                    pending.add(launch(backups.pop(0)))
+                    continue
+                timeout = max(0.0, hedge_at - time.monotonic()) if backups else None
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.hedges_sent += 1
+                    pending.add(launch(backups.pop(0)))
+                    hedge_at = float("inf")
+                    continue
+                winner = None
+                for task in done:
+                    endpoint, started = tasks[task]
+                    if task.exception() is not None:
+                        self.stats[endpoint.name].errors += 1
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    endpoint, started = tasks[winner]
+                    self.stats[endpoint.name].latency.record(time.monotonic() - started)
+                    self.stats[endpoint.name].wins += 1
+                    if endpoint is not candidates[0]:
+                        self.hedge_wins += 1
+                    return endpoint, winner.result()
+            raise errors[-1]
+        finally:
+            launched = {endpoint for endpoint, _ in tasks.values()}
+            for endpoint in self.endpoints:
+                if endpoint not in launched:
+                    self.stats[endpoint.name].latency.relax(self.idle_decay)
+            now = time.monotonic()
+            for task, (endpoint, started) in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    # A cancelled loser is a censored sample: it only says the
+                    # endpoint was at least this slow. Feed it in only when that
+                    # already exceeds the estimate, so a degraded primary gets
+                    # demoted but a backup cut off early doesn't look fast.
+                    tracker = self.stats[endpoint.name].latency
+                    if now - started > tracker.mean:
+                        tracker.record(now - started)
+            losers = [task for task in tasks if not task.done()]
+            for result in await asyncio.gather(*losers, return_exceptions=True):
+                # A loser can finish in the instant between cancel() and now.
+                if discard is not None and not isinstance(result, BaseException):
+                    await discard(result)
+
+    def snapshot(self):
+        return {
+            "races": self.races,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "explorations": self.explorations,
+            "endpoints": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+##############################
+# 3) HEDGED CHAT COMPLETIONS
+##############################
+def __getattr__(name):
+    # HedgedChatCompletionClient lives in hedged_chat_client because it pulls in
+    # autogen_core (~0.3 s); it is loaded only when someone asks for it.
+    if name == "HedgedChatCompletionClient":
+        from hedged_chat_client import HedgedChatCompletionClient
+        return HedgedChatCompletionClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+##############################
+# 4) HEDGED REALTIME HANDSHAKE
+##############################
+async def hedged_connect(hedger: Hedger, **connect_kwargs):
+    """Open the realtime WebSocket on whichever endpoint completes the handshake first."""
+    async def start(endpoint):
+        return await websockets.connect(endpoint.url, **connect_kwargs)
+
+    async def discard(websocket):
+        await websocket.close()
+
+    endpoint, websocket = await hedger.race(start, discard)
+    return endpoint, websocket
+
+##############################
+# 5) Demo against stub servers with injected delay
+##############################
+async def main():
+    import random
+    from autogen_core.models import UserMessage
+    from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+    from chat_completions_stub import ChatCompletionsStub
+    from hedged_chat_client import HedgedChatCompletionClient
+    from realtime_stub import RealtimeStub
+
+    # "sweden" usually answers in ~50 ms but 10% of requests stall for 1.5 s;
+    # "france" is a steady 120 ms. Hedging should cut sweden's tail.
+    def sweden_delay():
+        return 1.5 if random.random() < 0.1 else 0.05
+
+    async with ChatCompletionsStub(delay=sweden_delay) as sweden, \
+               ChatCompletionsStub(delay=0.12) as france, \
+               RealtimeStub(handshake_delay=sweden_delay) as rt_sweden, \
+               RealtimeStub(handshake_delay=0.12) as rt_france:
+        endpoints = [
+            Endpoint(name, client=AzureOpenAIChatCompletionClient(
+                model="gpt-4o-mini", api_version="2024-06-01",
+                azure_endpoint=stub.endpoint, api_key="stub", max_retries=0,
+            ), url=rt.url)
+            for name, stub, rt in (("sweden", sweden, rt_sweden), ("france", france, rt_france))
+        ]
+        client = HedgedChatCompletionClient(endpoints)
+        latencies = []
+        for i in range(100):
+            start = time.monotonic()
+            stream = client.create_stream([UserMessage(content=f"ping {i}", source="user")])
+            await stream.__anext__()
+            await stream.aclose()
+            latencies.append(time.monotonic() - start)
+        latencies.sort()
+        print(f"chat first-token p50={1000 * latencies[49]:.0f}ms p99={1000 * latencies[98]:.0f}ms")
+
+        handshakes = []
+        hedger = Hedger(endpoints)
+        for _ in range(30):
+            start = time.monotonic()
+            _, ws = await hedged_connect(hedger)
+            handshakes.append(time.monotonic() - start)
+            await ws.close()
+        handshakes.sort()
+        print(f"realtime handshake p50={1000 * handshakes[14]:.0f}ms max={1000 * handshakes[-1]:.0f}ms")
+        print("chat:", client.hedger.snapshot())
+        print("handshake:", hedger.snapshot())
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,369 @@
+import asyncio
+import contextlib
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from audio_profiling import LoopLagMonitor
+from voice_tracing import HdrHistogram
+
+##############################
+# 1) SIMULATED CALLERS (an audio backend for ConversationSystem)
+##############################
+class LoadStats:
+    """Counters for one measurement window, shared by every simulated caller."""
+    def __init__(self):
+        self.turn_latency = HdrHistogram()   # end of caller speech -> first reply sample played
+        self.turns = 0
+        self.timeouts = 0
+        self.underruns = 0                   # reply audio ran dry mid-response
+        self.starved_ms = 0.0
+        self.mic_overruns = 0                # mic block delivered more than a block late
+        self.mic_blocks = 0
+        self.errors = Counter()
+
+
+class _SimulatedInputStream:
+    def __init__(self, caller, callback, blocksize, latency):
+        self.caller = caller
+        self.callback = callback
+        self.blocksize = blocksize
+        self.latency = latency
+
+    def start(self):
+        # Called from the bring-up worker thread.
+        self.caller.loop.call_soon_threadsafe(self.caller.input_started, self)
+
+    def stop(self):
+        pass
+
+
+class _SimulatedOutputStream:
+    """Non-blocking stand-in for sd.OutputStream that keeps a playout clock."""
+    def __init__(self, caller, samplerate, latency):
+        self.caller = caller
+        self.samplerate = samplerate
+        self.latency = latency
+        self.play_until = 0.0
+
+    def write(self, samples):
+        now = time.perf_counter()
+        caller, stats = self.caller, self.caller.stats
+        if caller.speech_ended is not None:
+            stats.turn_latency.record((now + self.latency - caller.speech_ended) * 1e6)
+            stats.turns += 1
+            caller.speech_ended = None
+        elif now > self.play_until:
+            stats.underruns += 1
+            stats.starved_ms += 1000 * (now - self.play_until)
+        self.play_until = max(now, self.play_until) + len(samples) / self.samplerate
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class SimulatedCaller:
+    """
+    Plays the part of sounddevice for one ConversationSystem: the mic callback
+    is driven at real-time pace with speech-plus-silence turns (harmonic
+    'voice' bursts like audio_generation's tones, then low noise), and the
+    output stream only tracks when its audio would have played.
+
+    Mic callbacks run on the event loop rather than PortAudio's thread, so
+    their CPU (resampling, echo cancellation, VAD) competes with socket work
+    exactly as it does for the GIL in a real process.
+    """
+    def __init__(self, stats, device_rate=48000, seed=0, turn_timeout=15.0):
+        self.stats = stats
+        self.device_rate = device_rate
+        self.turn_timeout = turn_timeout
+        self.rng = random.Random(seed)
+        self.loop = asyncio.get_running_loop()
+        self.input = None
+        self.output = None
+        self.system = None
+        self.speech_ended = None
+        self.feeder = None
+        self.voice = self._voice(np.random.default_rng(seed))
+        self.noise = (60 * np.random.default_rng(seed + 1).standard_normal(device_rate)).astype(np.int16)
+
+    def _voice(self, rng):
+        rate = self.device_rate
+        t = np.arange(3 * rate) / rate
+        pitch = rng.uniform(110, 220) * (1 + 0.1 * np.sin(2 * np.pi * 0.4 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        syllables = np.sin(2 * np.pi * rng.uniform(3, 5) * t) > -0.3
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6)) * syllables * 5000
+        return np.clip(voice + 60 * rng.standard_normal(len(t)), -32768, 32767).astype(np.int16)
+
+    # --- sounddevice surface used by ConversationSystem._open_audio_streams ---
+    def query_devices(self, kind=None):
+        return {"default_samplerate": float(self.device_rate)}
+
+    def InputStream(self, samplerate, channels, dtype, callback, blocksize):
+        self.input = _SimulatedInputStream(self, callback, blocksize, latency=0.01)
+        return self.input
+
+    def OutputStream(self, samplerate, channels, dtype):
+        self.output = _SimulatedOutputStream(self, samplerate, latency=0.03)
+        return self.output
+
+    def input_started(self, stream):
+        if self.feeder is None or self.feeder.done():
+            self.feeder = self.loop.create_task(self._feed(stream))
+
+    # --- the caller's side of the conversation ---
+    async def _feed(self, stream):
+        block = stream.blocksize
+        block_s = block / self.device_rate
+        due = time.perf_counter()
+        while True:
+            # One turn: 1-2.5 s of speech, then silence until the reply has played out.
+            speech = int(self.rng.uniform(1.0, 2.5) / block_s)
+            offset = self.rng.randrange(0, len(self.voice) - speech * block)
+            for i in range(speech):
+                due = await self._deliver(stream, self.voice[offset + i * block:offset + (i + 1) * block], due)
+            self.speech_ended = time.perf_counter()
+            waited = 0.0
+            while self.speech_ended is not None or self.system.audio_processor.is_speaking \
+                    or time.perf_counter() < self.output.play_until:
+                due = await self._deliver(stream, self._silence(block), due)
+                waited += block_s
+                if waited > self.turn_timeout:
+                    self.stats.timeouts += 1
+                    self.speech_ended = None
+                    break
+            for _ in range(int(self.rng.uniform(0.3, 1.5) / block_s)):
+                due = await self._deliver(stream, self._silence(block), due)
+
+    def _silence(self, block):
+        start = self.rng.randrange(0, len(self.noise) - block)
+        return self.noise[start:start + block]
+
+    async def _deliver(self, stream, samples, due):
+        due += len(samples) / self.device_rate
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        late = time.perf_counter() - due
+        status = None
+        self.stats.mic_blocks += 1
+        if late > len(samples) / self.device_rate:
+            # PortAudio would have dropped input here; resynchronise like it does.
+            self.stats.mic_overruns += 1
+            status = "input overflow"
+            due = time.perf_counter()
+        stream.callback(samples.reshape(-1, 1), len(samples), None, status)
+        return due
+
+    async def run(self, url, system_factory, retry_delay=1.0):
+        """Keep one conversation going; a failed session counts as an error and is replaced."""
+        while True:
+            self.system = system_factory(self)
+            for endpoint in self.system.endpoints:
+                endpoint.url = url
+            try:
+                await self.system.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats.errors[type(e).__name__] += 1
+            finally:
+                if self.feeder:
+                    self.feeder.cancel()
+                self.speech_ended = None
+            await asyncio.sleep(retry_delay)
+
+##############################
+# 2) RAMP
+##############################
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, KiB on Linux
+
+
+def _cpu_seconds(pid):
+    """utime + stime of another process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _default_system_factory(caller):
+    from part1_realtime_api_autogen_integration import ConversationSystem
+    return ConversationSystem(audio_backend=caller)
+
+
+class LoadTest:
+    """
+    Ramps simulated callers (each a full ConversationSystem) against a
+    realtime endpoint, holding each concurrency level for a warm-up plus a
+    measurement window, and stops once the level is saturated.
+    """
+    def __init__(self, url, levels=(1, 10, 25, 50, 100, 200, 400), warmup=5.0, window=20.0,
+                 device_rate=48000, max_p95_ms=3000.0, max_error_rate=0.05, stub_pid=None,
+                 system_factory=_default_system_factory):
+        self.url = url
+        self.levels = levels
+        self.warmup = warmup
+        self.window = window
+        self.device_rate = device_rate
+        self.max_p95_ms = max_p95_ms
+        self.max_error_rate = max_error_rate
+        self.stub_pid = stub_pid
+        self.system_factory = system_factory
+        self.stats = LoadStats()
+        self.callers = []
+        self.results = []
+
+    async def run(self, report=None):
+        out = sys.stdout
+        report = report or (lambda line: print(line, file=out, flush=True))
+        lag = LoopLagMonitor().start()
+        # Sessions print per-chunk progress and debug lines; keep them out of the report.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            try:
+                for level in self.levels:
+                    await self._ramp_to(level)
+                    await asyncio.sleep(self.warmup)
+                    result = await self._measure(level, lag)
+                    self.results.append(result)
+                    report(format_result(result, header=len(self.results) == 1))
+                    if result["saturated"]:
+                        report(f"saturated at {level} callers: {result['saturated']}")
+                        break
+            finally:
+                lag.stop()
+                for task in self.callers:
+                    task.cancel()
+                await asyncio.gather(*self.callers, return_exceptions=True)
+        return self.results
+
+    async def _ramp_to(self, level):
+        new = level - len(self.callers)
+        for i in range(new):
+            caller = SimulatedCaller(self.stats, self.device_rate, seed=len(self.callers))
+            self.callers.append(asyncio.ensure_future(caller.run(self.url, self.system_factory)))
+            # Spread connects over ~1 s instead of a thundering herd.
+            await asyncio.sleep(1.0 / max(new, 1))
+
+    async def _measure(self, level, lag):
+        self.stats.__init__()
+        lag.lag, lag.stalls = HdrHistogram(), 0
+        wall, cpu, stub_cpu = time.perf_counter(), time.process_time(), _cpu_seconds(self.stub_pid)
+        await asyncio.sleep(self.window)
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        stub_end = _cpu_seconds(self.stub_pid)
+        s = self.stats
+        latency = s.turn_latency.summary_ms()
+        errors = sum(s.errors.values()) + s.timeouts
+        error_rate = errors / max(1, s.turns + errors)
+        result = {
+            "callers": level, "turns": s.turns, "turns_per_s": s.turns / wall,
+            "p50_ms": latency["p50_ms"], "p95_ms": latency["p95_ms"], "p99_ms": latency["p99_ms"],
+            "underruns_per_turn": s.underruns / max(1, s.turns), "starved_ms": s.starved_ms,
+            "mic_overrun_rate": s.mic_overruns / max(1, s.mic_blocks),
+            "loop_lag_p99_ms": lag.lag.summary_ms()["p99_ms"],
+            "cpu_pct": 100 * cpu / wall, "rss_mb": _rss_mb(),
+            "stub_cpu_pct": None if stub_cpu is None or stub_end is None else 100 * (stub_end - stub_cpu) / wall,
+            "error_rate": error_rate, "errors": dict(s.errors, **({"timeout": s.timeouts} if s.timeouts else {})),
+        }
+        reasons = []
+        if not s.turns:
+            reasons.append("no completed turns")
+        elif latency["p95_ms"] > self.max_p95_ms:
+            reasons.append(f"p95 turn latency {latency['p95_ms']:.0f} ms > {self.max_p95_ms:.0f} ms")
+        if error_rate > self.max_error_rate:
+            reasons.append(f"error rate {error_rate:.1%}")
+        if result["mic_overrun_rate"] > 0.01:
+            reasons.append(f"{result['mic_overrun_rate']:.1%} of mic blocks late")
+        result["saturated"] = ", ".join(reasons)
+        return result
+
+
+def format_result(r, header=False):
+    line = (f"{r['callers']:7d} {r['turns']:6d} {r['p50_ms']:7.0f} {r['p95_ms']:7.0f} {r['p99_ms']:7.0f} "
+            f"{r['underruns_per_turn']:9.2f} {r['mic_overrun_rate']:8.1%} {r['loop_lag_p99_ms']:8.1f} "
+            f"{r['cpu_pct']:6.0f}% {r['rss_mb']:7.0f} "
+            f"{'   n/a' if r['stub_cpu_pct'] is None else format(r['stub_cpu_pct'], '5.0f') + '%'} "
+            f"{r['error_rate']:7.1%}")
+    if r["errors"]:
+        line += f"  {r['errors']}"
+    if header:
+        line = (f"{'callers':>7s} {'turns':>6s} {'p50 ms':>7s} {'p95 ms':>7s} {'p99 ms':>7s} "
+                f"{'underrun/t':>9s} {'mic late':>8s} {'lag p99':>8s} {'cpu':>7s} {'rss MB':>7s} "
+                f"{'stub':>6s} {'errors':>7s}\n") + line
+    return line
+
+##############################
+# 3) LOCAL STUB IN ITS OWN PROCESS
+##############################
+@contextlib.asynccontextmanager
+async def stub_process(response_delay=0.3, reply_seconds=2.0, pace=1.5, drop_rate=0.0):
+    """RealtimeStub in a child process, so it doesn't compete with the callers for the GIL."""
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "realtime_stub.py"),
+        "--port", "0", "--response-delay", str(response_delay), "--reply-seconds", str(reply_seconds),
+        "--pace", str(pace), "--drop-rate", str(drop_rate), stdout=subprocess.PIPE)
+    try:
+        line = (await asyncio.wait_for(proc.stdout.readline(), 30)).decode()
+        url = re.search(r"(ws://\S+)", line)
+        if not url:
+            raise RuntimeError(f"Stub did not start: {line!r}")
+        yield url.group(1), proc.pid
+    finally:
+        proc.terminate()
+        await proc.wait()
+
+
+async def main(args):
+    # ConversationSystem insists on a key; the stub ignores it.
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "load-test")
+    if args.no_aec:
+        os.environ["ECHO_CANCELLATION"] = "0"
+    if args.audio_format:
+        os.environ["REALTIME_AUDIO_FORMAT"] = args.audio_format
+    levels = tuple(int(level) for level in args.levels.split(","))
+    options = dict(levels=levels, warmup=args.warmup, window=args.window, device_rate=args.device_rate,
+                   max_p95_ms=args.max_p95_ms)
+    print(f"levels {levels}, {args.warmup:.0f}s warm-up + {args.window:.0f}s window each, "
+          f"echo cancellation {'off' if args.no_aec else 'on'}, device rate {args.device_rate} Hz")
+    if args.url:
+        await LoadTest(args.url, **options).run()
+        return
+    async with stub_process(args.response_delay, args.reply_seconds, args.pace, args.drop_rate) as (url, pid):
+        print(f"stub {url} (pid {pid}): {args.response_delay:.1f}s to first audio, "
+              f"{args.reply_seconds:.1f}s replies at {args.pace:g}x real time")
+        await LoadTest(url, stub_pid=pid, **options).run()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Ramp simulated voice callers against a realtime endpoint")
+    parser.add_argument("--url", help="realtime endpoint (default: start a local stub)")
+    parser.add_argument("--levels", default="1,10,25,50,100,200,400")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--window", type=float, default=20.0)
+    parser.add_argument("--device-rate", type=int, default=48000)
+    parser.add_argument("--audio-format", choices=("pcm16", "g711_ulaw", "g711_alaw"))
+    parser.add_argument("--no-aec", action="store_true")
+    parser.add_argument("--max-p95-ms", type=float, default=3000.0)
+    parser.add_argument("--response-delay", type=float, default=0.3)
+    parser.add_argument("--reply-seconds", type=float, default=2.0)
+    parser.add_argument("--pace", type=float, default=1.5)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,247 @@
+import asyncio
+import re
+import time
+from collections import Counter
+
+from autogen_core.models import RequestUsage
+from pydantic import ValidationError
+
+from model_client_wrapper import DelegatingChatCompletionClient
+
+##############################
+# 1) PRICING
+##############################
+# USD per 1M tokens (input, output). Used only for budget accounting.
+PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+def request_cost(model, usage):
+    input_price, output_price = PRICES_PER_MILLION.get(model, (0.0, 0.0))
+    return (usage.prompt_tokens * input_price + usage.completion_tokens * output_price) / 1_000_000
+
+##############################
+# 2) CHEAP CONFIDENCE CHECKS
+##############################
+# Each check takes (client, messages, result, kwargs) and returns None when the
+# answer looks fine, or a short reason string when it should be escalated.
+REFUSAL_PATTERN = re.compile(
+    r"\b(i'?m sorry|i am sorry|i can(?:no|')t|i am unable|i'm unable|as an ai\b|i don'?t know)",
+    re.IGNORECASE,
+)
+CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def strip_code_fence(text):
+    return CODE_FENCE_PATTERN.sub("", text.strip())
+
+
+def schema_check(model_cls):
+    """Escalate unless the answer parses as `model_cls` (e.g. the notebook's QueryResponse)."""
+    async def check(client, messages, result, kwargs):
+        try:
+            model_cls.model_validate_json(strip_code_fence(result.content))
+        except (ValidationError, ValueError):
+            return f"schema:{model_cls.__name__}"
+        return None
+    return check
+
+
+async def refusal_check(client, messages, result, kwargs):
+    """Escalate hedged or refused answers ("I'm sorry, I can't ...")."""
+    if REFUSAL_PATTERN.search(result.content[:200]):
+        return "refusal"
+    return None
+
+
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def self_consistency_check(min_overlap=0.6, temperature=0.8):
+    """
+    Escalate when a second, hotter sample from the small model disagrees with
+    the first (word-set Jaccard overlap below `min_overlap`). Costs one extra
+    small-model call, so put it last in the check list.
+    """
+    async def check(client, messages, result, kwargs):
+        extra = dict(kwargs.get("extra_create_args", {}))
+        extra["temperature"] = temperature
+        second = await client.small.create(messages, **{**kwargs, "extra_create_args": extra})
+        client.record_small_usage(second.usage)
+        if not isinstance(second.content, str):
+            return "self_consistency"
+        a, b = _words(result.content), _words(second.content)
+        overlap = len(a & b) / max(1, len(a | b))
+        return None if overlap >= min_overlap else "self_consistency"
+    return check
+
+##############################
+# 3) BUDGETS AND STATS
+##############################
+class CascadeBudget:
+    """
+    Per-agent limits. Escalation is skipped (the small answer is returned as-is)
+    when the expected large-model latency would blow `max_latency` for this
+    request, or once the agent has spent `max_cost` USD in total.
+    """
+    def __init__(self, max_latency=None, max_cost=None):
+        self.max_latency = max_latency
+        self.max_cost = max_cost
+
+
+class CascadeStats:
+    def __init__(self):
+        self.calls = 0
+        self.escalations = 0
+        self.budget_skips = 0
+        self.reasons = Counter()
+        self.cost = 0.0
+        self.latency_total = 0.0
+
+    @property
+    def escalation_rate(self):
+        return self.escalations / self.calls if self.calls else 0.0
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "escalations": self.escalations,
+            "escalation_rate": self.escalation_rate,
+            "budget_skips": self.budget_skips,
+            "reasons": dict(self.reasons),
+            "cost_usd": self.cost,
+            "mean_latency_ms": 1000.0 * self.latency_total / self.calls if self.calls else 0.0,
+        }
+
+##############################
+# 4) CASCADING MODEL CLIENT
+##############################
+class CascadeChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Answers with the small model (agent_client, gpt-4o-mini) first and only
+    escalates to the large one (aggregator_client, gpt-4o) when a cheap check
+    fails. Give each agent its own instance so budgets and stats are per agent.
+    """
+    def __init__(self, small, large, checks=(refusal_check,), budget=None, name="agent",
+                 small_model="gpt-4o-mini", large_model="gpt-4o"):
+        super().__init__(small)
+        self.small = small
+        self.large = large
+        self.checks = list(checks)
+        self.budget = budget or CascadeBudget()
+        self.name = name
+        self.small_model = small_model
+        self.large_model = large_model
+        # EWMA of large-model latency, used to predict whether escalating fits
+        # in the latency budget.
+        self.large_latency = None
+        self.stats = CascadeStats()
+
+    def _combined(self, small, large):
+        if self.large is self.small:
+            return small
+        return RequestUsage(prompt_tokens=small.prompt_tokens + large.prompt_tokens,
+                            completion_tokens=small.completion_tokens + large.completion_tokens)
+
+    def actual_usage(self):
+        """Small plus large model usage (the large client's counters include every agent sharing it)."""
+        return self._combined(self.small.actual_usage(), self.large.actual_usage())
+
+    def total_usage(self):
+        return self._combined(self.small.total_usage(), self.large.total_usage())
+
+    def record_small_usage(self, usage):
+        self.stats.cost += request_cost(self.small_model, usage)
+
+    async def _first_failure(self, messages, result, kwargs):
+        # Tool calls are handled by the agent's tool loop; nothing to judge yet.
+        if not isinstance(result.content, str):
+            return None
+        for check in self.checks:
+            reason = await check(self, messages, result, kwargs)
+            if reason:
+                return reason
+        return None
+
+    def _can_escalate(self, elapsed):
+        if self.budget.max_cost is not None and self.stats.cost >= self.budget.max_cost:
+            return False
+        if self.budget.max_latency is not None and self.large_latency is not None:
+            return elapsed + self.large_latency <= self.budget.max_latency
+        return True
+
+    async def create(self, messages, **kwargs):
+        start = time.monotonic()
+        self.stats.calls += 1
+        try:
+            result = await self.small.create(messages, **kwargs)
+            self.record_small_usage(result.usage)
+            reason = await self._first_failure(messages, result, kwargs)
+            if reason is None:
+                return result
+            self.stats.reasons[reason] += 1
+            if not self._can_escalate(time.monotonic() - start):
+                self.stats.budget_skips += 1
+                return result
+            self.stats.escalations += 1
+            large_start = time.monotonic()
+            result = await self.large.create(messages, **kwargs)
+            elapsed = time.monotonic() - large_start
+            self.large_latency = elapsed if self.large_latency is None else 0.8 * self.large_latency + 0.2 * elapsed
+            self.stats.cost += request_cost(self.large_model, result.usage)
+            return result
+        finally:
+            self.stats.latency_total += time.monotonic() - start
+
+    async def create_stream(self, messages, **kwargs):
+        # The answer can't be checked before it is complete, so the cascade
+        # streams the final (possibly escalated) result in one piece.
+        result = await self.create(messages, **kwargs)
+        if isinstance(result.content, str):
+            yield result.content
+        yield result
+
+##############################
+# 5) Demo against local stubs
+##############################
+async def main():
+    from typing import Optional
+    from pydantic import BaseModel
+    from autogen_core.models import SystemMessage, UserMessage
+    from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+    from chat_completions_stub import ChatCompletionsStub
+
+    # Same structured-output model as the tools notebook.
+    class QueryResponse(BaseModel):
+        weather_report: Optional[str] = None
+        currency_info: Optional[str] = None
+        local_time: Optional[str] = None
+        notes: Optional[str] = None
+
+    replies = iter(['{"weather_report": "25°C and sunny in Berlin"}',
+                    "Sure! The weather in Berlin is 25°C.",
+                    "I'm sorry, I can't help with that."] * 10)
+    async with ChatCompletionsStub(delay=0.05) as small_stub, \
+               ChatCompletionsStub(delay=0.3, reply='{"weather_report": "25°C, sunny"}') as large_stub:
+        def client(model, stub):
+            return AzureOpenAIChatCompletionClient(
+                model=model, api_version="2024-06-01",
+                azure_endpoint=stub.endpoint, api_key="stub", max_retries=0,
+            )
+        cascade = CascadeChatCompletionClient(
+            client("gpt-4o-mini", small_stub), client("gpt-4o", large_stub),
+            checks=[refusal_check, schema_check(QueryResponse)],
+            budget=CascadeBudget(max_latency=2.0, max_cost=0.05),
+            name="multi_tool_agent",
+        )
+        messages = [SystemMessage(content="Reply with QueryResponse JSON."),
+                    UserMessage(content="What is the weather in Berlin?", source="user")]
+        for _ in range(30):
+            small_stub.reply = next(replies)
+            await cascade.create(messages)
+        print(f"{cascade.name}: {cascade.stats.snapshot()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
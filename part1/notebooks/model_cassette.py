@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+
+from autogen_core.models import CreateResult, RequestUsage
+
+from model_client_wrapper import DelegatingChatCompletionClient, message_text
+
+##############################
+# 1) CASSETTE: recorded interactions on disk
+##############################
+class CassetteMiss(LookupError):
+    pass
+
+
+def request_key(messages, kwargs):
+    """Stable hash of what the model saw: message types, sources and text, tool names, output format."""
+    tools = [getattr(t, "name", None) or t.get("name") for t in kwargs.get("tools", ())]
+    json_output = kwargs.get("json_output")
+    request = {
+        "messages": [(type(m).__name__, getattr(m, "source", None), message_text(m)) for m in messages],
+        "tools": tools,
+        "json_output": getattr(json_output, "__name__", json_output),
+        "tool_choice": str(kwargs.get("tool_choice", "auto")),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+
+class Cassette:
+    """
+    JSONL file of model interactions: a header line, then one line per call with
+    the request key, a short preview of the request, the latency, each streamed
+    chunk with its offset from the request, and the final CreateResult.
+
+    In "record" mode every interaction is appended as it completes, so a run that
+    dies half way still leaves a usable cassette. In "replay" mode interactions
+    are matched by request key; identical requests get their recordings in
+    order. With match="order" every request just gets the next recording, for
+    prompts that aren't byte-for-byte reproducible (timestamps, random ids).
+    One cassette can be shared by any number of CassetteClients.
+    """
+    def __init__(self, path, mode="replay", match="key"):
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self.model_info = None
+        self.entries = []
+        self.by_key = {}
+        self.cursor = {}
+        self.next_index = 0
+        self.file = None
+        if mode == "replay":
+            self._load()
+        elif mode == "record":
+            self.file = open(path, "w", encoding="utf-8", buffering=1)
+        else:
+            raise ValueError(f"mode must be 'record' or 'replay', not {mode!r}")
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            self.model_info = header.get("model_info")
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.append(entry)
+                    self.by_key.setdefault(entry["key"], []).append(entry)
+
+    def write(self, entry, model_info=None):
+        if not self.entries and self.file.tell() == 0:
+            self.file.write(json.dumps({"cassette": 1, "recorded_at": datetime.now(timezone.utc).isoformat(),
+                                        "model_info": dict(model_info) if model_info else None}) + "\n")
+        self.entries.append(entry)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def lookup(self, key, preview):
+        if self.match == "order":
+            if self.next_index >= len(self.entries):
+                raise CassetteMiss(f"cassette {self.path} has only {len(self.entries)} recordings")
+            self.next_index += 1
+            return self.entries[self.next_index - 1]
+        recorded = self.by_key.get(key)
+        if not recorded:
+            raise CassetteMiss(f"no recording for request {key} ({preview!r}) in {self.path}")
+        index = self.cursor.get(key, 0)
+        # Past the end, keep serving the last recording for that request.
+        self.cursor[key] = index + 1
+        return recorded[min(index, len(recorded) - 1)]
+
+    def rewind(self):
+        """Start serving every request from its first recording again."""
+        self.cursor.clear()
+        self.next_index = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+##############################
+# 2) CLIENT WRAPPER
+##############################
+class CassetteClient(DelegatingChatCompletionClient):
+    """
+    Drop-in wrapper for AzureOpenAIChatCompletionClient that records to, or
+    replays from, a Cassette:
+
+        cassette = Cassette("orchestration.jsonl", mode="record")
+        client = CassetteClient(cassette, azure_client)           # once, online
+        ...
+        cassette = Cassette("orchestration.jsonl")                 # then offline, forever
+        client = CassetteClient(cassette, speed=None)              # None: as fast as possible
+        client = CassetteClient(cassette, speed=1.0)               # at recorded latency and chunk pacing
+
+    Replay needs no inner client. It never touches the network, and a fixed
+    cassette always gives the same results, so any time left over is our own
+    agent, team and tool code. Streamed and non-streamed calls can be served
+    from either kind of recording.
+    """
+    def __init__(self, cassette, inner=None, speed=None):
+        if inner is None:
+            from autogen_ext.models.replay import ReplayChatCompletionClient
+            inner = ReplayChatCompletionClient([], model_info=cassette.model_info)
+        super().__init__(inner)
+        self.cassette = cassette
+        self.speed = speed
+        self.usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self.last_usage = self.usage
+
+    def _preview(self, messages):
+        return message_text(messages[-1])[:60] if messages else ""
+
+    def _count(self, result):
+        self.last_usage = result.usage
+        self.usage = RequestUsage(prompt_tokens=self.usage.prompt_tokens + result.usage.prompt_tokens,
+                                  completion_tokens=self.usage.completion_tokens + result.usage.completion_tokens)
+        return result
+
+    async def _wait_until(self, start, offset):
+        if self.speed:
+            delay = start + offset / self.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def create(self, messages, **kwargs):
+        key = request_key(messages, kwargs)
+        start = time.perf_counter()
+        if self.cassette.mode == "record":
+            result = await self.inner.create(messages, **kwargs)
+            self.cassette.write({"key": key, "request": self._preview(messages), "stream": False,
+                                 "latency": time.perf_counter() - start, "chunks": [],
+                                 "result": result.model_dump(mode="json")}, self.inner.model_info)
+            return self._count(result)
+        entry = self.cassette.lookup(key, self._preview(messages))
+        await self._wait_until(start, entry["latency"])
+        return self._count(CreateResult.model_validate(entry["result"]))
+
+    async def create_stream(self, messages, **kwargs):
+        key = request_key(messages, kwargs)
+        start = time.perf_counter()
+        if self.cassette.mode == "record":
+            chunks = []
+            result = None
+            async for item in self.inner.create_stream(messages, **kwargs):
+                if isinstance(item, CreateResult):
+                    result = item
+                else:
+                    chunks.append((round(time.perf_counter() - start, 6), item))
+                yield item
+            self.cassette.write({"key": key, "request": self._preview(messages), "stream": True,
+                                 "latency": time.perf_counter() - start, "chunks": chunks,
+                                 "result": result.model_dump(mode="json")}, self.inner.model_info)
+            self._count(result)
+            return
+        entry = self.cassette.lookup(key, self._preview(messages))
+        result = CreateResult.model_validate(entry["result"])
+        chunks = entry["chunks"]
+        if not chunks and isinstance(result.content, str):
+            # Recorded without streaming: one chunk at the end.
+            chunks = [(entry["latency"], result.content)]
+        for offset, text in chunks:
+            await self._wait_until(start, offset)
+            yield text
+        await self._wait_until(start, entry["latency"])
+        yield self._count(result)
+
+    def actual_usage(self):
+        return self.last_usage
+
+    def total_usage(self):
+        return self.usage
+
+##############################
+# 3) BENCHMARK: live-like timings vs replay at recorded speed vs as fast as possible
+##############################
+def _network_client(responses, seed, mean_latency=0.25, chunk_chars=6, per_chunk=0.008):
+    """Stands in for Azure: the eval recordings with jittered latency and paced streaming."""
+    import random
+    from autogen_ext.models.replay import ReplayChatCompletionClient
+    from agent_evals import REPLAY_MODEL_INFO
+
+    rng = random.Random(seed)
+
+    class NetworkClient(DelegatingChatCompletionClient):
+        async def create(self, messages, **kwargs):
+            await asyncio.sleep(rng.lognormvariate(0, 0.5) * mean_latency)
+            return await self.inner.create(messages, **kwargs)
+
+        async def create_stream(self, messages, **kwargs):
+            result = await self.create(messages, **kwargs)
+            if isinstance(result.content, str):
+                for i in range(0, len(result.content), chunk_chars):
+                    await asyncio.sleep(per_chunk * rng.uniform(0.5, 1.5))
+                    yield result.content[i:i + chunk_chars]
+            yield result
+
+    return NetworkClient(ReplayChatCompletionClient([CreateResult.model_validate(r) for r in responses],
+                                                    model_info=REPLAY_MODEL_INFO))
+
+
+def _streaming_tool_agent(client):
+    from autogen_agentchat.agents import AssistantAgent
+    from agent_evals import TOOL_AGENT_SYSTEM_MESSAGE, convert_currency, get_time_in, get_weather
+    return AssistantAgent("multi_tool_agent", model_client=client, model_client_stream=True,
+                          tools=[get_weather, convert_currency, get_time_in],
+                          system_message=TOOL_AGENT_SYSTEM_MESSAGE, reflect_on_tool_use=True)
+
+
+async def _suite(make_clients, cases):
+    """Every case once, sequentially; returns ({case: seconds}, {case: final text})."""
+    from agent_evals import TARGETS, _run_chat
+    times, texts = {}, {}
+    for case in cases:
+        clients = make_clients(case)
+        start = time.perf_counter()
+        if case.get("stream"):
+            outcome = await _run_chat(_streaming_tool_agent(clients["agent"]), case["prompt"])
+        else:
+            outcome = await TARGETS[case["target"]](clients, case["prompt"])
+        times[case["id"]] = time.perf_counter() - start
+        texts[case["id"]] = outcome.text
+    return times, texts
+
+
+async def benchmark(path="model_cassette_benchmark.jsonl", repeats=10, profile=False):
+    import logging
+    import os
+    import statistics
+    from autogen_core import EVENT_LOGGER_NAME
+    from agent_evals import RECORDINGS, load_dataset
+
+    # The stand-in's ReplayChatCompletionClient warns on every tool_choice it ignores.
+    logging.getLogger(EVENT_LOGGER_NAME).setLevel(logging.ERROR)
+
+    with open(RECORDINGS, encoding="utf-8") as f:
+        recordings = json.load(f)
+    cases = [c for c in load_dataset() if c["target"] in ("tool_agent", "selector_team")]
+    cases += [dict(c, id=c["id"] + "-stream", stream=True) for c in cases if c["target"] == "tool_agent"]
+
+    def network(case):
+        responses = recordings[case["id"].removesuffix("-stream")]
+        return {role: _network_client(responses.get(role, []), seed=hash((case["id"], role, time.time())))
+                for role in ("agent", "selector")}
+
+    def total(times):
+        return sum(times.values())
+
+    print(f"{len(cases)} cases (tools agent, streamed tools agent, SelectorGroupChat), run sequentially")
+    live = [await _suite(network, cases) for _ in range(3)]
+    live_totals = [total(t) for t, _ in live]
+    print(f"  simulated network   suite {statistics.mean(live_totals):6.3f}s "
+          f"+- {statistics.pstdev(live_totals):.3f}s over {len(live)} runs (jittered latency)")
+
+    cassette = Cassette(path, mode="record")
+    recorded_times, recorded_texts = await _suite(
+        lambda case: {role: CassetteClient(cassette, client) for role, client in network(case).items()}, cases)
+    cassette.close()
+    print(f"  recording           suite {total(recorded_times):6.3f}s, "
+          f"{len(cassette.entries)} interactions, {os.path.getsize(path) / 1024:.1f} KiB")
+
+    cassette = Cassette(path)
+    for label, speed in (("replay @ recorded", 1.0), ("replay, no waits", None)):
+        runs = []
+        for _ in range(repeats if speed is None else 3):
+            cassette.rewind()
+            times, texts = await _suite(lambda case: {role: CassetteClient(cassette, speed=speed)
+                                                      for role in ("agent", "selector")}, cases)
+            assert texts == recorded_texts, "replay diverged from the recording"
+            runs.append(times)
+        totals = [total(t) for t in runs]
+        per_case = sorted(1000 * s for t in runs for s in t.values())
+        print(f"  {label:19s} suite {statistics.mean(totals):6.3f}s +- {statistics.pstdev(totals):.3f}s "
+              f"over {len(runs)} runs, per case p50 {per_case[len(per_case) // 2]:6.1f} ms "
+              f"p99 {per_case[int(0.99 * (len(per_case) - 1))]:6.1f} ms, outputs identical")
+    if profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        cassette.rewind()
+        profiler.enable()
+        await _suite(lambda case: {role: CassetteClient(cassette) for role in ("agent", "selector")}, cases)
+        profiler.disable()
+        print("\nFramework overhead, replay with no waits (top 15 by cumulative time):")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    os.remove(path)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Record/replay benchmark for the notebook agents")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--profile", action="store_true", help="cProfile one no-wait replay of the suite")
+    args = parser.parse_args()
+    asyncio.run(benchmark(repeats=args.repeats, profile=args.profile))
@@ -0,0 +1,76 @@
+from typing import Any, AsyncGenerator, Sequence, Union
+
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+
+class DelegatingChatCompletionClient(ChatCompletionClient):
+    """
+    Base class for wrappers that sit in front of an AzureOpenAIChatCompletionClient.
+    Everything is forwarded to the wrapped client; subclasses override create /
+    create_stream to add their own behaviour, so the wrapper can be passed to
+    AssistantAgent or a team exactly like the original client. Keyword arguments
+    (tools, json_output, tool_choice, ...) pass through untouched so the wrapper
+    keeps working across autogen releases.
+    """
+    def __init__(self, inner: ChatCompletionClient):
+        self.inner = inner
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        return await self.inner.create(messages, **kwargs)
+
+    def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self.inner.create_stream(messages, **kwargs)
+
+    async def close(self) -> None:
+        close = getattr(self.inner, "close", None)
+        if close is not None:
+            await close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self.inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self.inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Union[Tool, ToolSchema]] = []) -> int:
+        return self.inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Union[Tool, ToolSchema]] = []) -> int:
+        return self.inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        return self.inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self.inner.model_info
+
+
+def message_text(message: LLMMessage) -> str:
+    """Flatten an LLM message's content to plain text (images and tool payloads as str)."""
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(item if isinstance(item, str) else str(item) for item in content)
+    return str(content)
+
+
+def estimate_tokens(messages: Sequence[LLMMessage], max_completion_tokens: int = 256) -> int:
+    """
+    Cheap pre-flight token estimate (~4 characters per token plus per-message overhead).
+    Good enough for rate-limit budgeting without pulling tiktoken onto the hot path.
+    """
+    prompt_chars = sum(len(message_text(m)) for m in messages)
+    return prompt_chars // 4 + 4 * len(messages) + max_completion_tokens
@@ -0,0 +1,340 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+##############################
+# 1) PRIORITY CLASSES
+##############################
+# Lower number = served first. Realtime voice turns must never wait behind
+# batch agent work, so they get their own class above interactive text.
+PRIORITY_VOICE = 0
+PRIORITY_TEXT = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {
+    PRIORITY_VOICE: "interactive_voice",
+    PRIORITY_TEXT: "interactive_text",
+    PRIORITY_BATCH: "batch",
+}
+
+##############################
+# 2) TOKEN BUCKETS (RPM / TPM budgets)
+##############################
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` units per minute."""
+    def __init__(self, per_minute):
+        self.per_minute = float(per_minute)
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def scale(self, factor):
+        """Run at `factor` of the configured budget (refill rate and burst size)."""
+        self._refill(time.monotonic())
+        self.capacity = self.per_minute * factor
+        self.rate = self.capacity / 60.0
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now, reserve=0.0):
+        """Seconds until `amount` units are available while keeping `reserve` units untouched."""
+        self._refill(now)
+        # A single request larger than the whole bucket would never fit; let it
+        # through once the bucket is full instead of deadlocking the queue.
+        needed = min(amount + reserve, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= amount
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+def retry_after_seconds(exc, default=1.0):
+    """
+    Return the server-requested back-off for a 429 raised by the openai SDK
+    (which AzureOpenAIChatCompletionClient lets propagate), or None for other errors.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    for key, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(key)
+        if value:
+            try:
+                return float(value) / scale
+            except ValueError:
+                continue
+    return default
+
+##############################
+# 3) QUEUE-WAIT METRICS
+##############################
+class QueueWaitMetrics:
+    """Per-priority queue wait statistics over a bounded window of recent requests."""
+    def __init__(self, window=2048):
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, wait):
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent.append(wait)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        index = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_wait_ms": 1000.0 * self.total_wait / self.count if self.count else 0.0,
+            "p50_wait_ms": 1000.0 * self.percentile(50),
+            "p95_wait_ms": 1000.0 * self.percentile(95),
+            "max_wait_ms": 1000.0 * self.max_wait,
+        }
+
+##############################
+# 4) REQUEST SCHEDULER
+##############################
+class _Ticket:
+    __slots__ = ("tokens", "priority", "enqueued", "future")
+
+    def __init__(self, tokens, priority, future):
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class RequestScheduler:
+    """
+    Admits model calls in priority order while keeping the deployment's RPM and
+    TPM budgets. A 429 pauses all dispatch for the server's retry-after instead
+    of letting every agent retry on its own.
+
+    The configured budgets are a ceiling, not a promise: each rate-limit
+    episode halves the admitted rate (multiplicative decrease) and every
+    `recover_after` successful calls add back `increase` of the configured
+    rate (additive increase), so the scheduler settles just under the real
+    limit instead of hitting it on every burst.
+    """
+    def __init__(self, rpm, tpm, interactive_reserve=0.1, decrease=0.5, increase=0.05,
+                 recover_after=10, min_rate_scale=0.05):
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        # Fraction of the TPM budget that batch work may not touch, so an
+        # interactive turn always finds tokens waiting for it.
+        self.interactive_reserve = interactive_reserve
+        self.queue = []
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.paused_until = 0.0
+        self.dispatcher = None
+        self.metrics = {priority: QueueWaitMetrics() for priority in PRIORITY_NAMES}
+        self.rate_limited = 0
+        self.decrease = decrease
+        self.increase = increase
+        self.recover_after = recover_after
+        self.min_rate_scale = min_rate_scale
+        self.rate_scale = 1.0
+        self.successes = 0
+
+    def _ensure_dispatcher(self):
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def acquire(self, est_tokens, priority=PRIORITY_TEXT, record=True):
+        """
+        Wait for a dispatch slot; returns the time spent queued in seconds.
+        Callers that retry pass record=False and record the total wait once.
+        """
+        self._ensure_dispatcher()
+        ticket = _Ticket(est_tokens, priority, asyncio.get_running_loop().create_future())
+        heapq.heappush(self.queue, (priority, next(self.sequence), ticket))
+        self.wakeup.set()
+        await ticket.future
+        wait = time.monotonic() - ticket.enqueued
+        if record:
+            self.metrics[priority].record(wait)
+        return wait
+
+    @asynccontextmanager
+    async def slot(self, est_tokens, priority=PRIORITY_VOICE):
+        """`async with scheduler.slot(...)` around work that isn't a model-client call (e.g. a realtime response.create)."""
+        await self.acquire(est_tokens, priority)
+        yield
+
+    async def run(self, call, est_tokens, priority=PRIORITY_TEXT, max_attempts=10):
+        """Run `call()` (a coroutine factory) under the scheduler, re-queueing on 429."""
+        waited = 0.0
+        try:
+            for attempt in range(max_attempts):
+                waited += await self.acquire(est_tokens, priority, record=False)
+                try:
+                    result = await call()
+                except Exception as exc:
+                    retry_after = retry_after_seconds(exc)
+                    if retry_after is None or attempt == max_attempts - 1:
+                        raise
+                    self.pause(retry_after)
+                    continue
+                self.succeeded()
+                return result
+        finally:
+            self.metrics[priority].record(waited)
+
+    def pause(self, seconds):
+        """
+        Honour a retry-after: stop dispatching until it has elapsed, then resume
+        at a lower rate rather than releasing the whole backlog at once.
+        """
+        now = time.monotonic()
+        self.rate_limited += 1
+        self.successes = 0
+        # Everything already in flight gets its 429 at about the same time;
+        # cut the rate once per episode, not once per rejected request.
+        if now >= self.paused_until:
+            self._set_rate_scale(self.rate_scale * self.decrease)
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.request_bucket.drain()
+        self.wakeup.set()
+
+    def succeeded(self):
+        """A call went through; after `recover_after` in a row, probe a little higher."""
+        self.successes += 1
+        if self.successes >= self.recover_after and self.rate_scale < 1.0:
+            self.successes = 0
+            self._set_rate_scale(self.rate_scale + self.increase)
+
+    def _set_rate_scale(self, scale):
+        self.rate_scale = min(1.0, max(self.min_rate_scale, scale))
+        self.request_bucket.scale(self.rate_scale)
+        self.token_bucket.scale(self.rate_scale)
+
+    def settle(self, est_tokens, actual_tokens):
+        """Give back (or charge) the difference between the estimate and the real usage."""
+        if actual_tokens:
+            self.token_bucket.refund(est_tokens - actual_tokens)
+
+    def _wait_time(self, ticket, now):
+        reserve = self.interactive_reserve if ticket.priority == PRIORITY_BATCH else 0.0
+        return max(
+            self.request_bucket.wait_time(1, now),
+            self.token_bucket.wait_time(ticket.tokens, now, reserve * self.token_bucket.capacity),
+        )
+
+    async def _dispatch(self):
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            _, _, ticket = self.queue[0]
+            if ticket.future.cancelled():
+                heapq.heappop(self.queue)
+                continue
+            wait = self._wait_time(ticket, now)
+            if wait > 0:
+                # Sleep until the budget refills, but wake early if a
+                # higher-priority request arrives and becomes the new head.
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.queue)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(ticket.tokens)
+            ticket.future.set_result(None)
+
+    def snapshot(self):
+        return {
+            "queued": len(self.queue),
+            "rate_limited": self.rate_limited,
+            "rate_scale": self.rate_scale,
+            "rpm": 60.0 * self.request_bucket.rate,
+            "queue_wait": {PRIORITY_NAMES[p]: m.snapshot() for p, m in self.metrics.items()},
+        }
+
+##############################
+# 5) MODEL CLIENT WRAPPER
+##############################
+def __getattr__(name):
+    # ScheduledChatCompletionClient lives in scheduled_chat_client because it pulls
+    # in autogen_core (~0.4 s); it is loaded only when someone asks for it.
+    if name == "ScheduledChatCompletionClient":
+        from scheduled_chat_client import ScheduledChatCompletionClient
+        return ScheduledChatCompletionClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+##############################
+# 6) Demo against the local 429 stub
+##############################
+async def main():
+    from autogen_core.models import UserMessage
+    from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+    from chat_completions_stub import ChatCompletionsStub
+    from scheduled_chat_client import ScheduledChatCompletionClient
+
+    # The stub allows 5 requests per second while our budget thinks we have
+    # 600 RPM, so the scheduler has to learn the real limit from 429 + retry-after.
+    async with ChatCompletionsStub(max_requests=5, window=1.0) as stub:
+        raw_client = AzureOpenAIChatCompletionClient(
+            model="gpt-4o-mini",
+            api_version="2024-06-01",
+            azure_endpoint=stub.endpoint,
+            api_key="stub",
+            max_retries=0,
+        )
+        scheduler = RequestScheduler(rpm=600, tpm=200000)
+        clients = {
+            priority: ScheduledChatCompletionClient(raw_client, scheduler, priority)
+            for priority in PRIORITY_NAMES
+        }
+
+        async def call(priority, i):
+            message = UserMessage(content=f"{PRIORITY_NAMES[priority]} request {i}", source="user")
+            return await clients[priority].create([message])
+
+        start = time.monotonic()
+        tasks = [call(PRIORITY_BATCH, i) for i in range(30)]
+        tasks += [call(PRIORITY_TEXT, i) for i in range(5)]
+        tasks += [call(PRIORITY_VOICE, i) for i in range(3)]
+        await asyncio.gather(*tasks)
+        print(f"Completed {len(tasks)} calls in {time.monotonic() - start:.1f}s")
+        print(f"Stub stats: {stub.stats}")
+        snapshot = scheduler.snapshot()
+        print(f"Learned rate: {snapshot['rpm']:.0f} RPM (scale {snapshot['rate_scale']:.2f}) "
+              f"after {snapshot['rate_limited']} rate-limited calls")
+        for name, stats in scheduler.snapshot()["queue_wait"].items():
+            print(f"  {name:18s} n={stats['count']:3d} "
+                  f"p50={stats['p50_wait_ms']:7.1f}ms p95={stats['p95_wait_ms']:7.1f}ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,6 +7,8 @@ import sounddevice as sd
 import websockets
 from dotenv import load_dotenv
 
+from echo_canceller import EchoCanceller
+
 class AudioProcessor:
     def __init__(self, sample_rate=24000):
         # Basic audio parameters
@@ -99,12 +101,26 @@ class ConversationSystem:
         
         self.audio_processor = AudioProcessor()
         self.streams = {'input': None, 'output': None}
+        # Echo cancellation against the playback signal (ECHO_CANCELLATION=0 to disable).
+        self.use_aec = os.getenv("ECHO_CANCELLATION", "1") != "0"
+        self.echo_canceller = None
+        self.raw_interrupt_threshold = self.audio_processor.interrupt_threshold
 
     def audio_callback(self, indata, frames, time, status):
         if status:
             print(f"Audio error: {status}")
             return
-        self.audio_processor.process_audio(indata)
+        if self.echo_canceller:
+            block = self.echo_canceller.process(indata[:, 0])
+            # With the echo removed, barge-in can use the normal VAD threshold, but
+            # only while the filter is converged (> 6 dB ERLE); before that, or right
+            # after a gap, residual echo would cancel our own response.
+            self.audio_processor.interrupt_threshold = (
+                self.audio_processor.vad_threshold if self.echo_canceller.erle_db > 6.0
+                else self.raw_interrupt_threshold)
+            self.audio_processor.process_audio(block)
+        else:
+            self.audio_processor.process_audio(indata)
 
     async def setup_audio(self):
         """Initialize audio streams"""
@@ -113,6 +129,10 @@ class ConversationSystem:
         self.streams['input'] = sd.InputStream(
             samplerate=24000, channels=1, dtype=np.int16,
             callback=self.audio_callback, blocksize=4800)
+        if self.use_aec:
+            # Bulk delay = time from stream.write() to the sound reaching the mic callback.
+            delay = self.streams['output'].latency + self.streams['input'].latency
+            self.echo_canceller = EchoCanceller(sample_rate=24000, delay_ms=1000 * delay)
             
         for stream in self.streams.values():
             stream.start()
@@ -193,6 +213,8 @@ class ConversationSystem:
                                 dtype=np.int16
                             )
                             self.streams['output'].write(audio)
+                            if self.echo_canceller:
+                                self.echo_canceller.add_reference(audio)
                             
                         except Exception as e:
                             print(f"Audio processing error: {e}")
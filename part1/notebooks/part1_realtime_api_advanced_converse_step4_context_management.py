@@ -7,6 +7,9 @@ import sounddevice as sd
 import websockets
 from dotenv import load_dotenv
 
+from session_snapshot import (RESUME_SUMMARY_ID, SessionSetupError, SessionSnapshots, inject,
+                              resume_events, simple_summarizer, take_snapshot)
+
 ##############################
 # 1) AUDIO PROCESSING (Real-Time)
 ##############################
@@ -89,7 +92,118 @@ class AutoGenOrchestrator:
             return f"I heard you say: {user_text}. How can I help further?"
 
 ##############################
-# 3) CONVERSATION SYSTEM (Real-Time API Integration)
+# 3) CONTEXT MANAGEMENT (Token-Bounded Rolling History)
+##############################
+# The server-side conversation grows with every turn, and so does the time to
+# first audio. ConversationContext mirrors the conversation items locally with
+# incremental token counts. Once the total passes the budget, older turns are
+# folded into a running summary and deleted with conversation.item.delete, so
+# per-response latency stays flat over long sessions.
+AUDIO_BYTES_PER_TOKEN = 4800   # pcm16 @ 24 kHz is 48 KB/s, roughly 10 audio tokens/s
+CHARS_PER_TOKEN = 4
+
+class ConversationContext:
+    def __init__(self, token_budget=4000, keep_recent=6, summarizer=simple_summarizer):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        # Plain or async callable (previous_summary, [(role, text), ...]) -> str.
+        self.summarizer = summarizer
+        self.items = {}            # item_id -> {"role", "tokens", "text"}, in conversation order
+        self.total_tokens = 0
+        self.summary = ""
+        self.summary_item_id = None
+        self.pending_audio_bytes = 0
+        self.compacting = False
+        self.compactions = 0
+
+    def _add_tokens(self, item_id, tokens):
+        item = self.items.get(item_id)
+        if item is not None:
+            item["tokens"] += tokens
+            self.total_tokens += tokens
+
+    def on_event(self, event):
+        """Update the local mirror from a server event; O(1) per event."""
+        kind = event.get("type")
+        if kind == "conversation.item.created":
+            item = event.get("item", {})
+            item_id = item.get("id")
+            if not item_id or item_id in self.items:
+                return
+            text = " ".join(part.get("text") or part.get("transcript") or ""
+                            for part in item.get("content") or [])
+            self.items[item_id] = {"role": item.get("role", "system"), "tokens": 0, "text": text}
+            tokens = len(text) // CHARS_PER_TOKEN
+            if item.get("role") == "user" and self.pending_audio_bytes:
+                tokens += self.pending_audio_bytes // AUDIO_BYTES_PER_TOKEN
+                self.pending_audio_bytes = 0
+            self._add_tokens(item_id, tokens)
+        elif kind in ("response.audio_transcript.delta", "response.text.delta"):
+            item_id = event.get("item_id")
+            delta = event.get("delta", "")
+            if item_id not in self.items:
+                self.items[item_id] = {"role": "assistant", "tokens": 0, "text": ""}
+            self.items[item_id]["text"] += delta
+            self._add_tokens(item_id, max(1, len(delta) // CHARS_PER_TOKEN))
+        elif kind == "response.audio.delta":
+            audio_bytes = len(event.get("delta", "")) * 3 // 4
+            self._add_tokens(event.get("item_id"), audio_bytes / AUDIO_BYTES_PER_TOKEN)
+        elif kind == "conversation.item.input_audio_transcription.completed":
+            item = self.items.get(event.get("item_id"))
+            if item is not None:
+                item["text"] = event.get("transcript", "")
+        elif kind == "conversation.item.deleted":
+            item = self.items.pop(event.get("item_id"), None)
+            if item is not None:
+                self.total_tokens -= item["tokens"]
+        elif kind == "response.done":
+            # The server reports the real context size; correct our estimate.
+            usage = (event.get("response") or {}).get("usage") or {}
+            if usage.get("input_tokens"):
+                self.total_tokens = max(0, usage["input_tokens"] + usage.get("output_tokens", 0))
+
+    def needs_compaction(self):
+        return (not self.compacting
+                and self.total_tokens > self.token_budget
+                and len(self.items) > self.keep_recent + 1)
+
+    async def compact(self, websocket):
+        """Summarize and delete the oldest turns. Run as a task, off the response path."""
+        if not self.needs_compaction():
+            return
+        self.compacting = True
+        try:
+            old_ids = [item_id for item_id in list(self.items)[:-self.keep_recent]
+                       if item_id != self.summary_item_id]
+            turns = [(self.items[i]["role"], self.items[i]["text"]) for i in old_ids]
+            summary = self.summarizer(self.summary, turns)
+            if asyncio.iscoroutine(summary):
+                summary = await summary
+            self.summary = summary
+            # Insert the new summary at the head of the conversation, then drop
+            # the turns it replaces (and the previous summary item).
+            stale = old_ids + ([self.summary_item_id] if self.summary_item_id else [])
+            self.summary_item_id = f"ctx_summary_{self.compactions:04d}"
+            await websocket.send(json.dumps({
+                "type": "conversation.item.create",
+                "previous_item_id": "root",
+                "item": {
+                    "id": self.summary_item_id,
+                    "type": "message",
+                    "role": "system",
+                    "content": [{"type": "input_text",
+                                 "text": f"Summary of the earlier conversation:\n{summary}"}],
+                },
+            }))
+            for item_id in stale:
+                await websocket.send(json.dumps({"type": "conversation.item.delete", "item_id": item_id}))
+            self.compactions += 1
+            print(f"\n[context] Compacted {len(old_ids)} items (~{int(self.total_tokens)} tokens before delete)")
+        finally:
+            self.compacting = False
+
+##############################
+# 4) CONVERSATION SYSTEM (Real-Time API Integration)
 ##############################
 class ConversationSystem:
     def __init__(self, orchestrator: AutoGenOrchestrator):
@@ -107,6 +221,27 @@ class ConversationSystem:
         self.audio_processor = AudioProcessor()
         self.streams = {'input': None, 'output': None}
         self.orchestrator = orchestrator
+        self.context = ConversationContext()
+        self.session_config = {
+            "voice": "alloy",
+            "instructions": "You are a helpful AI assistant. Keep responses brief and engaging.",
+            "modalities": ["audio", "text"],
+            "input_audio_format": "pcm16",
+            "output_audio_format": "pcm16",
+            # User transcripts feed the rolling summary.
+            "input_audio_transcription": {"model": "whisper-1"},
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": 0.3,
+                "prefix_padding_ms": 150,
+                "silence_duration_ms": 600
+            }
+        }
+        # Compact snapshots (session config, summary, recent items) so a dropped
+        # socket or a restarted process picks the conversation back up.
+        self.snapshots = SessionSnapshots(os.getenv("SESSION_SNAPSHOT_PATH", "session_snapshot.json"))
+        self.turns = 0
+        self.compaction = None
 
     def audio_callback(self, indata, frames, time, status):
         if status:
@@ -125,34 +260,41 @@ class ConversationSystem:
 
     async def setup_websocket_session(self, websocket):
         """Set up session parameters for Azure Real-Time API."""
-        session_config = {
-            "type": "session.update",
-            "session": {
-                "voice": "alloy",
-                "instructions": "You are a helpful AI assistant. Keep responses brief and engaging.",
-                "modalities": ["audio", "text"],
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.3,
-                    "prefix_padding_ms": 150,
-                    "silence_duration_ms": 600
-                }
-            }
-        }
-        await websocket.send(json.dumps(session_config))
+        await websocket.send(json.dumps({"type": "session.update", "session": self.session_config}))
         while True:
             response = json.loads(await websocket.recv())
             if response.get("type") == "session.created":
                 print("Session setup complete")
                 break
             elif response.get("type") == "error":
-                raise Exception(f"Session setup failed: {response}")
+                raise SessionSetupError(f"Session setup failed: {response}")
+
+    def build_snapshot(self):
+        items = [(item["role"], item["text"]) for item_id, item in self.context.items.items()
+                 if item_id != self.context.summary_item_id]
+        return take_snapshot(self.session_config, self.context.summary, items,
+                             self.context.keep_recent, self.turns)
+
+    async def resume(self, websocket):
+        """Rebuild the conversation from the latest snapshot: one summary item plus the recent items."""
+        snapshot = self.snapshots.latest
+        if not snapshot:
+            return
+        start = asyncio.get_running_loop().time()
+        self.context = ConversationContext(self.context.token_budget, self.context.keep_recent,
+                                           self.context.summarizer)
+        self.context.summary = snapshot["summary"]
+        self.context.summary_item_id = RESUME_SUMMARY_ID if snapshot["summary"] else None
+        self.turns = snapshot["turns"]
+        events = resume_events(snapshot)
+        await inject(websocket, events, on_event=self.context.on_event)
+        elapsed = 1000 * (asyncio.get_running_loop().time() - start)
+        print(f"Resumed after {self.turns} turns: injected {len(events)} items in {elapsed:.0f} ms")
 
     async def send_audio(self, websocket, audio_data):
         """Send captured audio to Azure for transcription and response."""
         audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        self.context.pending_audio_bytes += len(audio_data)
         await websocket.send(json.dumps({
             "type": "input_audio_buffer.append",
             "audio": audio_base64
@@ -170,6 +312,7 @@ class ConversationSystem:
         try:
             while True:
                 response = json.loads(await websocket.recv())
+                self.context.on_event(response)
                 # Accumulate text if available
                 if response.get("type") == "response.text.delta":
                     recognized_text += response.get("delta", "")
@@ -206,6 +349,7 @@ class ConversationSystem:
             # Play TTS audio from Azure until response.done is received
             while True:
                 resp = json.loads(await websocket.recv())
+                self.context.on_event(resp)
                 if resp.get("type") == "response.audio.delta":
                     audio_data = resp["delta"].strip()
                     pad = -len(audio_data) % 4
@@ -222,19 +366,46 @@ class ConversationSystem:
     async def run(self):
         """Main conversation loop: capture audio, send it, and handle responses."""
         await self.setup_audio()
+        if self.snapshots.load():
+            self.session_config = self.snapshots.latest["session"]
+            print(f"Found a session snapshot ({self.snapshots.latest['turns']} turns), resuming it.")
         print("Audio setup complete. Connecting to Real-Time...")
-        async with websockets.connect(self.url) as ws:
-            await self.setup_websocket_session(ws)
-            print("Ready for conversation.")
-            while True:
-                if self.audio_processor.should_process():
-                    audio_data = self.audio_processor.reset()
-                    await self.send_audio(ws, audio_data)
-                    await self.handle_response(ws)
-                await asyncio.sleep(0.05)
+        backoff = 1.0
+        while True:
+            live = False
+            try:
+                async with websockets.connect(self.url) as ws:
+                    await self.setup_websocket_session(ws)
+                    await self.resume(ws)
+                    live = True
+                    print("Ready for conversation.")
+                    backoff = 1.0
+                    while True:
+                        if self.audio_processor.should_process():
+                            audio_data = self.audio_processor.reset()
+                            await self.send_audio(ws, audio_data)
+                            await self.handle_response(ws)
+                            self.turns += 1
+                            if self.context.needs_compaction():
+                                self.compaction = asyncio.create_task(self.context.compact(ws))
+                            await self.snapshots.maybe_save(self.build_snapshot)
+                        await asyncio.sleep(0.05)
+            except (websockets.ConnectionClosed, OSError, SessionSetupError, asyncio.TimeoutError) as e:
+                # A compaction still running belongs to the dead socket.
+                if self.compaction is not None and not self.compaction.done():
+                    self.compaction.cancel()
+                    await asyncio.gather(self.compaction, return_exceptions=True)
+                # Snapshot what we have now, not what we had at the last interval. If
+                # setup or the resume itself failed, the context is partial: keep the
+                # previous snapshot and retry it.
+                if live:
+                    await self.snapshots.maybe_save(self.build_snapshot, force=True)
+                print(f"\nConnection lost ({e}); reconnecting in {backoff:.0f}s...")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
 
 ##############################
-# 4) Putting It All Together
+# 5) Putting It All Together
 ##############################
 async def main():
     load_dotenv()
@@ -1,59 +1,137 @@
+from startup_profile import StartupProfile, format_import_profile, import_profile
+
 import os
 import asyncio
 import base64
+import functools
 import json
 import numpy as np
-import sounddevice as sd
-import websockets
 from dotenv import load_dotenv
 
+# Heavy dependencies (autogen_agentchat/autogen_ext ~1 s, sounddevice/PortAudio)
+# are imported where they are first used, so the realtime socket and the audio
+# devices can be brought up while they load.
+from hedged_client import Endpoint, Hedger, hedged_connect
+from model_request_scheduler import PRIORITY_TEXT, PRIORITY_VOICE, RequestScheduler
+from voice_tracing import VoiceTracer
+from audio_profiling import AudioProfiler
+from audio_resampler import PolyphaseResampler
+from g711_codec import AudioTransport
+from conversation_recorder import ConversationRecorder
+from echo_canceller import EchoCanceller
+
+# The realtime API speaks 24 kHz pcm16; devices are opened at their native rate.
+PIPELINE_RATE = 24000
+
+# Comma-separated Azure OpenAI hosts. With more than one, the realtime handshake
+# and chat completions are hedged across them to cut tail latency.
+DEFAULT_HOSTS = "aoai-ep-swedencentral02.openai.azure.com"
+
+# Realtime input audio bills at roughly 10 tokens per second; a spoken reply
+# is budgeted at a few hundred tokens until response.done reports the usage.
+AUDIO_TOKENS_PER_SECOND = 10
+VOICE_RESPONSE_TOKENS = 400
+
+# Time from script start until audio, socket, session and agents are all up.
+DEFAULT_READY_BUDGET_MS = 1500
+
 ##############################
 # 1) AUTO-GEN ORCHESTRATOR
 ##############################
-from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.teams import RoundRobinGroupChat
-from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
-
-class WeatherAgent(AssistantAgent):
-    """Simplified agent that returns weather data."""
-    def handle_custom(self, user_text: str) -> str:
-        return "It’s 22°C and sunny in Istanbul."
-
-class CodeAgent(AssistantAgent):
-    """Simplified agent that returns sample Python code."""
-    def handle_custom(self, user_text: str) -> str:
-        return (
-            "def greet(name):\n"
-            "    return f'Hello, {name}!'"
-        )
+@functools.lru_cache(maxsize=None)
+def agent_classes():
+    """Define the agents on first use; importing autogen_agentchat dominates cold start."""
+    from autogen_agentchat.agents import AssistantAgent
+
+    class WeatherAgent(AssistantAgent):
+        """Simplified agent that returns weather data."""
+        def handle_custom(self, user_text: str) -> str:
+            return "It’s 22°C and sunny in Istanbul."
+
+    class CodeAgent(AssistantAgent):
+        """Simplified agent that returns sample Python code."""
+        def handle_custom(self, user_text: str) -> str:
+            return (
+                "def greet(name):\n"
+                "    return f'Hello, {name}!'"
+            )
+
+    return WeatherAgent, CodeAgent
+
+AGENT_ROLES = {
+    "WeatherAgent": "You are a weather assistant.",
+    "CodeAgent": "You are a code-generating assistant.",
+}
+
+def build_agent(role, azure_client):
+    WeatherAgent, CodeAgent = agent_classes()
+    agent_class = {"WeatherAgent": WeatherAgent, "CodeAgent": CodeAgent}[role]
+    return agent_class(name=role, model_client=azure_client, system_message=AGENT_ROLES[role])
+
+_agent_pools = {}
+
+def build_agent_pool(azure_client, max_size=8, warm=1):
+    """
+    One pool of pre-built agents per model client, shared by every
+    ConversationSystem in the process that uses that client.
+    """
+    pool = _agent_pools.get(azure_client)
+    if pool is None:
+        from agent_pool import AgentPool
+        pool = AgentPool()
+        for role in AGENT_ROLES:
+            pool.register(role, functools.partial(build_agent, role, azure_client), max_size=max_size, warm=warm)
+        # Build the warm instances now, so they exist before the first turn.
+        pool.warm_up()
+        _agent_pools[azure_client] = pool
+    return pool
 
 class AutoGenOrchestrator:
     """
     Orchestrator that routes user queries to the appropriate agent.
+    With a shared AgentPool, agents are borrowed per request instead of
+    being built for every session. With a CodeSandboxPool, CodeAgent's
+    snippet is also run and its output returned with it.
     """
-    def __init__(self, azure_client):
-        self.weather_agent = WeatherAgent(
-            name="WeatherAgent",
-            model_client=azure_client,
-            system_message="You are a weather assistant."
-        )
-        self.code_agent = CodeAgent(
-            name="CodeAgent",
-            model_client=azure_client,
-            system_message="You are a code-generating assistant."
-        )
+    def __init__(self, azure_client, tracer=None, agent_pool=None, code_pool=None):
+        self.tracer = tracer or VoiceTracer(enabled=False)
+        self.agent_pool = agent_pool
+        self.code_pool = code_pool
+        self.agents = {} if agent_pool else {role: build_agent(role, azure_client) for role in AGENT_ROLES}
 
-    async def handle_user_text(self, user_text: str) -> str:
+    def route(self, user_text: str):
+        """Role that should answer, or None if no agent fits."""
         if "weather" in user_text.lower():
-            return await self._run_agent(self.weather_agent, user_text)
+            return "WeatherAgent"
         elif "code" in user_text.lower():
-            return await self._run_agent(self.code_agent, user_text)
-        else:
-            return "Try asking for weather or code?"
+            return "CodeAgent"
+        return None
+
+    async def handle_user_text(self, user_text: str) -> str:
+        with self.tracer.span("orchestrator"):
+            role = self.route(user_text)
+            if role is None:
+                return "Try asking for weather or code?"
+            return await self._run_agent(role, user_text)
 
-    async def _run_agent(self, agent: AssistantAgent, user_text: str) -> str:
-        final_text = agent.handle_custom(user_text)
-        return final_text
+    async def close(self):
+        """Stop the sandbox workers (and remove their temp dirs); the agent pool is process-wide and stays."""
+        if self.code_pool is not None:
+            await self.code_pool.close()
+
+    async def _run_agent(self, role: str, user_text: str) -> str:
+        with self.tracer.span(f"agent:{role}"):
+            if self.agent_pool is None:
+                reply = self.agents[role].handle_custom(user_text)
+            else:
+                async with self.agent_pool.acquire(role) as agent:
+                    reply = agent.handle_custom(user_text)
+        if role == "CodeAgent" and self.code_pool is not None:
+            with self.tracer.span("code:run"):
+                result = await self.code_pool.run(reply)
+            outcome = (result.output.rstrip() or "(no output)") if result.ok else result.error
+            reply = f"{reply}\n\n# Ran in {1000 * result.seconds:.0f} ms: {outcome}"
+        return reply
 
 ##############################
 # 2) AUDIO PROCESSING (Real-Time)
@@ -127,48 +205,161 @@ class ConversationSystem:
     - Sends user audio to Azure and processes the AI's streaming response.
     - Hands off recognized text to AutoGenOrchestrator if needed.
     """
-    def __init__(self, orchestrator: AutoGenOrchestrator):
+    def __init__(self, orchestrator: AutoGenOrchestrator = None, tracer=None, startup=None, audio_backend=None):
         load_dotenv()
         self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("AZURE_OPENAI_API_KEY not found in environment")
 
-        # Hardcoded WebSocket URL as per your working example:
-        self.url = (
-            f"wss://aoai-ep-swedencentral02.openai.azure.com/openai/realtime?"
-            f"api-version=2024-10-01-preview&deployment=gpt-4o-realtime-preview&api-key={self.api_key}"
-        )
+        hosts = os.getenv("AZURE_OPENAI_HOSTS", DEFAULT_HOSTS).split(",")
+        self.endpoints = [
+            Endpoint(host.strip(), url=(
+                f"wss://{host.strip()}/openai/realtime?"
+                f"api-version=2024-10-01-preview&deployment=gpt-4o-realtime-preview&api-key={self.api_key}"
+            ))
+            for host in hosts
+        ]
+        self.hedger = Hedger(self.endpoints)
+        # Voice turns and the agents' chat calls share one RPM/TPM budget;
+        # response.create is admitted ahead of any agent work.
+        self.scheduler = build_scheduler()
+        self.turn_tokens = 0
+        self.url = self.endpoints[0].url
         print(f"DEBUG: WebSocket URL = {self.url}")
         print(f"DEBUG: API Key Loaded? {'Yes' if self.api_key else 'No'}")
 
+        # Wire format for realtime audio: pcm16 (default), g711_ulaw or g711_alaw.
+        # G.711 cuts upload/download to 8 KB/s per direction on constrained links.
+        self.transport = AudioTransport(os.getenv("REALTIME_AUDIO_FORMAT", "pcm16"), PIPELINE_RATE)
+
         self.audio_processor = AudioProcessor()
         self.streams = {'input': None, 'output': None}
         self.orchestrator = orchestrator
+        # Latency spans for the voice pipeline (VOICE_TRACING=1 to enable).
+        self.tracer = tracer or VoiceTracer.from_env()
+        # Loop-lag and callback-deadline profiling (AUDIO_PROFILING=1 to enable).
+        self.profiler = AudioProfiler.from_env(blocksize=4800, samplerate=24000)
+        if self.profiler:
+            self.audio_processor.process_audio = self.profiler.wrap_process_audio(
+                self.audio_processor.process_audio)
+        # Mic/model audio and event log for post-mortems (CONVERSATION_RECORD_DIR=<dir> to enable).
+        self.recorder = ConversationRecorder.from_env(PIPELINE_RATE)
+        # Echo cancellation against the playback signal (ECHO_CANCELLATION=0 to disable).
+        self.use_aec = os.getenv("ECHO_CANCELLATION", "1") != "0"
+        self.echo_canceller = None
+        self.startup = startup or StartupProfile()
+        # Anything with sounddevice's query_devices/InputStream/OutputStream; None = sounddevice.
+        # load_test.py plugs in simulated callers here.
+        self.audio_backend = audio_backend
 
     def audio_callback(self, indata, frames, time, status):
         if status:
             print(f"Audio input error: {status}")
-        self.audio_processor.process_audio(indata)
+        block = self.capture_resampler.process_int16(indata[:, 0])
+        if self.recorder:
+            self.recorder.record_mic(block)
+        if self.echo_canceller:
+            block = self.echo_canceller.process(block)
+        self.audio_processor.process_audio(block)
+        if self.audio_processor.speech_detected:
+            self.tracer.mark("mic_block")
 
     async def setup_audio(self):
-        import sounddevice as sd
-        self.streams['output'] = sd.OutputStream(samplerate=24000, channels=1, dtype=np.int16)
-        self.streams['input'] = sd.InputStream(samplerate=24000, channels=1, dtype=np.int16,
-                                               callback=self.audio_callback, blocksize=4800)
-        for stream in self.streams.values():
-            stream.start()
+        # PortAudio device enumeration and stream opening block; keep them off the event loop.
+        await asyncio.to_thread(self._open_audio_streams)
+
+    def _open_audio_streams(self):
+        sd = self.audio_backend
+        if sd is None:
+            with self.startup.phase("import sounddevice"):
+                import sounddevice as sd
+        with self.startup.phase("audio devices"):
+            # Use each device's own rate (override both with AUDIO_DEVICE_RATE) and resample
+            # to/from the 24 kHz pipeline, instead of forcing PortAudio/ALSA to. Input and
+            # output can be different devices with different native rates.
+            self.device_rate = int(os.getenv("AUDIO_DEVICE_RATE")
+                                   or sd.query_devices(kind='input')['default_samplerate'])
+            self.output_rate = int(os.getenv("AUDIO_DEVICE_RATE")
+                                   or sd.query_devices(kind='output')['default_samplerate'])
+            self.capture_resampler = PolyphaseResampler(self.device_rate, PIPELINE_RATE)
+            self.playback_resampler = PolyphaseResampler(PIPELINE_RATE, self.output_rate)
+            blocksize = int(4800 * self.device_rate / PIPELINE_RATE)
+            self.streams['output'] = sd.OutputStream(samplerate=self.output_rate, channels=1, dtype=np.int16)
+            callback = self.profiler.wrap_audio_callback(self.audio_callback) if self.profiler else self.audio_callback
+            self.streams['input'] = sd.InputStream(samplerate=self.device_rate, channels=1, dtype=np.int16,
+                                                   callback=callback, blocksize=blocksize)
+            if self.use_aec:
+                # Bulk delay = time from stream.write() to the sound reaching the mic callback.
+                delay = self.streams['output'].latency + self.streams['input'].latency
+                self.echo_canceller = EchoCanceller(sample_rate=PIPELINE_RATE, delay_ms=1000 * delay)
+            for stream in self.streams.values():
+                stream.start()
+
+    async def setup_session(self, websocket):
+        """
+        Switch the session to the configured wire format (pcm16 is the server
+        default) and wait until the server has confirmed the session.
+        """
+        ready_event = "session.created"
+        if self.transport.format != "pcm16":
+            payload = {"type": "session.update", "session": self.transport.session_formats()}
+            if self.recorder:
+                self.recorder.record_event(payload, "out")
+            # Sent without waiting for session.created; the server applies it in order.
+            await websocket.send(json.dumps(payload))
+            ready_event = "session.updated"
+        while True:
+            data = json.loads(await websocket.recv())
+            if self.recorder:
+                self.recorder.record_event(data)
+            if data["type"] == "error":
+                raise RuntimeError(f"Session setup failed: {data}")
+            if data["type"] == ready_event:
+                return
+
+    async def bring_up(self, build_orchestrator=None):
+        """
+        Open the audio devices, the realtime socket (handshake + session) and,
+        if given, build the agents concurrently. Returns (endpoint, websocket).
+        """
+        async def open_socket():
+            with self.startup.phase("realtime handshake"):
+                endpoint, ws = await hedged_connect(self.hedger)
+            with self.startup.phase("session ready"):
+                await self.setup_session(ws)
+            return endpoint, ws
+
+        async def build_agents():
+            with self.startup.phase("agents (import + build)"):
+                self.orchestrator = await asyncio.to_thread(build_orchestrator)
+
+        tasks = [asyncio.ensure_future(open_socket()), asyncio.ensure_future(self.setup_audio())]
+        if build_orchestrator is not None:
+            tasks.append(asyncio.ensure_future(build_agents()))
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            if tasks[0].done() and not tasks[0].cancelled() and tasks[0].exception() is None:
+                await tasks[0].result()[1].close()
+            raise
+        self.startup.mark_ready()
+        return results[0]
 
     async def send_audio_to_azure(self, websocket, audio_data: bytes):
-        audio_b64 = base64.b64encode(audio_data).decode('utf-8')
-        await websocket.send(json.dumps({
-            "type": "input_audio_buffer.append",
-            "audio": audio_b64
-        }))
-        await websocket.send(json.dumps({"type": "input_audio_buffer.commit"}))
-        await websocket.send(json.dumps({
-            "type": "response.create",
-            "response": {"modalities": ["audio", "text"]}
-        }))
+        audio_b64 = base64.b64encode(self.transport.encode(audio_data)).decode('utf-8')
+        await self.send_event(websocket, {"type": "input_audio_buffer.append", "audio": audio_b64})
+        await self.send_event(websocket, {"type": "input_audio_buffer.commit"})
+        seconds = len(audio_data) / (2 * PIPELINE_RATE)
+        self.turn_tokens = int(seconds * AUDIO_TOKENS_PER_SECOND) + VOICE_RESPONSE_TOKENS
+        async with self.scheduler.slot(self.turn_tokens, PRIORITY_VOICE):
+            await self.send_event(websocket, {"type": "response.create", "response": {"modalities": ["audio", "text"]}})
+
+    async def send_event(self, websocket, payload):
+        if self.recorder:
+            self.recorder.record_event(payload, "out")
+        await websocket.send(json.dumps(payload))
 
     async def handle_response(self, websocket):
         """Continuously receive and process the AI's audio response."""
@@ -177,7 +368,10 @@ class ConversationSystem:
             while True:
                 response = await websocket.recv()
                 data = json.loads(response)
+                if self.recorder and data["type"] != "response.audio.delta":
+                    self.recorder.record_event(data)
                 if data["type"] == "response.audio.delta":
+                    self.tracer.mark("first_audio_delta")
                     if "delta" in data:
                         try:
                             audio_data = data["delta"].replace(" ", "").replace("\n", "")
@@ -185,46 +379,134 @@ class ConversationSystem:
                             if padding:
                                 audio_data += "=" * padding
                             audio_bytes = base64.b64decode(audio_data)
-                            audio_chunk = np.frombuffer(audio_bytes, dtype=np.int16)
-                            self.streams['output'].write(audio_chunk)
+                            audio_chunk = self.transport.decode(audio_bytes)
+                            if self.recorder:
+                                self.recorder.record_model_audio(audio_chunk, data)
+                            self.streams['output'].write(self.playback_resampler.process_int16(audio_chunk))
+                            if self.echo_canceller:
+                                self.echo_canceller.add_reference(audio_chunk)
+                            self.tracer.mark("first_sample_played", offset=self.streams['output'].latency)
                             print(".", end="", flush=True)
                         except Exception as e:
                             print(f"Error processing audio: {e}")
                 elif data["type"] == "response.done":
+                    self.tracer.mark("response_done")
+                    usage = (data.get("response") or {}).get("usage") or {}
+                    self.scheduler.settle(self.turn_tokens, usage.get("total_tokens"))
                     break
         finally:
             self.audio_processor.is_speaking = False
+            self.tracer.end_turn()
 
-    async def run(self):
-        """Main conversation loop: set up audio, connect to Azure Real-Time, send audio, and process responses."""
-        await self.setup_audio()
-        print("Audio setup complete. Connecting to Real-Time...")
-        async with websockets.connect(self.url) as ws:
-            print("Connected to Azure Real-Time API.")
+    async def run(self, build_orchestrator=None, exit_when_ready=False):
+        """Main conversation loop: bring up audio, Azure Real-Time and agents, send audio, and process responses."""
+        if self.profiler:
+            self.profiler.start()
+        if self.recorder:
+            self.recorder.start()
+            print(f"Recording conversation to {self.recorder.session_dir}")
+        print("Opening audio devices and connecting to Real-Time...")
+        endpoint, ws = await self.bring_up(build_orchestrator)
+        print(f"Connected to Azure Real-Time API ({endpoint.name}). {self.startup.summary()}")
+        if exit_when_ready:
+            await ws.close()
+            for stream in self.streams.values():
+                if stream is not None:
+                    stream.stop()
+            if self.orchestrator is not None:
+                await self.orchestrator.close()
+            return
+        try:
             while True:
                 if self.audio_processor.should_process():
+                    self.tracer.mark("vad_decision")
                     audio_data = self.audio_processor.reset()
                     await self.send_audio_to_azure(ws, audio_data)
+                    self.tracer.mark("upload_done")
                     # Process and play the AI's response
                     await self.handle_response(ws)
                 await asyncio.sleep(0.05)
+        finally:
+            await ws.close()
+            if self.orchestrator is not None:
+                await self.orchestrator.close()
+            if self.tracer.enabled:
+                print(self.tracer.report())
+            if self.profiler:
+                self.profiler.stop()
+                print(self.profiler.report())
+            if self.recorder:
+                self.recorder.stop()
 
 ##############################
 # 4) Putting It All Together
 ##############################
-async def main():
+@functools.lru_cache(maxsize=None)
+def build_scheduler():
+    """The process-wide request scheduler for the deployment's RPM/TPM budget (MODEL_RPM, MODEL_TPM)."""
+    return RequestScheduler(rpm=int(os.getenv("MODEL_RPM", "600")), tpm=int(os.getenv("MODEL_TPM", "200000")))
+
+@functools.lru_cache(maxsize=None)
+def build_chat_client(hosts, api_key):
+    """
+    Chat client over the given deployments (hedged when there are several),
+    queued behind the shared scheduler at text priority so agent calls never
+    hold up a voice turn. Cached, so every session in the process shares one
+    client and with it one agent pool.
+    """
+    from scheduled_chat_client import ScheduledChatCompletionClient
+    from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+    clients = [
+        AzureOpenAIChatCompletionClient(
+            model="gpt-4o-mini",
+            api_version="2024-06-01",
+            azure_endpoint=f"https://{host}",
+            api_key=api_key
+        )
+        for host in hosts
+    ]
+    if len(clients) > 1:
+        from hedged_chat_client import HedgedChatCompletionClient
+        client = HedgedChatCompletionClient(
+            [Endpoint(host, client=client) for host, client in zip(hosts, clients)]
+        )
+    else:
+        client = clients[0]
+    return ScheduledChatCompletionClient(client, build_scheduler(), PRIORITY_TEXT)
+
+def build_orchestrator(tracer=None):
+    """Chat clients + agents (from the process-wide pool); runs in a worker thread during bring-up."""
+    hosts = tuple(host.strip() for host in os.getenv("AZURE_OPENAI_HOSTS", DEFAULT_HOSTS).split(","))
+    azure_client = build_chat_client(hosts, os.getenv("AZURE_OPENAI_API_KEY"))
+    # Pre-forked interpreters for CodeAgent's snippets; forked while the socket comes up.
+    from code_sandbox import CodeSandboxPool
+    code_pool = CodeSandboxPool(size=int(os.getenv("CODE_POOL_SIZE", "2"))).start()
+    agent_pool = build_agent_pool(azure_client, max_size=int(os.getenv("AGENT_POOL_SIZE", "8")))
+    return AutoGenOrchestrator(azure_client, tracer, agent_pool=agent_pool, code_pool=code_pool)
+
+HEAVY_MODULES = ("autogen_agentchat.agents", "autogen_ext.models.openai", "sounddevice", "websockets", "numpy")
+
+async def main(import_profile_report=False, budget_ms=DEFAULT_READY_BUDGET_MS):
     load_dotenv()
-    azure_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-    azure_client = AzureOpenAIChatCompletionClient(
-        model="gpt-4o-mini",
-        api_version="2024-06-01",
-        azure_endpoint="https://aoai-ep-swedencentral02.openai.azure.com",
-        api_key=azure_api_key
-    )
-    orchestrator = AutoGenOrchestrator(azure_client)
-    system = ConversationSystem(orchestrator)
-    await system.run()
+    tracer = VoiceTracer.from_env()
+    startup = StartupProfile(budget_ms)
+    system = ConversationSystem(tracer=tracer, startup=startup)
+    await system.run(functools.partial(build_orchestrator, tracer), exit_when_ready=import_profile_report)
+    if import_profile_report:
+        print(startup.report())
+        print("\nCold import cost (fresh interpreter):")
+        print(format_import_profile(import_profile(HEAVY_MODULES)))
+        if not startup.within_budget:
+            raise SystemExit(1)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-profile", action="store_true",
+                        help="bring everything up, print the startup timeline and import costs, then exit "
+                             "(exit code 1 if over budget)")
+    parser.add_argument("--ready-budget-ms", type=float,
+                        default=float(os.getenv("READY_BUDGET_MS", DEFAULT_READY_BUDGET_MS)))
+    args = parser.parse_args()
     print("Starting real-time conversation system...")
-    asyncio.run(main())
+    asyncio.run(main(args.import_profile, args.ready_budget_ms))
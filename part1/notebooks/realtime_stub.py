@@ -0,0 +1,231 @@
+import asyncio
+import base64
+import json
+import random
+import time
+
+import numpy as np
+import websockets
+
+from g711_codec import WIRE_RATES, g711_encode
+
+##############################
+# LOCAL REALTIME API STUB
+##############################
+# Speaks a small subset of the Azure OpenAI Real-Time WebSocket protocol:
+# session.update, input_audio_buffer.append/commit, conversation.item.create/delete,
+# response.create/cancel. Replies are a synthetic tone in the session's
+# output_audio_format (24 kHz pcm16, or 8 kHz g711_ulaw/g711_alaw), so the
+# conversation scripts can be exercised offline. Delays can be injected into
+# the handshake and before the first audio delta to emulate a slow region.
+class RealtimeStub:
+    def __init__(self, host="127.0.0.1", port=0, handshake_delay=0.0,
+                 response_delay=0.0, reply_seconds=1.0, reply_text="Hello from the stub.",
+                 sample_rate=24000, chunk_ms=100, drop_rate=0.0, pace=0.0):
+        self.host = host
+        self.port = port
+        # Either a number of seconds or a zero-argument callable returning one.
+        self.handshake_delay = handshake_delay
+        self.response_delay = response_delay
+        self.reply_seconds = reply_seconds
+        self.reply_text = reply_text
+        self.sample_rate = sample_rate
+        self.chunk_ms = chunk_ms
+        # Probability that a response drops the connection halfway through.
+        self.drop_rate = drop_rate
+        # Send reply audio at `pace` x real time like the live service (0 = as fast as possible).
+        self.pace = pace
+        self.server = None
+        self.stats = {"connections": 0, "responses": 0, "cancelled": 0,
+                      "audio_bytes_in": 0, "audio_bytes_out": 0, "dropped": 0}
+        self._reply_chunks = {}
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/openai/realtime"
+
+    async def start(self):
+        self.server = await websockets.serve(
+            self._handle, self.host, self.port,
+            process_request=self._process_request, max_size=None,
+        )
+        self.port = next(iter(self.server.sockets)).getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @staticmethod
+    def _value(setting):
+        return setting() if callable(setting) else setting
+
+    async def _process_request(self, *args):
+        # Signature differs between websockets releases; we only need the delay.
+        await asyncio.sleep(self._value(self.handshake_delay))
+        return None
+
+    def reply_chunks(self, audio_format="pcm16"):
+        """Base64 deltas for the synthetic reply in `audio_format`, built once per format and reused."""
+        if audio_format not in self._reply_chunks:
+            rate = self.sample_rate if audio_format == "pcm16" else WIRE_RATES[audio_format]
+            chunk_samples = int(rate * self.chunk_ms / 1000)
+            t = np.arange(int(self.reply_seconds * rate)) / rate
+            tone = (0.3 * 32767 * np.sin(2 * np.pi * 440.0 * t)).astype(np.int16)
+            self._reply_chunks[audio_format] = [
+                base64.b64encode(tone[i:i + chunk_samples].tobytes() if audio_format == "pcm16"
+                                 else g711_encode(tone[i:i + chunk_samples], audio_format)).decode("ascii")
+                for i in range(0, len(tone), chunk_samples)
+            ]
+        return self._reply_chunks[audio_format]
+
+    async def _handle(self, websocket, path=None):
+        self.stats["connections"] += 1
+        session = {"id": f"sess_stub_{self.stats['connections']}", "object": "realtime.session"}
+        state = {"items": [], "buffer_bytes": 0, "response": None, "next_id": 0}
+        await self._send(websocket, {"type": "session.created", "session": session})
+        try:
+            async for raw in websocket:
+                event = json.loads(raw)
+                await self._dispatch(websocket, event, session, state)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if state["response"] and not state["response"].done():
+                state["response"].cancel()
+
+    def _new_id(self, state, prefix):
+        state["next_id"] += 1
+        return f"{prefix}_{state['next_id']:06d}"
+
+    async def _dispatch(self, websocket, event, session, state):
+        kind = event.get("type")
+        if kind == "session.update":
+            session.update(event.get("session", {}))
+            await self._send(websocket, {"type": "session.updated", "session": session})
+        elif kind == "input_audio_buffer.append":
+            state["buffer_bytes"] += len(event.get("audio", "")) * 3 // 4
+            self.stats["audio_bytes_in"] += len(event.get("audio", "")) * 3 // 4
+        elif kind == "input_audio_buffer.commit":
+            item_id = self._new_id(state, "item")
+            state["items"].append(item_id)
+            buffered, state["buffer_bytes"] = state["buffer_bytes"], 0
+            await self._send(websocket, {"type": "input_audio_buffer.committed", "item_id": item_id})
+            await self._send(websocket, {"type": "conversation.item.created",
+                                         "item": {"id": item_id, "type": "message", "role": "user"}})
+            if session.get("input_audio_transcription"):
+                rate = self.sample_rate if session.get("input_audio_format", "pcm16") == "pcm16" else 8000
+                width = 2 if session.get("input_audio_format", "pcm16") == "pcm16" else 1
+                await self._send(websocket, {
+                    "type": "conversation.item.input_audio_transcription.completed",
+                    "item_id": item_id, "content_index": 0,
+                    "transcript": f"[{buffered / width / rate:.1f}s of caller audio]"})
+        elif kind == "conversation.item.create":
+            item = dict(event.get("item", {}))
+            item.setdefault("id", self._new_id(state, "item"))
+            state["items"].append(item["id"])
+            await self._send(websocket, {"type": "conversation.item.created", "item": item})
+        elif kind == "conversation.item.delete":
+            item_id = event.get("item_id")
+            if item_id in state["items"]:
+                state["items"].remove(item_id)
+                await self._send(websocket, {"type": "conversation.item.deleted", "item_id": item_id})
+            else:
+                await self._send(websocket, {"type": "error", "error": {
+                    "type": "invalid_request_error", "message": f"Item {item_id} not found"}})
+        elif kind == "response.create":
+            if state["response"] and not state["response"].done():
+                await self._send(websocket, {"type": "error", "error": {
+                    "type": "invalid_request_error",
+                    "message": "Conversation already has an active response"}})
+                return
+            modalities = event.get("response", {}).get("modalities") or session.get("modalities", ["audio", "text"])
+            state["response"] = asyncio.ensure_future(
+                self._respond(websocket, state, session.get("output_audio_format", "pcm16"), modalities))
+        elif kind == "response.cancel":
+            if state["response"] and not state["response"].done():
+                state["response"].cancel()
+                self.stats["cancelled"] += 1
+
+    async def _respond(self, websocket, state, audio_format="pcm16", modalities=("audio", "text")):
+        response_id = self._new_id(state, "resp")
+        item_id = self._new_id(state, "item")
+        status = "completed"
+        await self._send(websocket, {"type": "response.created",
+                                     "response": {"id": response_id, "status": "in_progress"}})
+        try:
+            await asyncio.sleep(self._value(self.response_delay))
+            text_event = "response.audio_transcript.delta" if "audio" in modalities else "response.text.delta"
+            for word in self.reply_text.split(" "):
+                await self._send(websocket, {"type": text_event,
+                                             "response_id": response_id, "item_id": item_id,
+                                             "delta": word + " "})
+            if "audio" in modalities:
+                chunks = self.reply_chunks(audio_format)
+                drop_at = len(chunks) // 2 if random.random() < self.drop_rate else None
+                started = time.perf_counter()
+                for index, chunk in enumerate(chunks):
+                    if index == drop_at:
+                        self.stats["dropped"] += 1
+                        await websocket.close(code=1011, reason="stub: injected failure")
+                        return
+                    await self._send(websocket, {"type": "response.audio.delta",
+                                                 "response_id": response_id, "item_id": item_id,
+                                                 "delta": chunk})
+                    self.stats["audio_bytes_out"] += len(chunk) * 3 // 4
+                    if self.pace:
+                        due = started + (index + 1) * self.chunk_ms / 1000 / self.pace
+                        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                    else:
+                        # Yield so cancels and other connections get a turn.
+                        await asyncio.sleep(0)
+                await self._send(websocket, {"type": "response.audio.done",
+                                             "response_id": response_id, "item_id": item_id})
+            elif random.random() < self.drop_rate:
+                self.stats["dropped"] += 1
+                await websocket.close(code=1011, reason="stub: injected failure")
+                return
+        except asyncio.CancelledError:
+            status = "cancelled"
+        state["items"].append(item_id)
+        self.stats["responses"] += 1
+        await self._send(websocket, {
+            "type": "response.done",
+            "response": {
+                "id": response_id,
+                "status": status,
+                "output": [{"id": item_id, "type": "message", "role": "assistant"}],
+                "usage": {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0},
+            },
+        })
+
+    async def _send(self, websocket, event):
+        event.setdefault("event_id", f"evt_{time.monotonic_ns()}")
+        try:
+            await websocket.send(json.dumps(event))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+async def main(args):
+    async with RealtimeStub(port=args.port, response_delay=args.response_delay,
+                            reply_seconds=args.reply_seconds, drop_rate=args.drop_rate, pace=args.pace) as stub:
+        print(f"Realtime stub listening on {stub.url}", flush=True)
+        await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local Real-Time API stub")
+    parser.add_argument("--port", type=int, default=8766, help="0 picks a free port")
+    parser.add_argument("--response-delay", type=float, default=0.0)
+    parser.add_argument("--reply-seconds", type=float, default=1.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--pace", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
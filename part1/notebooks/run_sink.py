@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import io
+import json
+import queue
+import threading
+import time
+import uuid
+
+from autogen_agentchat.base import Response, TaskResult
+
+##############################
+# 1) RECORDS
+##############################
+COLUMNS = ("run", "seq", "t_ms", "dt_ms", "source", "type",
+           "prompt_tokens", "completion_tokens", "text")
+
+
+def _text(message):
+    to_text = getattr(message, "to_text", None)
+    if to_text is not None:
+        return to_text()
+    content = getattr(message, "content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+class ColumnBuffer:
+    """In-memory columnar store: one list per column, cheap to append and to hand to pandas."""
+    def __init__(self, columns=COLUMNS):
+        self.columns = {name: [] for name in columns}
+
+    def append(self, record):
+        for name, column in self.columns.items():
+            column.append(record.get(name))
+
+    def __len__(self):
+        return len(self.columns["seq"])
+
+    def rows(self):
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns)
+
+##############################
+# 2) HEADLESS SINK
+##############################
+class RunSink:
+    """
+    Non-interactive replacement for `await Console(team.run_stream(...))`:
+        sink = RunSink("runs.jsonl")
+        result = await sink.consume(team.run_stream(task=...))
+        ...
+        await sink.aclose()
+    Each streamed message becomes a flat record (run id, sequence, ms since
+    the run started and since the previous message, source, message type,
+    token usage, text). Records are serialised as they arrive, batched, and
+    written by one background thread, so a single sink can be shared by many
+    concurrently running teams without the event loop ever touching the file.
+    With columns=True records are also kept in a ColumnBuffer (sink.columns).
+
+    Streaming token chunks (ModelClientStreamingChunkEvent) are counted but not
+    recorded unless chunks=True; the full message that follows carries the text.
+    """
+    def __init__(self, path=None, columns=False, batch_size=512, flush_interval=1.0,
+                 include_text=True, chunks=False):
+        self.path = path
+        self.columns = ColumnBuffer() if columns else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.include_text = include_text
+        self.chunks = chunks
+        self.batch = []
+        self.last_flush = time.monotonic()
+        self.flush_timer = None
+        self.stats = {"runs": 0, "messages": 0, "chunks": 0, "bytes": 0, "batches": 0}
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        if path is not None:
+            self.thread = threading.Thread(target=self._writer, name="run-sink-writer", daemon=True)
+            self.thread.start()
+
+    async def consume(self, stream, run_id=None):
+        """Drain a run_stream / on_messages_stream; returns the final TaskResult or Response."""
+        run_id = run_id or uuid.uuid4().hex[:12]
+        self.stats["runs"] += 1
+        start = previous = time.perf_counter()
+        seq = 0
+        last = None
+        async for message in stream:
+            now = time.perf_counter()
+            if isinstance(message, TaskResult):
+                last = message
+                fields = self._summary(message.messages, message.stop_reason)
+            elif isinstance(message, Response):
+                last = message
+                fields = self._fields(message.chat_message)
+            elif type(message).__name__ == "ModelClientStreamingChunkEvent" and not self.chunks:
+                self.stats["chunks"] += 1
+                continue
+            else:
+                fields = self._fields(message)
+            record = {"run": run_id, "seq": seq, "t_ms": round(1000 * (now - start), 3),
+                      "dt_ms": round(1000 * (now - previous), 3), **fields}
+            seq += 1
+            previous = now
+            self._emit(record)
+        return last
+
+    def _fields(self, message):
+        usage = getattr(message, "models_usage", None)
+        return {
+            "source": getattr(message, "source", None),
+            "type": type(message).__name__,
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+            "text": _text(message) if self.include_text else None,
+        }
+
+    def _summary(self, messages, stop_reason):
+        usages = [m.models_usage for m in messages if getattr(m, "models_usage", None)]
+        return {
+            "source": None,
+            "type": "TaskResult",
+            "prompt_tokens": sum(u.prompt_tokens for u in usages),
+            "completion_tokens": sum(u.completion_tokens for u in usages),
+            "text": stop_reason,
+            "messages": len(messages),
+        }
+
+    def _emit(self, record):
+        self.stats["messages"] += 1
+        if self.columns is not None:
+            self.columns.append(record)
+        if self.thread is None:
+            return
+        self.batch.append(json.dumps(record, ensure_ascii=False, default=str))
+        if len(self.batch) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+        elif self.flush_timer is None:
+            # A team that goes quiet would otherwise keep its last batch in
+            # memory until the next message or close().
+            self.flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if self.batch:
+            data = "\n".join(self.batch) + "\n"
+            self.batch = []
+            self.stats["batches"] += 1
+            self.queue.put(data)
+        self.last_flush = time.monotonic()
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8", buffering=1 << 20) as f:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    break
+                f.write(data)
+                self.stats["bytes"] += len(data)
+                if self.queue.empty():
+                    f.flush()
+
+    def close(self):
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    async def aclose(self):
+        self.flush()  # on the loop, so the flush timer is cancelled from its own thread
+        await asyncio.to_thread(self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+##############################
+# 3) BENCHMARK vs Console
+##############################
+async def _synthetic_stream(count, usage):
+    from autogen_agentchat.messages import TextMessage
+    messages = [
+        TextMessage(content=f"Message {i}: the quarterly ledger reconciles against the bank statement.",
+                    source=("Analyst", "Reviewer")[i % 2], models_usage=usage)
+        for i in range(count)
+    ]
+    for message in messages:
+        yield message
+    yield TaskResult(messages=messages, stop_reason=f"Maximum number of messages {count} reached")
+
+
+async def _teams(consume, teams, turns):
+    """`teams` RoundRobin teams run concurrently on replay clients, each stream handed to `consume`."""
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.teams import RoundRobinGroupChat
+    from autogen_ext.models.replay import ReplayChatCompletionClient
+
+    def build():
+        replies = [f"Turn {i}: checking the next line item in the statement." for i in range(turns)]
+        client = ReplayChatCompletionClient(replies)
+        agents = [AssistantAgent(name, model_client=client, system_message="You audit statements.")
+                  for name in ("Analyst", "Reviewer")]
+        return RoundRobinGroupChat(agents, termination_condition=MaxMessageTermination(turns))
+
+    built = [build() for _ in range(teams)]
+    start = time.perf_counter()
+    await asyncio.gather(*(consume(team.run_stream(task="Reconcile the statement.")) for team in built))
+    return time.perf_counter() - start
+
+
+async def benchmark(messages=20000, teams=200, turns=20, path="run_sink_benchmark.jsonl"):
+    import os
+    import sys
+    from autogen_agentchat.ui import Console
+    from autogen_core.models import RequestUsage
+
+    usage = RequestUsage(prompt_tokens=120, completion_tokens=30)
+    tty = sys.stdout.isatty()
+    # Console goes to a throwaway buffer: no terminal cost at all, so this is its best case.
+    sinks = [
+        ("Console (to StringIO)", lambda: None),
+        ("RunSink in-memory columns", lambda: RunSink(columns=True)),
+        ("RunSink JSONL", lambda: RunSink(path)),
+    ]
+    print(f"Synthetic stream, {messages} messages:")
+    for label, make in sinks:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        sink = make()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if sink is None:
+                await Console(_synthetic_stream(messages, usage))
+            else:
+                await sink.consume(_synthetic_stream(messages, usage))
+                await sink.aclose()
+            elapsed = time.perf_counter() - start
+        print(f"  {label:28s} {messages / elapsed:10,.0f} msg/s")
+
+    print(f"{teams} concurrent RoundRobin teams x {turns} messages (replay client):")
+    for label, make in sinks:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        sink = make()
+        with contextlib.redirect_stdout(io.StringIO()):
+            consume = Console if sink is None else sink.consume
+            elapsed = await _teams(consume, teams, turns)
+            if sink is not None:
+                await sink.aclose()
+        total = teams * (turns + 1)  # `turns` messages (task included) + the TaskResult
+        print(f"  {label:28s} {total / elapsed:10,.0f} msg/s  ({elapsed:.2f}s)")
+    with open(path) as f:
+        print("sample record:", f.readline().strip())
+    os.remove(path)
+    if not tty:
+        print("(stdout is not a terminal; Console's real cost is higher when it renders to one)")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
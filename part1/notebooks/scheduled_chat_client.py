@@ -0,0 +1,55 @@
+from model_client_wrapper import DelegatingChatCompletionClient, estimate_tokens
+from model_request_scheduler import PRIORITY_TEXT, RequestScheduler, retry_after_seconds
+
+##############################
+# SCHEDULED CHAT COMPLETIONS
+##############################
+# Kept apart from model_request_scheduler so the realtime voice path can take
+# scheduler slots without paying for importing autogen_core.
+class ScheduledChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Drop-in replacement for an AzureOpenAIChatCompletionClient that routes every
+    call through a shared RequestScheduler at a fixed priority class.
+    """
+    def __init__(self, inner, scheduler: RequestScheduler, priority=PRIORITY_TEXT, max_completion_tokens=256):
+        super().__init__(inner)
+        self.scheduler = scheduler
+        self.priority = priority
+        self.max_completion_tokens = max_completion_tokens
+
+    async def create(self, messages, **kwargs):
+        est = estimate_tokens(messages, self.max_completion_tokens)
+        result = await self.scheduler.run(
+            lambda: self.inner.create(messages, **kwargs), est, self.priority
+        )
+        self.scheduler.settle(est, result.usage.prompt_tokens + result.usage.completion_tokens)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        est = estimate_tokens(messages, self.max_completion_tokens)
+        waited = 0.0
+        yielded = False
+        try:
+            for attempt in range(10):
+                waited += await self.scheduler.acquire(est, self.priority, record=False)
+                yielded = False
+                try:
+                    async for chunk in self.inner.create_stream(messages, **kwargs):
+                        if not yielded:
+                            yielded = True
+                            # Record once the stream is accepted, not after the caller drains it.
+                            self.scheduler.metrics[self.priority].record(waited)
+                        if not isinstance(chunk, str):
+                            self.scheduler.settle(est, chunk.usage.prompt_tokens + chunk.usage.completion_tokens)
+                        yield chunk
+                    self.scheduler.succeeded()
+                    return
+                except Exception as exc:
+                    retry_after = retry_after_seconds(exc)
+                    # Once output has reached the caller we can't transparently retry.
+                    if retry_after is None or yielded or attempt == 9:
+                        raise
+                    self.scheduler.pause(retry_after)
+        finally:
+            if not yielded:
+                self.scheduler.metrics[self.priority].record(waited)
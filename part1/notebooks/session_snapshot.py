@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import time
+
+import websockets
+
+SNAPSHOT_VERSION = 1
+CHARS_PER_TOKEN = 4
+
+##############################
+# 1) SNAPSHOTS: session config + summary + recent items
+##############################
+def simple_summarizer(previous_summary, turns, max_chars=2000):
+    """
+    Default extractive summary: keep the first sentence of each turn, newest
+    last. Past `max_chars` the oldest whole lines are dropped, so the summary
+    never starts mid-line.
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for role, text in turns:
+        text = text.strip()
+        if text:
+            lines.append(f"{role}: {text.split('. ')[0][:160]}")
+    size = sum(len(line) + 1 for line in lines) - 1
+    drop = 0
+    while size > max_chars and drop < len(lines) - 1:
+        size -= len(lines[drop]) + 1
+        drop += 1
+    return "\n".join(lines[drop:])
+
+
+def take_snapshot(session, summary, items, keep_recent=6, turns=0):
+    """
+    Compact, JSON-able state of a conversation. `items` are (role, text) in
+    conversation order. The last `keep_recent` are kept verbatim, and anything
+    older is folded into the summary with the (cheap, synchronous) extractive
+    summarizer. That keeps only the first sentence of each older turn, and
+    only as many of the newest ones as fit in its size bound, so a long
+    conversation resumes with its early detail gone.
+    """
+    items = [(role, text) for role, text in items if text and text.strip()]
+    split = len(items) - keep_recent if keep_recent else len(items)
+    older, recent = items[:max(split, 0)], items[max(split, 0):]
+    return {
+        "version": SNAPSHOT_VERSION,
+        "taken_at": time.time(),
+        "turns": turns,
+        "session": session,
+        "summary": simple_summarizer(summary, older) if older else summary,
+        "recent": [{"role": role, "text": text} for role, text in recent],
+    }
+
+
+def save_snapshot(path, snapshot):
+    """Atomic write: a crash mid-write leaves the previous snapshot in place."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path, max_age=3600.0):
+    """The snapshot at `path`, or None if missing, unreadable, from another version or older than max_age seconds."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    if max_age is not None and time.time() - snapshot.get("taken_at", 0) > max_age:
+        return None
+    return snapshot
+
+
+class SessionSnapshots:
+    """
+    Periodic snapshots of one conversation:
+
+        snapshots = SessionSnapshots("session_snapshot.json", interval=10.0)
+        await snapshots.maybe_save(lambda: take_snapshot(...))    # after each turn
+        snapshot = snapshots.latest or snapshots.load()           # on reconnect / restart
+
+    The snapshot is built at most every `interval` seconds and written from a
+    worker thread. `latest` always holds the newest one in memory, which is
+    what a reconnect within the same process resumes from.
+    """
+    def __init__(self, path, interval=10.0, max_age=3600.0):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.latest = None
+        self.last_saved = 0.0
+        self.stats = {"saved": 0, "bytes": 0, "build_ms": 0.0, "write_ms": 0.0}
+
+    def load(self):
+        self.latest = load_snapshot(self.path, self.max_age)
+        return self.latest
+
+    async def maybe_save(self, build, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_saved < self.interval:
+            return False
+        self.last_saved = now
+        start = time.perf_counter()
+        self.latest = build()
+        built = time.perf_counter()
+        await asyncio.to_thread(save_snapshot, self.path, self.latest)
+        self.stats["saved"] += 1
+        self.stats["build_ms"] = 1000 * (built - start)
+        self.stats["write_ms"] = 1000 * (time.perf_counter() - built)
+        self.stats["bytes"] = os.path.getsize(self.path)
+        return True
+
+##############################
+# 2) RESUME: inject the minimal items into a fresh session
+##############################
+RESUME_SUMMARY_ID = "resume_summary"
+
+
+class SessionSetupError(Exception):
+    pass
+
+
+def _item_event(item_id, role, text):
+    return {
+        "type": "conversation.item.create",
+        "item": {
+            "id": item_id,
+            "type": "message",
+            "role": role,
+            "content": [{"type": "text" if role == "assistant" else "input_text", "text": text}],
+        },
+    }
+
+
+def resume_events(snapshot):
+    """conversation.item.create events that rebuild the context: one summary item plus the recent items."""
+    events = []
+    if snapshot.get("summary"):
+        events.append(_item_event(RESUME_SUMMARY_ID, "system",
+                                  f"Summary of the earlier conversation:\n{snapshot['summary']}"))
+    for i, item in enumerate(snapshot.get("recent", ())):
+        events.append(_item_event(f"resume_{i:04d}", item["role"], item["text"]))
+    return events
+
+
+def replay_events(transcript):
+    """The baseline: every turn of the conversation re-created item by item."""
+    return [_item_event(f"replay_{i:06d}", role, text) for i, (role, text) in enumerate(transcript)]
+
+
+async def inject(websocket, events, on_event=None, timeout=30.0):
+    """
+    Send the item events back to back and wait until the server has created
+    the last one. Every server event received meanwhile is passed to
+    on_event, so a ConversationContext mirror picks the items up as usual.
+    Returns the number of bytes sent.
+    """
+    if not events:
+        return 0
+    sent = 0
+    for event in events:
+        payload = json.dumps(event)
+        sent += len(payload)
+        await websocket.send(payload)
+    last_id = events[-1]["item"]["id"]
+
+    async def wait_for_last():
+        while True:
+            data = json.loads(await websocket.recv())
+            if on_event:
+                on_event(data)
+            if data.get("type") == "error":
+                raise SessionSetupError(f"Resume failed: {data}")
+            if data.get("type") == "conversation.item.created" and data.get("item", {}).get("id") == last_id:
+                return
+
+    await asyncio.wait_for(wait_for_last(), timeout)
+    return sent
+
+
+def estimate_tokens(events):
+    return sum(len(part["text"]) for e in events for part in e["item"]["content"]) // CHARS_PER_TOKEN
+
+##############################
+# 3) BENCHMARK: snapshot resume vs full transcript replay
+##############################
+def _transcript(turns):
+    """A plausible voice-assistant conversation: short user questions, 2-3 sentence replies."""
+    topics = ["the weather in Istanbul", "a Python greet function", "converting 100 USD to EUR",
+              "the local time in Tokyo", "tomorrow's forecast", "a unit test for greet"]
+    transcript = []
+    for i in range(turns):
+        topic = topics[i % len(topics)]
+        transcript.append(("user", f"Can you help me with {topic}? This is question {i}."))
+        transcript.append(("assistant", f"Sure. Here is what I found about {topic}. "
+                                        f"It should cover what you asked in question {i}. "
+                                        "Let me know if you want more detail."))
+    return transcript
+
+
+async def _connect_and_restore(url, session, events):
+    """Connect, apply the session config, inject `events`; returns (seconds, bytes sent)."""
+    start = time.perf_counter()
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"type": "session.update", "session": session}))
+        while json.loads(await ws.recv()).get("type") != "session.created":
+            pass
+        sent = await inject(ws, events)
+        return time.perf_counter() - start, sent
+
+
+async def benchmark(turn_counts=(20, 100, 500, 2000), repeats=5, path="session_snapshot_benchmark.json"):
+    from realtime_stub import RealtimeStub
+
+    session = {"voice": "alloy", "modalities": ["audio", "text"],
+               "instructions": "You are a helpful AI assistant. Keep responses brief and engaging.",
+               "input_audio_transcription": {"model": "whisper-1"}}
+    print(f"Resume after reconnect against the local stub (median of {repeats}):")
+    print(f"{'turns':>6s} {'mode':9s} {'items':>6s} {'KiB sent':>9s} {'~tokens':>8s} {'resume ms':>10s}"
+          f"   snapshot build/write, size")
+    async with RealtimeStub() as stub:
+        for turns in turn_counts:
+            transcript = _transcript(turns)
+            start = time.perf_counter()
+            snapshot = take_snapshot(session, "", transcript, keep_recent=6, turns=turns)
+            built = time.perf_counter()
+            save_snapshot(path, snapshot)
+            written = time.perf_counter()
+            size = os.path.getsize(path)
+            snapshot = load_snapshot(path)
+            for mode, events in (("replay", replay_events(transcript)), ("snapshot", resume_events(snapshot))):
+                runs = [await _connect_and_restore(stub.url, session, events) for _ in range(repeats)]
+                seconds = sorted(r[0] for r in runs)[len(runs) // 2]
+                extra = (f"   {1000 * (built - start):.2f} / {1000 * (written - built):.2f} ms, {size / 1024:.1f} KiB"
+                         if mode == "snapshot" else "")
+                print(f"{turns:6d} {mode:9s} {len(events):6d} {runs[0][1] / 1024:9.1f} {estimate_tokens(events):8d} "
+                      f"{1000 * seconds:10.1f}{extra}")
+    os.remove(path)
+    print("(loopback stub: the live service also bills and attends over every injected token, "
+          "so the token column is the bigger difference there)")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
@@ -0,0 +1,282 @@
+import asyncio
+import contextlib
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+
+from audio_profiling import LoopLagMonitor
+from audio_resampler import read_wav_resampled
+from load_test import LoadStats, SimulatedCaller, _default_system_factory, _rss_mb, stub_process
+from voice_tracing import HdrHistogram
+
+DEFAULT_WAV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simple_tone.wav")
+
+##############################
+# 1) FILE-FED CALLER
+##############################
+class FileCaller(SimulatedCaller):
+    """SimulatedCaller whose speech is cut from a WAV file instead of synthesised."""
+    def __init__(self, stats, wav=DEFAULT_WAV, device_rate=48000, seed=0, turn_timeout=15.0):
+        super().__init__(stats, device_rate, seed, turn_timeout)
+        speech = read_wav_resampled(wav, device_rate)
+        if not len(speech):
+            raise ValueError(f"{wav}: no audio")
+        # _feed cuts up to 2.5 s at a random offset; repeat short files to cover that.
+        self.voice = np.tile(speech, int(np.ceil(3 * device_rate / len(speech))) + 1)
+
+##############################
+# 2) SAMPLING: RSS, tracemalloc, GC pauses, turn latency
+##############################
+class SoakMonitor:
+    """
+    Collects one row per sampling interval. Turn latency, GC pauses and loop
+    lag are per interval. RSS and traced memory are point-in-time. Allocation
+    growth is measured against a tracemalloc snapshot taken at the end of the
+    warm-up.
+    """
+    def __init__(self, stats, tracemalloc_frames=1, top=5):
+        self.stats = stats
+        self.frames = tracemalloc_frames
+        self.top = top
+        self.turns = 0
+        self.errors = Counter()
+        self.gc_pause = HdrHistogram()
+        self.gc_collections = Counter()
+        self.gc_started = None
+        self.lag = LoopLagMonitor()
+        self.baseline = None
+        self.rows = []
+
+    def start(self):
+        gc.callbacks.append(self._gc)
+        if self.frames:
+            tracemalloc.start(self.frames)
+        self.lag.start()
+        return self
+
+    def stop(self):
+        with contextlib.suppress(ValueError):
+            gc.callbacks.remove(self._gc)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.lag.stop()
+
+    def _gc(self, phase, info):
+        if phase == "start":
+            self.gc_started = time.perf_counter()
+        elif self.gc_started is not None:
+            self.gc_pause.record((time.perf_counter() - self.gc_started) * 1e6)
+            self.gc_collections[info["generation"]] += 1
+            self.gc_started = None
+
+    def mark_baseline(self):
+        gc.collect()
+        if tracemalloc.is_tracing():
+            self.baseline = tracemalloc.take_snapshot()
+
+    def sample(self, elapsed):
+        s = self.stats
+        latency = s.turn_latency.summary_ms()
+        gc_pause = self.gc_pause.summary_ms()
+        self.turns += s.turns
+        self.errors.update(s.errors)
+        if s.timeouts:
+            self.errors["timeout"] += s.timeouts
+        row = {
+            "t_s": round(elapsed, 1), "turns": self.turns, "window_turns": s.turns,
+            "p50_ms": latency["p50_ms"], "p95_ms": latency["p95_ms"], "p99_ms": latency["p99_ms"],
+            "rss_mb": _rss_mb(),
+            "traced_mb": tracemalloc.get_traced_memory()[0] / 2**20 if tracemalloc.is_tracing() else None,
+            "gc_count": sum(self.gc_collections.values()), "gc_gen2": self.gc_collections[2],
+            "gc_p99_ms": gc_pause["p99_ms"], "gc_max_ms": gc_pause["max_ms"],
+            "loop_lag_p99_ms": self.lag.lag.summary_ms()["p99_ms"],
+            "underruns": s.underruns, "errors": sum(s.errors.values()) + s.timeouts,
+            "gc_objects": len(gc.get_objects()),
+        }
+        s.__init__()
+        self.gc_pause, self.gc_collections = HdrHistogram(), Counter()
+        self.lag.lag = HdrHistogram()
+        self.rows.append(row)
+        return row
+
+    def top_growth(self):
+        """[(where, +MiB, +blocks)] for the allocators that grew most since the baseline."""
+        if self.baseline is None or not tracemalloc.is_tracing():
+            return []
+        gc.collect()
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        diffs = snapshot.compare_to(self.baseline.filter_traces(ignore), "lineno")
+        return [(f"{d.traceback[0].filename.rsplit(os.sep, 1)[-1]}:{d.traceback[0].lineno}",
+                 d.size_diff / 2**20, d.count_diff)
+                for d in diffs[:self.top] if d.size_diff > 0]
+
+
+def format_row(r, header=False):
+    traced = "   n/a" if r["traced_mb"] is None else f"{r['traced_mb']:6.1f}"
+    line = (f"{r['t_s']:7.0f} {r['turns']:6d} {r['p50_ms']:7.0f} {r['p95_ms']:7.0f} {r['rss_mb']:7.1f} {traced} "
+            f"{r['gc_objects']:8d} {r['gc_count']:5d} {r['gc_gen2']:4d} {r['gc_max_ms']:7.2f} "
+            f"{r['loop_lag_p99_ms']:8.1f} {r['errors']:6d}")
+    if header:
+        line = (f"{'t s':>7s} {'turns':>6s} {'p50 ms':>7s} {'p95 ms':>7s} {'rss MB':>7s} {'heap':>6s} "
+                f"{'objects':>8s} {'gcs':>5s} {'gen2':>4s} {'gc max':>7s} {'lag p99':>8s} {'errors':>6s}\n") + line
+    return line
+
+##############################
+# 3) SOAK
+##############################
+def _slope_per_hour(rows, key):
+    """Least-squares growth of rows[key] per hour of run time."""
+    t = np.array([r["t_s"] for r in rows], dtype=float)
+    y = np.array([r[key] for r in rows], dtype=float)
+    if len(rows) < 2 or np.ptp(t) == 0:
+        return 0.0
+    return float(np.polyfit(t, y, 1)[0] * 3600)
+
+
+class SoakTest:
+    """
+    Keeps `callers` ConversationSystems talking to a realtime endpoint until
+    `turns` turns have completed (or `duration` seconds have passed). The
+    first `warmup` seconds are discarded. The test fails if, after warm-up:
+    - RSS grows by more than max_rss_growth_mb,
+    - traced Python memory grows by more than max_traced_growth_mb, or
+    - the p95 turn latency of the last windows exceeds that of the first
+      windows by more than max_p95_drift (a ratio).
+    """
+    def __init__(self, url, callers=8, turns=2000, duration=None, interval=30.0, warmup=60.0,
+                 wav=DEFAULT_WAV, device_rate=48000, max_rss_growth_mb=64.0, max_traced_growth_mb=32.0,
+                 max_p95_drift=1.3, tracemalloc_frames=1, system_factory=_default_system_factory):
+        self.url = url
+        self.callers = callers
+        self.turns = turns
+        self.duration = duration
+        self.interval = interval
+        self.warmup = warmup
+        self.wav = wav
+        self.device_rate = device_rate
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.max_traced_growth_mb = max_traced_growth_mb
+        self.max_p95_drift = max_p95_drift
+        self.system_factory = system_factory
+        self.stats = LoadStats()
+        self.monitor = SoakMonitor(self.stats, tracemalloc_frames)
+
+    async def run(self, report=None):
+        out = sys.stdout
+        report = report or (lambda line: print(line, file=out, flush=True))
+        tasks = []
+        # Sessions print per-chunk progress and debug lines; keep them out of the report.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self.monitor.start()
+            start = time.perf_counter()
+            try:
+                for i in range(self.callers):
+                    caller = FileCaller(self.stats, self.wav, self.device_rate, seed=i)
+                    tasks.append(asyncio.ensure_future(caller.run(self.url, self.system_factory)))
+                    await asyncio.sleep(1.0 / self.callers)
+                await asyncio.sleep(max(0.0, self.warmup - (time.perf_counter() - start)))
+                self.monitor.sample(time.perf_counter() - start)
+                self.monitor.rows.clear()
+                self.monitor.turns = 0
+                self.monitor.mark_baseline()
+                report(f"warm-up done after {self.warmup:.0f}s; sampling every {self.interval:.0f}s")
+                while True:
+                    await asyncio.sleep(self.interval)
+                    row = self.monitor.sample(time.perf_counter() - start)
+                    report(format_row(row, header=len(self.monitor.rows) == 1))
+                    if row["turns"] >= self.turns or (self.duration and row["t_s"] >= self.duration):
+                        break
+                growth = self.monitor.top_growth()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.monitor.stop()
+        failures = self.verdict()
+        report(self.summary(growth, failures))
+        return failures
+
+    def verdict(self):
+        rows = [r for r in self.monitor.rows if r["window_turns"]]
+        if len(rows) < 2:
+            return ["not enough completed turns to judge drift"]
+        failures = []
+        first, last = rows[0], rows[-1]
+        rss_growth = last["rss_mb"] - first["rss_mb"]
+        if rss_growth > self.max_rss_growth_mb:
+            failures.append(f"RSS grew {rss_growth:.1f} MB (limit {self.max_rss_growth_mb:.0f})")
+        if first["traced_mb"] is not None:
+            traced_growth = last["traced_mb"] - first["traced_mb"]
+            if traced_growth > self.max_traced_growth_mb:
+                failures.append(f"Python heap grew {traced_growth:.1f} MB (limit {self.max_traced_growth_mb:.0f})")
+        k = max(1, len(rows) // 4)
+        early = float(np.median([r["p95_ms"] for r in rows[:k]]))
+        late = float(np.median([r["p95_ms"] for r in rows[-k:]]))
+        if early and late / early > self.max_p95_drift:
+            failures.append(f"p95 turn latency drifted {early:.0f} -> {late:.0f} ms "
+                            f"(x{late / early:.2f}, limit x{self.max_p95_drift:.2f})")
+        return failures
+
+    def summary(self, growth, failures):
+        rows = [r for r in self.monitor.rows if r["window_turns"]] or self.monitor.rows
+        lines = [f"{self.monitor.turns} turns in {rows[-1]['t_s'] - self.warmup:.0f}s after warm-up "
+                 f"across {self.callers} callers; errors {dict(self.monitor.errors) or 0}"]
+        if len(rows) > 1:
+            lines.append(f"trend per hour: RSS {_slope_per_hour(rows, 'rss_mb'):+.1f} MB, "
+                         f"objects {_slope_per_hour(rows, 'gc_objects'):+.0f}, "
+                         f"p95 {_slope_per_hour(rows, 'p95_ms'):+.0f} ms")
+        if growth:
+            lines.append("largest allocation growth since warm-up:")
+            lines += [f"  {where:40s} {mb:+8.3f} MiB {count:+8d} blocks" for where, mb, count in growth]
+        lines.append("FAIL: " + "; ".join(failures) if failures else "PASS: no memory or latency drift")
+        return "\n".join(lines)
+
+
+async def main(args):
+    # ConversationSystem insists on a key; the stub ignores it.
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "soak-test")
+    if args.no_aec:
+        os.environ["ECHO_CANCELLATION"] = "0"
+    options = dict(callers=args.callers, turns=args.turns, duration=args.duration, interval=args.interval,
+                   warmup=args.warmup, wav=args.wav, max_rss_growth_mb=args.max_rss_growth_mb,
+                   max_traced_growth_mb=args.max_heap_growth_mb, max_p95_drift=args.max_p95_drift,
+                   tracemalloc_frames=0 if args.no_tracemalloc else args.tracemalloc_frames)
+    print(f"{args.callers} callers fed from {os.path.basename(args.wav)} until {args.turns} turns"
+          f"{f' or {args.duration:.0f}s' if args.duration else ''}, tracemalloc "
+          f"{'off' if args.no_tracemalloc else f'{args.tracemalloc_frames} frame(s)'}")
+    if args.url:
+        failures = await SoakTest(args.url, **options).run()
+    else:
+        async with stub_process(args.response_delay, args.reply_seconds, args.pace) as (url, pid):
+            print(f"stub {url} (pid {pid})")
+            failures = await SoakTest(url, **options).run()
+    if failures:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Soak ConversationSystem for memory growth and latency drift")
+    parser.add_argument("--url", help="realtime endpoint (default: start a local stub)")
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--duration", type=float, help="stop after this many seconds even if turns remain")
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds per sample")
+    parser.add_argument("--warmup", type=float, default=60.0)
+    parser.add_argument("--wav", default=DEFAULT_WAV, help="16-bit WAV used as caller speech")
+    parser.add_argument("--no-aec", action="store_true")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64.0)
+    parser.add_argument("--max-heap-growth-mb", type=float, default=32.0)
+    parser.add_argument("--max-p95-drift", type=float, default=1.3)
+    parser.add_argument("--tracemalloc-frames", type=int, default=1)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="lower overhead, no allocator breakdown")
+    parser.add_argument("--response-delay", type=float, default=0.3)
+    parser.add_argument("--reply-seconds", type=float, default=1.0)
+    parser.add_argument("--pace", type=float, default=1.5)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,98 @@
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Import this module first so "since start" covers the rest of the imports.
+SCRIPT_START = time.perf_counter()
+
+##############################
+# 1) PHASE TIMELINE
+##############################
+class StartupProfile:
+    """
+    Records named bring-up phases (from any thread or coroutine) relative to
+    script start, so overlapping work shows up as overlapping bars:
+        with startup.phase("audio devices"): ...
+    """
+    def __init__(self, budget_ms=None):
+        self.budget_ms = budget_ms
+        self.phases = []
+        self.lock = threading.Lock()
+        self.ready_at = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append((name, start - SCRIPT_START, time.perf_counter() - SCRIPT_START,
+                                    threading.current_thread().name))
+
+    def mark_ready(self):
+        self.ready_at = time.perf_counter() - SCRIPT_START
+        return self.ready_at
+
+    @property
+    def within_budget(self):
+        return self.budget_ms is None or self.ready_at is None or 1000 * self.ready_at <= self.budget_ms
+
+    def summary(self):
+        budget = f" (budget {self.budget_ms:.0f} ms{'' if self.within_budget else ', OVER'})" if self.budget_ms else ""
+        return f"Time to ready: {1000 * (self.ready_at or 0):.0f} ms since script start{budget}"
+
+    def report(self, width=40):
+        end = max([self.ready_at or 0] + [p[2] for p in self.phases]) or 1e-9
+        lines = [f"{'phase':28s} {'start':>7s} {'end':>7s} {'ms':>7s}  thread"]
+        for name, start, stop, thread in sorted(self.phases, key=lambda p: p[1]):
+            a, b = int(width * start / end), max(int(width * start / end) + 1, int(width * stop / end))
+            bar = " " * a + "#" * (b - a)
+            lines.append(f"{name:28s} {1000 * start:7.0f} {1000 * stop:7.0f} {1000 * (stop - start):7.0f}  "
+                         f"{thread[:12]:12s} |{bar:{width}s}|")
+        lines.append(self.summary())
+        return "\n".join(lines)
+
+##############################
+# 2) IMPORT COST (python -X importtime in a clean interpreter)
+##############################
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_profile(modules, top=12):
+    """
+    Cold import cost of each module in a fresh interpreter, plus the heaviest
+    transitive imports. Returns [(module, cumulative_ms, [(child, cumulative_ms), ...])].
+    """
+    results = []
+    for module in modules:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True)
+        entries = []
+        for line in proc.stderr.splitlines():
+            match = _IMPORTTIME.match(line)
+            if match:
+                entries.append((match.group(4), int(match.group(2)) / 1000, len(match.group(3))))
+        total = next((ms for name, ms, _ in reversed(entries) if name == module), None)
+        if proc.returncode != 0:
+            results.append((module, None, [("import failed: " + proc.stderr.strip().splitlines()[-1], 0.0)]))
+            continue
+        # Skip interpreter startup (everything up to and including "site").
+        site = next((i for i, (name, _, depth) in enumerate(entries) if name == "site" and depth == 1), -1)
+        # Direct children of the top-level import with the biggest cumulative cost.
+        children = sorted(((name, ms) for name, ms, depth in entries[site + 1:] if depth == 3),
+                          key=lambda e: -e[1])
+        results.append((module, total, children[:top]))
+    return results
+
+
+def format_import_profile(results):
+    lines = []
+    for module, total, children in results:
+        lines.append(f"{module}: {'failed' if total is None else f'{total:.0f} ms'}")
+        for name, ms in children:
+            lines.append(f"    {ms:7.1f} ms  {name}")
+    return "\n".join(lines)
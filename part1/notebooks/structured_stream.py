@@ -0,0 +1,502 @@
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+
+from pydantic import TypeAdapter, ValidationError
+
+##############################
+# 1) INCREMENTAL PARSER: top-level fields as soon as they are final
+##############################
+_decoder = json.JSONDecoder()
+
+
+class FieldStreamParser:
+    """
+    Feed streamed text chunks; get back (field, value) pairs for each
+    top-level member of the JSON object as soon as its terminating ',' or '}'
+    arrives, already validated against that field of `model_cls`. Prose or
+    a ```json fence before the object is skipped; the object starts at the
+    first `{` followed by a key or `}`. Each character is scanned
+    once; only a completed member is handed to the JSON decoder.
+    """
+    def __init__(self, model_cls):
+        self.model_cls = model_cls
+        self.adapters = {name: TypeAdapter(field.annotation) for name, field in model_cls.model_fields.items()}
+        self.reset()
+
+    def reset(self):
+        self.buffer = []
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.member_start = None
+        self.done = False
+        self.fields = {}
+        self.field_errors = {}
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return []
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self.pos, len(text)):
+            c = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                continue
+            if self.depth == 0:
+                if c == "{":
+                    # Only `{` then `"` or `}` opens the object; prose like
+                    # "Sure {see below}:" may contain braces of its own.
+                    ahead = text[i + 1:].lstrip()
+                    if not ahead:
+                        self.pos = i
+                        return completed
+                    if ahead[0] in '"}':
+                        self.depth = 1
+                        self.member_start = i + 1
+                continue
+            if c == '"':
+                self.in_string = True
+            elif c in "{[":
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    completed += self._member(text[self.member_start:i])
+                    self.done = True
+                    self.pos = i + 1
+                    return completed
+            elif c == "," and self.depth == 1:
+                completed += self._member(text[self.member_start:i])
+                self.member_start = i + 1
+        self.pos = len(text)
+        return completed
+
+    def _member(self, member):
+        member = member.strip()
+        if not member:
+            return []
+        try:
+            key, end = _decoder.raw_decode(member)
+            rest = member[end:].lstrip()
+            if not isinstance(key, str) or not rest.startswith(":"):
+                raise ValueError("expected \"key\": value")
+            value = json.loads(rest[1:])
+        except ValueError as e:
+            self.field_errors[member[:40]] = str(e)
+            return []
+        adapter = self.adapters.get(key)
+        if adapter is None:
+            return []
+        try:
+            value = adapter.validate_python(value)
+        except ValidationError as e:
+            self.field_errors[key] = e.errors()[0]["msg"]
+            return []
+        self.fields[key] = value
+        return [(key, value)]
+
+##############################
+# 2) LOCAL REPAIR of near-valid output
+##############################
+_LITERALS = {"None": "null", "True": "true", "False": "false"}
+# Same rule as FieldStreamParser: the object opens with a key or closes at once.
+_OBJECT_START = re.compile(r"""\{\s*(?:["'}]|$)""")
+
+
+def repair_json(text):
+    """
+    Best-effort fix of almost-JSON. Returns (fixed_text, [fixes]) or
+    (None, []) if there is no object at all. Handles:
+    - prose or code fences around the object;
+    - single-quoted strings (with their \\' escapes) and Python None/True/False;
+    - trailing commas;
+    - output truncated mid-string or mid-member, where open strings and
+      brackets are closed and a dangling key, or a member whose value was
+      cut short, is dropped.
+    """
+    match = _OBJECT_START.search(text)
+    if match is None:
+        return None, []
+    start = match.start()
+    fixes = []
+    if text[:start].strip():
+        fixes.append("leading_text")
+    out = []
+    stack = []
+    # Per open container: where its current member starts in `out` (at its
+    # leading comma, if any) and whether the cut would land in that member's value.
+    members = []
+    in_value = []
+    quote = None
+    escape = False
+    i = start
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if escape:
+                escape = False
+                if c == "'" and quote == "'":
+                    # \' is how a single-quoted string escapes its quote; JSON has no such escape.
+                    out[-1] = "'"
+                else:
+                    out.append(c)
+            elif c == "\\":
+                escape = True
+                out.append(c)
+            elif c == quote:
+                quote = None
+                out.append('"')
+            elif c == '"' and quote == "'":
+                out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            else:
+                out.append(c)
+            i += 1
+            continue
+        if c in "\"'":
+            if c == "'":
+                fixes.append("single_quotes")
+            quote = c
+            out.append('"')
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+            members.append(len(out))
+            in_value.append(c == "[")
+        elif c == "," and stack:
+            members[-1] = len(out)
+            in_value[-1] = stack[-1] == "]"
+            out.append(c)
+        elif c == ":" and stack:
+            in_value[-1] = True
+            out.append(c)
+        elif c in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                fixes.append("trailing_comma")
+            out.append(c)
+            if stack:
+                stack.pop()
+                members.pop()
+                in_value.pop()
+            if not stack:
+                if text[i + 1:].strip():
+                    fixes.append("trailing_text")
+                break
+        elif c.isalpha():
+            word = re.match(r"\w+", text[i:]).group(0)
+            out.append(_LITERALS.get(word, word))
+            if word in _LITERALS:
+                fixes.append("python_literal")
+            i += len(word)
+            continue
+        else:
+            out.append(c)
+        i += 1
+    if stack or quote:
+        fixes.append("truncated")
+        # A string, number or literal cut short would parse as a wrong value
+        # (`"local_time": "09:` -> "09:"), so drop that member instead.
+        last = out[-1] if out else ""
+        cut_scalar = quote or (re.search(r"[\w.+-]$", last) and last not in _LITERALS.values())
+        if stack and in_value[-1] and cut_scalar:
+            del out[members[-1]:]
+            quote = None
+            fixes.append("partial_value_dropped")
+        if quote:
+            if escape:
+                out.pop()
+            out.append('"')
+        fixed = "".join(out).rstrip()
+        # Drop a dangling `"key"` / `"key":` / `,` left by the cut.
+        fixed = re.sub(r'(,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', "", fixed)
+        if fixed.endswith(":"):
+            fixed = fixed[:-1]
+        fixed = re.sub(r'([{,])\s*"[^"]*"\s*$', r"\1", fixed).rstrip().rstrip(",")
+        fixed += "".join(reversed(stack))
+    else:
+        fixed = "".join(out)
+    return fixed, list(dict.fromkeys(fixes))
+
+
+class StructuredOutputError(Exception):
+    pass
+
+
+def parse_structured(text, model_cls):
+    """(instance, fixes): fixes is [] for valid output. Raises StructuredOutputError if unrepairable."""
+    try:
+        return model_cls.model_validate_json(text), []
+    except ValidationError as first:
+        error = first
+    fixed, fixes = repair_json(text)
+    if fixed is not None:
+        try:
+            return model_cls.model_validate_json(fixed), fixes or ["reformatted"]
+        except ValidationError as e:
+            error = e
+    raise StructuredOutputError(f"not a valid {model_cls.__name__}: {error.errors()[0]['msg']}")
+
+##############################
+# 3) AGENT WRAPPER: stream fields, repair locally, retry as a last resort
+##############################
+class StructuredOutputStats:
+    def __init__(self):
+        self.responses = 0
+        self.valid = 0
+        self.repaired = 0
+        self.retries = 0
+        self.failed = 0
+        self.fixes = Counter()
+
+    def snapshot(self):
+        n = max(1, self.responses)
+        return {
+            "responses": self.responses,
+            "valid_rate": self.valid / n,
+            "repair_rate": self.repaired / n,
+            "retry_rate": self.retries / n,
+            "failed": self.failed,
+            "fixes": dict(self.fixes),
+        }
+
+
+class FieldUpdate:
+    __slots__ = ("name", "value", "elapsed")
+
+    def __init__(self, name, value, elapsed):
+        self.name = name
+        self.value = value
+        self.elapsed = elapsed
+
+
+class StructuredResult:
+    __slots__ = ("value", "attempts", "fixes", "elapsed")
+
+    def __init__(self, value, attempts, fixes, elapsed):
+        self.value = value
+        self.attempts = attempts
+        self.fixes = fixes
+        self.elapsed = elapsed
+
+
+class StructuredResponder:
+    """
+    Runs an agent that must answer with `model_cls` JSON (the tools
+    notebook's QueryResponse) and streams the answer's fields as they finish:
+
+        responder = StructuredResponder(agent, QueryResponse)
+        async for update in responder.stream("What is the weather in Berlin?"):
+            if isinstance(update, FieldUpdate):
+                speak(update.name, update.value)     # e.g. weather_report, before the rest arrives
+            else:
+                result = update.value                 # validated QueryResponse
+
+    Build the agent with model_client_stream=True to get fields before the
+    message is complete (otherwise they arrive together at the end), and with
+    reflect_on_tool_use=True so the final message is the model's JSON rather
+    than a tool-result summary. Malformed output is repaired locally first.
+    Only if that fails is the agent asked, in the same conversation, to resend
+    the JSON, up to `max_retries` times. Tool calls are not redone.
+    """
+    def __init__(self, agent, model_cls, max_retries=1, stats=None):
+        self.agent = agent
+        self.model_cls = model_cls
+        self.max_retries = max_retries
+        self.stats = stats or StructuredOutputStats()
+
+    async def stream(self, task):
+        from autogen_agentchat.base import TaskResult
+        start = time.perf_counter()
+        self.stats.responses += 1
+        emitted = {}
+        for attempt in range(self.max_retries + 1):
+            parser = FieldStreamParser(self.model_cls)
+            final_text = None
+            async for message in self.agent.run_stream(task=task):
+                kind = type(message).__name__
+                if kind == "ModelClientStreamingChunkEvent":
+                    completed = parser.feed(message.content)
+                elif kind in ("ToolCallRequestEvent", "ToolCallExecutionEvent"):
+                    # Text streamed before a tool call isn't the answer.
+                    parser.reset()
+                    continue
+                elif isinstance(message, TaskResult):
+                    last = message.messages[-1] if message.messages else None
+                    content = getattr(last, "content", "")
+                    final_text = content if isinstance(content, str) else str(content)
+                    continue
+                else:
+                    continue
+                for name, value in completed:
+                    if emitted.get(name, emitted) != value:
+                        emitted[name] = value
+                        yield FieldUpdate(name, value, time.perf_counter() - start)
+            if not parser.done and final_text:
+                # Non-streaming client: parse the whole message now.
+                parser.reset()
+                for name, value in parser.feed(final_text):
+                    if emitted.get(name, emitted) != value:
+                        emitted[name] = value
+                        yield FieldUpdate(name, value, time.perf_counter() - start)
+            try:
+                value, fixes = parse_structured(final_text or "", self.model_cls)
+            except StructuredOutputError as e:
+                if attempt == self.max_retries:
+                    self.stats.failed += 1
+                    raise
+                self.stats.retries += 1
+                task = (f"Your last reply was {e}. Reply again with only the JSON object for "
+                        f"{self.model_cls.__name__} (fields: {', '.join(self.model_cls.model_fields)}), "
+                        "no other text.")
+                continue
+            if fixes:
+                self.stats.repaired += 1
+                self.stats.fixes.update(fixes)
+            elif attempt == 0:
+                self.stats.valid += 1
+            for name in self.model_cls.model_fields:
+                field_value = getattr(value, name)
+                if name not in emitted and field_value is not None:
+                    emitted[name] = field_value
+                    yield FieldUpdate(name, field_value, time.perf_counter() - start)
+            yield StructuredResult(value, attempt + 1, fixes, time.perf_counter() - start)
+            return
+
+    async def run(self, task):
+        result = None
+        async for update in self.stream(task):
+            if isinstance(update, StructuredResult):
+                result = update
+        return result
+
+##############################
+# 4) BENCHMARK vs rerunning the whole query on failure (the notebook's approach)
+##############################
+CASES = [
+    # (share, first reply, reply to a retry)
+    (0.55, '{"weather_report": "25°C and sunny in Berlin", "currency_info": null, '
+           '"local_time": "09:00 AM", "notes": "Light breeze from the west."}', None),
+    (0.15, 'Here is the data:\n```json\n{"weather_report": "25°C and sunny in Berlin", '
+           '"currency_info": null, "local_time": null, "notes": "Clear skies",}\n```', None),
+    (0.10, "{'weather_report': 'Rain in Tokyo', 'currency_info': None, 'local_time': '09:00 AM', "
+           "'notes': None}", None),
+    (0.05, '{"weather_report": "25°C and sunny in Berlin", "currency_info": null, '
+           '"notes": "A detailed outlook: clouds roll in from the n', None),
+    (0.15, "The weather in Berlin is 25°C and sunny, and it is 9 AM there.", None),
+]
+FIXED_REPLY = ('{"weather_report": "25°C and sunny in Berlin", "currency_info": null, '
+               '"local_time": "09:00 AM", "notes": null}')
+
+
+def _scripted_client(replies, per_chunk=0.01, chunk_chars=4):
+    """Streams each reply in a few characters per chunk at a steady token rate."""
+    from autogen_core.models import CreateResult, RequestUsage
+    from autogen_ext.models.replay import ReplayChatCompletionClient
+    from model_client_wrapper import DelegatingChatCompletionClient, estimate_tokens
+
+    class ScriptedStreamClient(DelegatingChatCompletionClient):
+        def __init__(self):
+            super().__init__(ReplayChatCompletionClient([]))
+            self.replies = iter(replies)
+            self.calls = 0
+            self.tokens = 0
+
+        def _result(self, messages, text):
+            self.calls += 1
+            usage = RequestUsage(prompt_tokens=estimate_tokens(messages, 0), completion_tokens=len(text) // 4)
+            self.tokens += usage.prompt_tokens + usage.completion_tokens
+            return CreateResult(finish_reason="stop", content=text, usage=usage, cached=False)
+
+        async def create(self, messages, **kwargs):
+            text = next(self.replies)
+            await asyncio.sleep(per_chunk * len(text) / chunk_chars)
+            return self._result(messages, text)
+
+        async def create_stream(self, messages, **kwargs):
+            text = next(self.replies)
+            for i in range(0, len(text), chunk_chars):
+                await asyncio.sleep(per_chunk)
+                yield text[i:i + chunk_chars]
+            yield self._result(messages, text)
+
+    return ScriptedStreamClient()
+
+
+async def benchmark(requests=200):
+    import random
+    from typing import Optional
+    from autogen_agentchat.agents import AssistantAgent
+    from pydantic import BaseModel
+
+    # Same structured-output model as the tools notebook.
+    class QueryResponse(BaseModel):
+        weather_report: Optional[str] = None
+        currency_info: Optional[str] = None
+        local_time: Optional[str] = None
+        notes: Optional[str] = None
+
+    rng = random.Random(0)
+    cases = rng.choices([c[1] for c in CASES], weights=[c[0] for c in CASES], k=requests)
+
+    def agent(first):
+        client = _scripted_client([first, FIXED_REPLY])
+        return client, AssistantAgent("multi_tool_agent", model_client=client, model_client_stream=True,
+                                      system_message="Reply only with QueryResponse JSON.")
+
+    async def rerun_on_failure(first):
+        # The notebook: validate the finished answer, rerun with a simplified query on failure.
+        client, a = agent(first)
+        start = time.perf_counter()
+        result = await a.run(task="What is the weather in Berlin?")
+        try:
+            QueryResponse.model_validate_json(result.messages[-1].content)
+        except ValidationError:
+            result = await a.run(task="Provide the requested data as structured JSON.")
+            QueryResponse.model_validate_json(result.messages[-1].content)
+        elapsed = time.perf_counter() - start
+        return client, elapsed, elapsed
+
+    stats = StructuredOutputStats()
+
+    async def streamed(first):
+        client, a = agent(first)
+        responder = StructuredResponder(a, QueryResponse, stats=stats)
+        start = time.perf_counter()
+        first_field = None
+        async for update in responder.stream("What is the weather in Berlin?"):
+            if first_field is None and isinstance(update, FieldUpdate):
+                first_field = time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+        return client, first_field or elapsed, elapsed
+
+    print(f"{requests} QueryResponse answers: {CASES[0][0]:.0%} valid, "
+          f"{sum(c[0] for c in CASES[1:4]):.0%} near-valid, {CASES[4][0]:.0%} prose")
+    for label, run in (("rerun on failure", rerun_on_failure), ("stream + repair", streamed)):
+        outcomes = await asyncio.gather(*(run(first) for first in cases))
+        calls = sum(o[0].calls for o in outcomes)
+        tokens = sum(o[0].tokens for o in outcomes)
+        first = sorted(o[1] for o in outcomes)
+        total = sorted(o[2] for o in outcomes)
+        print(f"  {label:17s} model calls {calls:4d} ({calls / requests:.2f}/answer), tokens {tokens:6d}, "
+              f"first field p50 {1000 * first[len(first) // 2]:4.0f} ms, "
+              f"complete p50 {1000 * total[len(total) // 2]:4.0f} ms p95 {1000 * total[int(0.95 * len(total))]:4.0f} ms")
+    print(f"  {stats.snapshot()}")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
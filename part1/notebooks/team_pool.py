@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+
+##############################
+# 1) WORKER PROCESS
+##############################
+async def _run_one(build_team, client, task_id, task):
+    from run_sink import RunSink
+    start = time.perf_counter()
+    try:
+        team = build_team(client)
+        sink = RunSink(columns=True)
+        result = await sink.consume(team.run_stream(task=task), run_id=task_id)
+        return {"id": task_id, "worker": os.getpid(), "seconds": time.perf_counter() - start,
+                "stop_reason": result.stop_reason if result else None, "messages": sink.columns.rows()}
+    except Exception as e:
+        return {"id": task_id, "worker": os.getpid(), "seconds": time.perf_counter() - start,
+                "error": f"{type(e).__name__}: {e}"}
+
+
+async def _worker_loop(build_team, client_factory, concurrency, tasks, results):
+    client = client_factory() if client_factory else None
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+    # Only take a task off the shared queue when a slot is free, so idle
+    # workers aren't starved by one that prefetched everything.
+    slots = threading.Semaphore(concurrency)
+
+    def pump():
+        while True:
+            slots.acquire()
+            item = tasks.get()
+            loop.call_soon_threadsafe(inbox.put_nowait, item)
+            if item is None:
+                return
+
+    async def runner():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                inbox.put_nowait(None)
+                return
+            results.put(await _run_one(build_team, client, *item))
+            slots.release()
+
+    threading.Thread(target=pump, name="team-pool-pump", daemon=True).start()
+    await asyncio.gather(*(runner() for _ in range(concurrency)))
+    close = getattr(client, "close", None)
+    if close is not None:
+        await close()
+
+
+def _worker_main(build_team, client_factory, concurrency, tasks, results):
+    asyncio.run(_worker_loop(build_team, client_factory, concurrency, tasks, results))
+
+##############################
+# 2) POOL
+##############################
+class TeamPool:
+    """
+    Shards independent team runs across worker processes, each with its own
+    event loop and one model client shared by all of its teams:
+
+        async with TeamPool(build_team, workers=4, client_factory=make_client) as pool:
+            async for result in pool.map(tasks):
+                ...
+
+    build_team(client) -> team and client_factory() -> ChatCompletionClient
+    must be importable module-level functions (workers are spawned). Each
+    result is a plain dict: id, worker pid, seconds, stop_reason and the
+    run's messages as RunSink records, or "error" if the run raised.
+    """
+    def __init__(self, build_team, workers=4, concurrency=32, client_factory=None, start_method="spawn"):
+        self.build_team = build_team
+        self.workers = workers
+        self.concurrency = concurrency
+        self.client_factory = client_factory
+        self.context = multiprocessing.get_context(start_method)
+        self.processes = []
+        self.pending = {}
+        self.ids = itertools.count()
+        self.loop = None
+        self.reader = None
+        self.closing = False
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.processes = [
+            self.context.Process(target=_worker_main, name=f"team-worker-{i}", daemon=True,
+                                 args=(self.build_team, self.client_factory, self.concurrency,
+                                       self.tasks, self.results))
+            for i in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.reader = threading.Thread(target=self._read_results, name="team-pool-results", daemon=True)
+        self.reader.start()
+        return self
+
+    def submit(self, task, task_id=None):
+        """Queue one run; returns a future for its result dict."""
+        task_id = task_id if task_id is not None else f"task-{next(self.ids)}"
+        future = self.loop.create_future()
+        self.pending[task_id] = future
+        self.tasks.put((task_id, task))
+        return future
+
+    async def map(self, tasks):
+        """Yield result dicts in completion order."""
+        for future in asyncio.as_completed([self.submit(task) for task in tasks]):
+            yield await future
+
+    def _read_results(self):
+        import queue
+        while True:
+            try:
+                result = self.results.get(timeout=0.5)
+            except queue.Empty:
+                if not self.closing and any(p.exitcode not in (None, 0) for p in self.processes):
+                    self.loop.call_soon_threadsafe(self._fail_pending, "a worker process died")
+                    return
+                continue
+            if result is None:
+                return
+            self.loop.call_soon_threadsafe(self._resolve, result)
+
+    def _resolve(self, result):
+        future = self.pending.pop(result["id"], None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def _fail_pending(self, reason):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(f"TeamPool: {reason}"))
+        self.pending.clear()
+
+    async def close(self):
+        self.closing = True
+        for _ in self.processes:
+            self.tasks.put(None)
+        await asyncio.to_thread(lambda: [p.join() for p in self.processes])
+        self.results.put(None)
+        await asyncio.to_thread(self.reader.join)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+##############################
+# 3) BENCHMARK: throughput at 1/2/4/8 workers
+##############################
+BENCHMARK_TURNS = 10
+BENCHMARK_LATENCY = 0.05
+
+
+def benchmark_client():
+    """One pooled client per worker: scripted replies after a fixed 'network' delay."""
+    from autogen_core.models import CreateResult, RequestUsage
+    from autogen_ext.models.replay import ReplayChatCompletionClient
+    from model_client_wrapper import DelegatingChatCompletionClient, estimate_tokens
+
+    class ScriptedClient(DelegatingChatCompletionClient):
+        async def create(self, messages, **kwargs):
+            await asyncio.sleep(BENCHMARK_LATENCY)
+            return CreateResult(finish_reason="stop", cached=False,
+                                content="Checked the next line item; totals still reconcile.",
+                                usage=RequestUsage(prompt_tokens=estimate_tokens(messages, 0),
+                                                   completion_tokens=12))
+
+    # Advertise function calling so agents with tools can be built on it too.
+    model_info = {"vision": False, "function_calling": True, "json_output": True,
+                  "family": "unknown", "structured_output": True}
+    return ScriptedClient(ReplayChatCompletionClient([], model_info=model_info))
+
+
+def benchmark_team(client):
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.teams import RoundRobinGroupChat
+    agents = [AssistantAgent(name, model_client=client, system_message="You audit statements.")
+              for name in ("Analyst", "Reviewer")]
+    return RoundRobinGroupChat(agents, termination_condition=MaxMessageTermination(BENCHMARK_TURNS))
+
+
+async def _in_process(tasks, concurrency):
+    """Baseline: every team on this process's single event loop."""
+    client = benchmark_client()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(i, task):
+        async with limit:
+            return await _run_one(benchmark_team, client, f"task-{i}", task)
+
+    return await asyncio.gather(*(one(i, task) for i, task in enumerate(tasks)))
+
+
+async def benchmark(teams=400, concurrency=64, worker_counts=(1, 2, 4, 8)):
+    tasks = [f"Reconcile statement #{i}." for i in range(teams)]
+    print(f"{teams} RoundRobin teams x {BENCHMARK_TURNS} messages, {1000 * BENCHMARK_LATENCY:.0f} ms model "
+          f"latency, {concurrency} teams in flight per loop, {os.cpu_count()} CPUs")
+    start = time.perf_counter()
+    results = await _in_process(tasks, concurrency)
+    elapsed = time.perf_counter() - start
+    print(f"  {'single loop':12s} {teams / elapsed:7.1f} teams/s "
+          f"{sum(len(r.get('messages', ())) for r in results) / elapsed:8.0f} msg/s")
+    for workers in worker_counts:
+        async with TeamPool(benchmark_team, workers=workers, concurrency=concurrency,
+                            client_factory=benchmark_client) as pool:
+            # Spawned workers pay the autogen import once; keep it out of the throughput figure.
+            await asyncio.gather(*(pool.submit("warm-up") for _ in range(workers)))
+            start = time.perf_counter()
+            results = [result async for result in pool.map(tasks)]
+            elapsed = time.perf_counter() - start
+        errors = sum("error" in r for r in results)
+        used = len({r["worker"] for r in results})
+        print(f"  {workers:2d} worker(s)  {teams / elapsed:7.1f} teams/s "
+              f"{sum(len(r.get('messages', ())) for r in results) / elapsed:8.0f} msg/s  "
+              f"({used} workers used, {errors} errors)")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
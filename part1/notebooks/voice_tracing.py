@@ -0,0 +1,232 @@
+import functools
+import inspect
+import os
+import threading
+import time
+
+##############################
+# 1) HDR-STYLE HISTOGRAM
+##############################
+class HdrHistogram:
+    """
+    Log-linear histogram in the spirit of HdrHistogram: values (microseconds)
+    are bucketed with 2**precision_bits sub-buckets per power of two, giving
+    < 1% relative error at 7 bits from 1 us up to ~1 hour in a few thousand ints.
+    Recording is a couple of integer ops, so it is safe on the audio thread.
+    """
+    def __init__(self, precision_bits=7, max_value_us=3_600_000_000):
+        self.bits = precision_bits
+        self.sub = 1 << precision_bits
+        self.counts = [0] * (self._index(max_value_us) + 1)
+        self.max_index = len(self.counts) - 1
+        self.total = 0
+        self.min_value = None
+        self.max_value = 0
+
+    def _index(self, value):
+        if value < self.sub:
+            return value
+        shift = value.bit_length() - 1 - self.bits
+        return (shift + 1) * self.sub + ((value >> shift) - self.sub)
+
+    def _value(self, index):
+        """Midpoint of the bucket at `index`."""
+        if index < self.sub:
+            return index
+        shift = index // self.sub - 1
+        base = (index % self.sub + self.sub) << shift
+        return base + ((1 << shift) >> 1)
+
+    def record(self, value_us):
+        value_us = max(0, int(value_us))
+        self.counts[min(self._index(value_us), self.max_index)] += 1
+        self.total += 1
+        self.max_value = max(self.max_value, value_us)
+        self.min_value = value_us if self.min_value is None else min(self.min_value, value_us)
+
+    def percentile(self, q):
+        if not self.total:
+            return 0
+        target = max(1, int(round(q / 100.0 * self.total)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value(index), self.max_value)
+        return self.max_value
+
+    def summary_ms(self):
+        return {
+            "count": self.total,
+            "p50_ms": self.percentile(50) / 1000.0,
+            "p95_ms": self.percentile(95) / 1000.0,
+            "p99_ms": self.percentile(99) / 1000.0,
+            "max_ms": self.max_value / 1000.0,
+        }
+
+##############################
+# 2) VOICE PIPELINE TRACER
+##############################
+# Pipeline marks, in order, for one conversational turn.
+TURN_MARKS = (
+    "mic_block",            # first speech block arrived in audio_callback
+    "vad_decision",         # should_process() said the turn is complete
+    "upload_done",          # send_audio finished (append + commit + response.create)
+    "first_audio_delta",    # first response.audio.delta received
+    "first_sample_played",  # first chunk written + output device latency
+    "response_done",        # response.done received
+)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start_ns")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record_span(self.name, self.start_ns, time.perf_counter_ns())
+        return False
+
+
+class VoiceTracer:
+    """
+    Span-based latency instrumentation for ConversationSystem. Turn marks may
+    come from PortAudio's callback thread as well as the event loop; when the
+    tracer is disabled every entry point returns after a single attribute check.
+    """
+    def __init__(self, enabled=True, export_otel=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.turn = {}
+        self.lock = threading.Lock()
+        self.otel = None
+        if enabled and export_otel:
+            try:
+                from opentelemetry import trace
+                self.otel = trace.get_tracer("voice_pipeline")
+            except ImportError:
+                print("opentelemetry-api not installed; tracing stays in-process only")
+        # Offset between perf_counter and wall clock, for OTel timestamps.
+        self.epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    @classmethod
+    def from_env(cls):
+        return cls(enabled=os.getenv("VOICE_TRACING") == "1",
+                   export_otel=os.getenv("VOICE_TRACING_OTEL") == "1")
+
+    def histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms.setdefault(name, HdrHistogram())
+        return hist
+
+    def mark(self, name, once=True, offset=0.0):
+        """
+        Timestamp a pipeline point for the current turn (first occurrence wins
+        when once=True). `offset` seconds are added, e.g. the output device latency.
+        """
+        if not self.enabled:
+            return
+        if once and name in self.turn:
+            return
+        self.turn[name] = time.perf_counter_ns() + int(offset * 1e9)
+
+    def span(self, name):
+        """`with tracer.span("orchestrator"):` records the block's duration."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name)
+
+    def record_span(self, name, start_ns, end_ns):
+        with self.lock:
+            self.histogram(name).record((end_ns - start_ns) // 1000)
+        if self.otel is not None:
+            span = self.otel.start_span(name, start_time=start_ns + self.epoch_offset_ns)
+            span.end(end_time=end_ns + self.epoch_offset_ns)
+
+    def end_turn(self):
+        """Convert the turn's marks into stage spans and start a fresh turn."""
+        if not self.enabled:
+            return
+        turn, self.turn = self.turn, {}
+        present = [(name, turn[name]) for name in TURN_MARKS if name in turn]
+        if len(present) < 2:
+            return
+        parent = None
+        if self.otel is not None:
+            parent = self.otel.start_span("voice_turn", start_time=present[0][1] + self.epoch_offset_ns)
+        for (start_name, start_ns), (end_name, end_ns) in zip(present, present[1:]):
+            stage = f"{start_name}->{end_name}"
+            with self.lock:
+                self.histogram(stage).record((end_ns - start_ns) // 1000)
+            if parent is not None:
+                from opentelemetry import trace
+                context = trace.set_span_in_context(parent)
+                span = self.otel.start_span(stage, context=context, start_time=start_ns + self.epoch_offset_ns)
+                span.end(end_time=end_ns + self.epoch_offset_ns)
+        with self.lock:
+            self.histogram("turn_total").record((present[-1][1] - present[0][1]) // 1000)
+        if parent is not None:
+            parent.end(end_time=present[-1][1] + self.epoch_offset_ns)
+
+    def report(self):
+        if not self.histograms:
+            return "No spans recorded."
+        lines = [f"{'span':42s} {'n':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}"]
+        for name in sorted(self.histograms):
+            s = self.histograms[name].summary_ms()
+            lines.append(f"{name:42s} {s['count']:6d} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} "
+                         f"{s['p99_ms']:9.2f} {s['max_ms']:9.2f}")
+        return "\n".join(lines)
+
+
+def traced_tool(tracer, name=None):
+    """Decorator for agent tool functions (sync or async) that records a `tool:<name>` span."""
+    def decorate(func):
+        span_name = f"tool:{name or func.__name__}"
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def overhead_benchmark(iterations=200_000):
+    """Per-call cost of mark() and span() with tracing off and on."""
+    for enabled in (False, True):
+        tracer = VoiceTracer(enabled=enabled)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            tracer.mark("first_audio_delta")
+            with tracer.span("bench"):
+                pass
+        per_call_ns = (time.perf_counter() - start) / iterations * 1e9
+        print(f"tracing {'on ' if enabled else 'off'}: {per_call_ns:7.1f} ns per mark+span")
+
+if __name__ == "__main__":
+    overhead_benchmark()